@@ -0,0 +1,190 @@
+# agents/async_azure_agent_base.py
+import asyncio, os
+from loguru import logger
+from azure.identity.aio import AzureCliCredential
+from azure.ai.projects.aio import AIProjectClient
+from azure.ai.agents.models import ListSortOrder
+from agents.agent_base import AgentBase
+from agents.azure_agent_base import ACTIVE_RUN_STATUSES, RUN_POLL_S, RunFailed, run_failure
+from utils.message_cursor import MessageCursor
+from utils.ratelimit import MAX_ATTEMPTS, BASE_DELAY_S, MAX_DELAY_S, acall_with_retry, backoff_delay, is_retryable, limiter_for, status_of
+from utils.thread_memory import SUMMARY_INSTRUCTIONS, SUMMARY_REQUEST, ThreadLedger, memory_message
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class AsyncAzureAgentBase(AgentBase):
+    """
+    AzureAgentBase on the async project client. Every call takes an optional
+    thread_id, so one instance can drive many conversations concurrently;
+    without it the instance's own thread is used, as in the sync class.
+
+    A conversation keeps the thread_id it started with even after compaction
+    moves it onto a fresh agent thread; calls are routed to the live one.
+    """
+
+    def __init__(self, name: str, agent_id: str | None = None, **kw):
+        super().__init__(name=name, **kw)
+        self.endpoint = os.getenv("AZURE_AI_PROJECT_ENDPOINT")
+        self.project_name = os.getenv("AZURE_AI_PROJECT_NAME")
+        self.agent_id = agent_id or os.getenv("AGENT_ID")
+        if not (self.endpoint and self.project_name and self.agent_id):
+            raise RuntimeError("Set AZURE_SEARCH_ENDPOINT, AZURE_AI_PROJECT_NAME, AGENT_ID")
+
+        self.credential = AzureCliCredential()  # requires `az login`
+        self.client = AIProjectClient(endpoint=self.endpoint, project_name=self.project_name, credential=self.credential)
+        self.thread_id = None
+        self.run_limiter = limiter_for("agent")
+        self._cursors: dict[str, MessageCursor] = {}
+        self._ledgers: dict[str, ThreadLedger] = {}
+        self._live: dict[str, str] = {}      # conversation thread id -> current agent thread
+        self.compactions = 0
+        self.tokens_compacted = 0
+
+    async def new_thread(self) -> str:
+        thread = await self.client.agents.threads.create()
+        self.log_in(f"Started thread: {thread.id}")
+        return thread.id
+
+    async def ensure_thread(self, thread_id: str | None = None) -> str:
+        if thread_id:
+            return self._live.get(thread_id, thread_id)
+        if not self.thread_id:
+            self.thread_id = await self.new_thread()
+        return self.thread_id
+
+    async def send_user_message(self, content: str, thread_id: str | None = None) -> str:
+        tid = await self.ensure_thread(thread_id)
+        await self.client.agents.messages.create(thread_id=tid, role="user", content=content)
+        self.ledger_for(tid).note(content)
+        self.log_in(f"User message added to thread {tid}")
+        return tid
+
+    # ---------- Runs (retried as in AzureAgentBase: never re-create a run that may exist) ----------
+    async def _active_run(self, tid: str):
+        async for run in self.client.agents.runs.list(thread_id=tid, order=ListSortOrder.DESCENDING, limit=1):
+            return run if run.status in ACTIVE_RUN_STATUSES else None
+        return None
+
+    async def _start_run(self, tid: str, instructions: str | None):
+        for attempt in range(MAX_ATTEMPTS):
+            await self.run_limiter.aacquire()
+            try:
+                return await self.client.agents.runs.create(thread_id=tid, agent_id=self.agent_id, instructions=instructions)
+            except Exception as e:
+                if attempt == MAX_ATTEMPTS - 1 or not is_retryable(e):
+                    raise
+                await asyncio.sleep(backoff_delay(e, attempt, BASE_DELAY_S, MAX_DELAY_S, self.run_limiter))
+                run = await self._active_run(tid) if status_of(e) != 429 else None
+                if run is not None:
+                    return run
+        raise AssertionError("unreachable")
+
+    async def _wait_run(self, tid: str, run):
+        while run.status in ACTIVE_RUN_STATUSES:
+            if run.status == "requires_action":
+                await acall_with_retry(self.client.agents.runs.cancel, thread_id=tid, run_id=run.id)
+            await asyncio.sleep(RUN_POLL_S)
+            run = await acall_with_retry(self.client.agents.runs.get, thread_id=tid, run_id=run.id)
+        return run
+
+    async def _create_and_process(self, tid: str, instructions: str | None):
+        for attempt in range(MAX_ATTEMPTS):
+            run = await self._wait_run(tid, await self._start_run(tid, instructions))
+            if getattr(run, "status", None) != "failed":
+                return run
+            err = run_failure(run)
+            if err.status_code != 429 or attempt == MAX_ATTEMPTS - 1:
+                raise err
+            await asyncio.sleep(backoff_delay(err, attempt, BASE_DELAY_S, MAX_DELAY_S, self.run_limiter))
+        raise AssertionError("unreachable")
+
+    async def run_once(self, instructions: str | None = None, thread_id: str | None = None):
+        return await self._create_and_process(await self.ensure_thread(thread_id), instructions)
+
+    async def fetch_last_assistant_reply(self, thread_id: str | None = None) -> str:
+        tid = thread_id or self.thread_id
+        if not tid:
+            return ""
+        tid = self._live.get(tid, tid)
+        cur = self.cursor_for(tid)
+        for m in await cur.arefresh():
+            if m.role == "assistant":
+                self.ledger_for(tid).note(m.text)
+        return cur.last_reply()
+
+    def cursor_for(self, live_tid: str) -> MessageCursor:
+        if live_tid not in self._cursors:
+            self._cursors[live_tid] = MessageCursor(self.client.agents, live_tid)
+        return self._cursors[live_tid]
+
+    # ---------- Thread compaction ----------
+    def ledger_for(self, live_tid: str) -> ThreadLedger:
+        if live_tid not in self._ledgers:
+            self._ledgers[live_tid] = ThreadLedger()
+        return self._ledgers[live_tid]
+
+    async def ledger(self, thread_id: str | None = None) -> ThreadLedger:
+        return self.ledger_for(await self.ensure_thread(thread_id))
+
+    async def _summarise(self, tid: str) -> str:
+        """AzureAgentBase._summarise: the summary reply, or RunFailed if the run did not complete with one."""
+        request = await self.client.agents.messages.create(thread_id=tid, role="user", content=SUMMARY_REQUEST)
+        ledger = self.ledger_for(tid)
+        ledger.note(SUMMARY_REQUEST)
+        run = await self._create_and_process(tid, SUMMARY_INSTRUCTIONS)
+        fresh = await self.cursor_for(tid).arefresh()
+        for m in fresh:
+            if m.role == "assistant":
+                ledger.note(m.text)
+        ids = [m.id for m in fresh]
+        after = fresh[ids.index(request.id) + 1:] if request.id in ids else []
+        replies = [m.text for m in after if m.role == "assistant" and m.text]
+        status = getattr(run, "status", None)
+        if status != "completed" or not replies:
+            raise RunFailed(f"Summary run on {tid} ended {status!r} without a reply")
+        return replies[-1]
+
+    async def compact(self, thread_id: str | None = None) -> str:
+        """
+        Summarise the conversation's thread onto a fresh one (see AzureAgentBase.compact);
+        returns the new thread id. On RunFailed the old thread stays live.
+        """
+        old = await self.ensure_thread(thread_id)
+        before = self.ledger_for(old).tokens
+        summary = await self._summarise(old)
+
+        new = await self.new_thread()
+        if thread_id:
+            self._live[thread_id] = new
+        else:
+            self.thread_id = new
+        await self.send_user_message(memory_message(summary), new)
+        self._cursors.pop(old, None)
+        self._ledgers.pop(old, None)
+        self.compactions += 1
+        self.tokens_compacted += max(0, before - self.ledger_for(new).tokens)
+        self.log_in(f"Compacted thread {old} ({before} tokens) into {new}")
+        return new
+
+    async def maybe_compact(self, thread_id: str | None = None) -> bool:
+        tid = self._live.get(thread_id, thread_id) if thread_id else self.thread_id
+        if tid and tid in self._ledgers and self._ledgers[tid].over_budget():
+            try:
+                await self.compact(thread_id)
+            except RunFailed as e:
+                logger.warning(f"[{self.name}] Compaction failed, staying on thread {tid}: {e}")
+                return False
+            return True
+        return False
+
+    def forget_thread(self, thread_id: str) -> None:
+        """Drop a conversation's cached messages and bookkeeping (e.g. when its session expires)."""
+        tid = self._live.pop(thread_id, thread_id)
+        self._cursors.pop(tid, None)
+        self._ledgers.pop(tid, None)
+
+    async def close(self) -> None:
+        await self.client.close()
+        await self.credential.close()
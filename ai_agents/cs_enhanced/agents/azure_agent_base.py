@@ -1,14 +1,47 @@
 # agents/azure_agent_base.py
-import os
+import os, threading, time
+from typing import Iterator
 from loguru import logger
-from azure.identity import AzureCliCredential
 from azure.ai.projects import AIProjectClient
-from azure.ai.agents.models import ListSortOrder
+from azure.ai.agents.models import AgentStreamEvent, ListSortOrder, MessageDeltaChunk, ThreadRun
 from agents.agent_base import AgentBase
+from utils.credentials import get_credential
+from utils.message_cursor import Message, MessageCursor
+from utils.ratelimit import MAX_ATTEMPTS, BASE_DELAY_S, MAX_DELAY_S, backoff_delay, call_with_retry, is_retryable, limiter_for, status_of
+from utils.thread_memory import SUMMARY_INSTRUCTIONS, SUMMARY_REQUEST, ThreadLedger, memory_message
 from dotenv import load_dotenv
 
 load_dotenv()
 
+RUN_POLL_S = float(os.getenv("AGENT_RUN_POLL_S", "1"))
+ACTIVE_RUN_STATUSES = {"queued", "in_progress", "requires_action", "cancelling"}
+
+
+class RunFailed(RuntimeError):
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def run_failure(run) -> RunFailed:
+    """RunFailed for a failed run; a throttled run carries 429 (it is finished, so re-running it is safe)."""
+    code = getattr(run.last_error, "code", None)
+    return RunFailed(f"Run failed: {run.last_error}", 429 if code == "rate_limit_exceeded" else None)
+
+
+_clients: dict[tuple, AIProjectClient] = {}
+_clients_lock = threading.Lock()
+
+
+def project_client(endpoint: str, project_name: str) -> AIProjectClient:
+    """One AIProjectClient per project per process; agents built on every Streamlit rerun reuse it."""
+    with _clients_lock:
+        key = (endpoint, project_name)
+        if key not in _clients:
+            _clients[key] = AIProjectClient(endpoint=endpoint, project_name=project_name, credential=get_credential())
+        return _clients[key]
+
+
 class AzureAgentBase(AgentBase):
     def __init__(self, name: str, agent_id: str | None = None, **kw):
         super().__init__(name=name, **kw)
@@ -18,9 +51,13 @@ class AzureAgentBase(AgentBase):
         if not (self.endpoint and self.project_name and self.agent_id):
             raise RuntimeError("Set AZURE_SEARCH_ENDPOINT, AZURE_AI_PROJECT_NAME, AGENT_ID")
 
-        cred = AzureCliCredential()  # requires `az login`
-        self.client = AIProjectClient(endpoint=self.endpoint, project_name=self.project_name, credential=cred)
+        self.client = project_client(self.endpoint, self.project_name)  # requires `az login`
         self.thread_id = None
+        self.run_limiter = limiter_for("agent")   # RATE_LIMIT_AGENT_RPM
+        self._cursors: dict[str, MessageCursor] = {}
+        self._ledgers: dict[str, ThreadLedger] = {}
+        self.compactions = 0
+        self.tokens_compacted = 0
 
     def new_thread(self):
         thread = self.client.agents.threads.create()
@@ -34,22 +71,184 @@ class AzureAgentBase(AgentBase):
     def send_user_message(self, content: str):
         tid = self.ensure_thread()
         self.client.agents.messages.create(thread_id=tid, role="user", content=content)
+        self.ledger(tid).note(content)
         self.log_in(f"User message added to thread {tid}")
 
+    # ---------- Runs ----------
+    # A run is not idempotent: once one exists on the thread, retrying the call
+    # that made it would start a second run (or be refused while the first is
+    # active). So only the create is retried, and only after checking that the
+    # failed attempt did not start a run anyway; polling and throttled runs
+    # (which have already finished) are retried separately.
+    def _active_run(self, tid: str):
+        """The thread's newest run if it has not finished, else None."""
+        for run in self.client.agents.runs.list(thread_id=tid, order=ListSortOrder.DESCENDING, limit=1):
+            return run if run.status in ACTIVE_RUN_STATUSES else None
+        return None
+
+    def _start_run(self, tid: str, instructions: str | None):
+        for attempt in range(MAX_ATTEMPTS):
+            self.run_limiter.acquire()
+            try:
+                return self.client.agents.runs.create(thread_id=tid, agent_id=self.agent_id, instructions=instructions)
+            except Exception as e:
+                if attempt == MAX_ATTEMPTS - 1 or not is_retryable(e):
+                    raise
+                time.sleep(backoff_delay(e, attempt, BASE_DELAY_S, MAX_DELAY_S, self.run_limiter))
+                # A 429 was refused outright; a timeout or 5xx may have reached the service
+                run = self._active_run(tid) if status_of(e) != 429 else None
+                if run is not None:
+                    return run
+        raise AssertionError("unreachable")
+
+    def _wait_run(self, tid: str, run):
+        while run.status in ACTIVE_RUN_STATUSES:
+            if run.status == "requires_action":
+                # No client-side tools are registered (as runs.create_and_process does without a toolset)
+                call_with_retry(self.client.agents.runs.cancel, thread_id=tid, run_id=run.id)
+            time.sleep(RUN_POLL_S)
+            run = call_with_retry(self.client.agents.runs.get, thread_id=tid, run_id=run.id)
+        return run
+
+    def _create_and_process(self, tid: str, instructions: str | None):
+        for attempt in range(MAX_ATTEMPTS):
+            run = self._wait_run(tid, self._start_run(tid, instructions))
+            if getattr(run, "status", None) != "failed":
+                return run
+            err = run_failure(run)
+            # A throttled run is safe to re-run: the user message is still on the thread
+            if err.status_code != 429 or attempt == MAX_ATTEMPTS - 1:
+                raise err
+            time.sleep(backoff_delay(err, attempt, BASE_DELAY_S, MAX_DELAY_S, self.run_limiter))
+        raise AssertionError("unreachable")
+
     def run_once(self, instructions: str | None = None):
+        return self._create_and_process(self.ensure_thread(), instructions)
+
+    def _stream_deltas(self, tid: str, instructions: str | None) -> Iterator[tuple[str, str]]:
+        """(message id, text delta) pairs of the run's reply."""
+        with self.client.agents.runs.stream(thread_id=tid, agent_id=self.agent_id, instructions=instructions) as stream:
+            for event_type, event_data, _ in stream:
+                if isinstance(event_data, MessageDeltaChunk):
+                    if event_data.text:
+                        yield event_data.id, event_data.text
+                elif isinstance(event_data, ThreadRun) and event_data.status == "failed":
+                    raise run_failure(event_data)
+                elif event_type == AgentStreamEvent.ERROR:
+                    raise RunFailed(f"Run stream error: {event_data}")
+
+    def run_stream(self, instructions: str | None = None) -> Iterator[str]:
+        """
+        Like run_once, but yields the reply's text deltas as the model produces them.
+        Throttling is retried only before the first delta; after that the text is
+        already on screen and a failure is raised to the caller. If the stream
+        drops after its run started, that run is waited on and its reply yielded
+        whole rather than starting another.
+        """
         tid = self.ensure_thread()
-        run = self.client.agents.runs.create_and_process(
-            thread_id=tid, agent_id=self.agent_id, instructions=instructions
-        )
-        if getattr(run, "status", None) == "failed":
-            raise RuntimeError(f"Run failed: {run.last_error}")
-        return run
+        for attempt in range(MAX_ATTEMPTS):
+            self.run_limiter.acquire()
+            parts, msg_id = [], None
+            try:
+                for msg_id, delta in self._stream_deltas(tid, instructions):
+                    parts.append(delta)
+                    yield delta
+                text = "".join(parts)
+                self.ledger(tid).note(text)
+                if msg_id:
+                    # The reply is already read: the next fetch starts after it
+                    self.cursor(tid).advance(Message(msg_id, "assistant", text))
+                return
+            except Exception as e:
+                if parts or attempt == MAX_ATTEMPTS - 1 or not is_retryable(e):
+                    raise
+                time.sleep(backoff_delay(e, attempt, BASE_DELAY_S, MAX_DELAY_S, self.run_limiter))
+                run = self._active_run(tid) if status_of(e) != 429 else None
+                if run is not None:
+                    run = self._wait_run(tid, run)
+                    if run.status == "failed":
+                        raise run_failure(run)
+                    yield self.fetch_last_assistant_reply()
+                    return
+
+    def cursor(self, thread_id: str | None = None) -> MessageCursor:
+        tid = thread_id or self.ensure_thread()
+        if tid not in self._cursors:
+            self._cursors[tid] = MessageCursor(self.client.agents, tid)
+        return self._cursors[tid]
+
+    def new_messages(self) -> list[Message]:
+        """Messages added to the current thread since the last call (oldest first)."""
+        return self.cursor().refresh() if self.thread_id else []
 
     def fetch_last_assistant_reply(self) -> str:
         if not self.thread_id:
             return ""
-        msgs = self.client.agents.messages.list(thread_id=self.thread_id, order=ListSortOrder.ASCENDING)
-        for m in reversed(list(msgs)):
-            if m.role == "assistant" and getattr(m, "text_messages", None):
-                return m.text_messages[-1].text.value
-        return ""
+        cur = self.cursor()
+        for m in cur.refresh():       # only this turn's messages go over the wire
+            if m.role == "assistant":
+                self.ledger().note(m.text)
+        return cur.last_reply()
+
+    # ---------- Thread compaction ----------
+    def ledger(self, thread_id: str | None = None) -> ThreadLedger:
+        tid = thread_id or self.ensure_thread()
+        if tid not in self._ledgers:
+            self._ledgers[tid] = ThreadLedger()
+        return self._ledgers[tid]
+
+    def _summarise(self, tid: str) -> str:
+        """
+        Ask the agent to summarise thread tid and return its reply. Raises
+        RunFailed unless the run completed with an assistant reply posted after
+        the request; a stale reply from an earlier turn never counts.
+        """
+        request = self.client.agents.messages.create(thread_id=tid, role="user", content=SUMMARY_REQUEST)
+        ledger = self.ledger(tid)
+        ledger.note(SUMMARY_REQUEST)
+        run = self._create_and_process(tid, SUMMARY_INSTRUCTIONS)
+        fresh = self.cursor(tid).refresh()
+        for m in fresh:
+            if m.role == "assistant":
+                ledger.note(m.text)
+        ids = [m.id for m in fresh]
+        after = fresh[ids.index(request.id) + 1:] if request.id in ids else []
+        replies = [m.text for m in after if m.role == "assistant" and m.text]
+        status = getattr(run, "status", None)
+        if status != "completed" or not replies:
+            raise RunFailed(f"Summary run on {tid} ended {status!r} without a reply")
+        return replies[-1]
+
+    def compact(self) -> str:
+        """
+        Have the agent summarise the current thread, then continue on a fresh
+        thread seeded with that summary. Returns the new thread id. If the
+        summary run fails, RunFailed is raised and the old thread (with its
+        cursor and ledger) stays current.
+        """
+        old = self.ensure_thread()
+        before = self.ledger(old).tokens
+        summary = self._summarise(old)
+
+        self.new_thread()
+        self.send_user_message(memory_message(summary))
+        self._cursors.pop(old, None)
+        self._ledgers.pop(old, None)
+        self.compactions += 1
+        self.tokens_compacted += max(0, before - self.ledger().tokens)
+        self.log_in(f"Compacted thread {old} ({before} tokens) into {self.thread_id}")
+        return self.thread_id
+
+    def maybe_compact(self) -> bool:
+        if self.thread_id and self.ledger().over_budget():
+            try:
+                self.compact()
+            except RunFailed as e:
+                logger.warning(f"[{self.name}] Compaction failed, staying on thread {self.thread_id}: {e}")
+                return False
+            return True
+        return False
+
+    def memory_stats(self) -> dict:
+        stats = self.ledger().stats() if self.thread_id else ThreadLedger().stats()
+        return {**stats, "compactions": self.compactions, "tokens_compacted": self.tokens_compacted}
@@ -1,36 +1,250 @@
 # agents/qna_agent.py
+import asyncio, os, time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Iterator
 from agents.azure_agent_base import AzureAgentBase
-from vectordb.base import VectorStore
+from agents.async_azure_agent_base import AsyncAzureAgentBase
+from vectordb.base import AsyncVectorStore, VectorStore
+from vectordb.bm25 import HybridStore
+from vectordb.filters import Filters
+from utils.answer_cache import SemanticAnswerCache
+from utils.context_assembly import ContextAssembler
+from utils.thread_memory import ThreadLedger
+
+PREP_WORKERS = int(os.getenv("QNA_PREP_WORKERS", "8"))
+# Shared by every QnAAgent (app.py builds one per Streamlit session); threads start on demand
+_prep_pool = ThreadPoolExecutor(max_workers=PREP_WORKERS, thread_name_prefix="qna-prep")
+
+
+def compose_augmented(question: str, results, similarity_threshold: float, ledger: ThreadLedger | None = None,
+                      assembler: ContextAssembler | None = None, q_vec=None) -> str:
+    if not results:
+        return question
+
+    top = max(r.get("@search.score", 0.0) for r in results)   # hybrid results are ordered by fused rank
+    if top < similarity_threshold:
+        return question
+
+    relevant = [r for r in results if r.get("@search.score", 0) >= similarity_threshold]
+    if ledger is not None:
+        # Docs sent earlier on this thread are still in the model's context
+        relevant = ledger.unseen(relevant)
+        if not relevant:
+            return f"User question:\n{question}\n\n(The relevant docs were already provided earlier in this conversation.)"
+    if assembler is not None:
+        relevant = assembler.select(q_vec, relevant)
+    if ledger is not None:
+        ledger.mark(relevant)
+
+    context = "\n\n".join(str(r.get("content", "")) for r in relevant)
+    return (
+        f"User question:\n{question}\n\n"
+        f"Relevant docs (only include if directly helpful to the user):\n{context}"
+    )
+
 
 class QnAAgent(AzureAgentBase):
-    def __init__(self, name, vector_store: VectorStore | None, embed_fn, similarity_threshold=0.75, **kw):
+    """
+    RAG turn: embed -> answer cache -> search -> compose -> message -> run.
+    With overlap=True (QNA_OVERLAP, default on), thread preparation (creating
+    the thread on a cold session, compacting a full one) runs in a worker
+    thread alongside embedding and search, since neither needs the other.
+    All agents share one pool of QNA_PREP_WORKERS threads for this.
+    Per-stage seconds of the last turn are in `timings`.
+
+    `filters` (e.g. {"tenant": "acme", "locale": "en"}) scope retrieval for
+    every turn; execute(..., filters=...) overrides them for one question.
+    Scoped turns bypass the answer cache, which is not keyed by filter.
+    """
+
+    def __init__(self, name, vector_store: VectorStore | None, embed_fn, similarity_threshold=0.75,
+                 answer_cache: SemanticAnswerCache | None = None, assembler: ContextAssembler | None = None,
+                 overlap: bool | None = None, filters: Filters | None = None, **kw):
         super().__init__(name=name, **kw)
         self.vs = vector_store
         self.embed_fn = embed_fn
         self.similarity_threshold = similarity_threshold
+        self.answer_cache = answer_cache
+        self.assembler = assembler or ContextAssembler()
+        self.filters = filters
+        self.overlap = os.getenv("QNA_OVERLAP", "1") != "0" if overlap is None else overlap
+        self.timings: dict[str, float] = {}
 
-    def build_augmented(self, question: str) -> str:
+    def _timed(self, stage: str, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.timings[f"{stage}_s"] = time.perf_counter() - t0
+
+    def _prepare_thread(self) -> str:
+        self.ensure_thread()
+        self.maybe_compact()
+        return self.thread_id
+
+    def retrieve(self, q_vec, question: str = "", filters: Filters | None = None):
+        if not self.vs:
+            return []
+        if isinstance(self.vs, HybridStore) and question:
+            return self.vs.hybrid_search(question, q_vec, self.assembler.candidates, include_vectors=True,
+                                         filters=filters)
+        return self.vs.search(q_vec, self.assembler.candidates, include_vectors=True, filters=filters)
+
+    def build_augmented(self, question: str, q_vec=None, results=None, filters: Filters | None = None) -> str:
         if not self.vs:
             return question
 
-        q_vec = self.embed_fn(question)
-        results = self.vs.search(q_vec, 3)
+        if results is None:
+            q_vec = q_vec if q_vec is not None else self.embed_fn(question)
+            results = self.retrieve(q_vec, question, filters if filters is not None else self.filters)
+        content = compose_augmented(question, results, self.similarity_threshold, self.ledger(), self.assembler, q_vec)
+        self.log_in(f"Context: {self.assembler.last}")
+        return content
+
+    def _prepare_turn(self, question: str, system_prompt: str | None, filters: Filters | None = None) -> tuple:
+        """
+        Everything up to the posted user message. Returns (q_vec, cached_answer);
+        cached_answer is None on a miss. The thread prep never outlives the turn:
+        its error is raised here, including on a cache hit.
+        """
+        self.timings = {}
+        t0 = time.perf_counter()
+        prep = _prep_pool.submit(self._timed, "thread", self._prepare_thread) if self.overlap else None
+        try:
+            return self._prepare_overlapped(question, system_prompt, filters, prep, t0)
+        except BaseException:
+            if prep is not None and not prep.cancel():
+                wait([prep])                       # its own error, if any, is superseded by this one
+            raise
+
+    def _prepare_overlapped(self, question: str, system_prompt: str | None, filters: Filters | None,
+                            prep: Future | None, t0: float) -> tuple:
+        cache = self.answer_cache if not filters else None
+        # Exact-token questions ("Policy number 456") are answered from the keyword index without embedding
+        results = self._timed("keyword", self.vs.exact_match, question, self.assembler.candidates, filters) \
+            if isinstance(self.vs, HybridStore) else []
+        q_vec = None
         if not results:
-            return question
+            # One embedding serves both the answer cache lookup and retrieval
+            q_vec = self._timed("embed", self.embed_fn, question) if (self.vs or cache is not None) else None
+            if cache is not None:
+                cached = self._timed("cache", cache.get, q_vec, system_prompt)
+                if cached is not None:
+                    self.log_in("Answer cache hit")
+                    if prep is not None and not prep.cancel():
+                        prep.result()              # already creating / compacting the thread: let it finish
+                    return q_vec, cached
+
+        if prep is None:
+            self._timed("thread", self._prepare_thread)
+        if not results:
+            results = self._timed("search", self.retrieve, q_vec, question, filters)
+        if prep is not None:
+            prep.result()                          # compose needs the (possibly new) thread's ledger
+        content = self._timed("compose", self.build_augmented, question, q_vec, results)
+        self._timed("message", self.send_user_message, content)
+        self.timings["prepare_s"] = time.perf_counter() - t0
+        return q_vec, None
 
-        top = results[0].get("@search.score", 0.0)
-        if top < self.similarity_threshold:
-            print("This happened")
+    def execute(self, question: str, system_prompt: str | None = None, filters: Filters | None = None) -> str:
+        t0 = time.perf_counter()
+        filters = filters if filters is not None else self.filters
+        q_vec, cached = self._prepare_turn(question, system_prompt, filters)
+        if cached is not None:
+            return cached
+
+        self._timed("run", self.run_once, system_prompt)
+        answer = self._timed("fetch", self.fetch_last_assistant_reply)
+        if self.answer_cache is not None and q_vec is not None and not filters:
+            self.answer_cache.put(q_vec, question, answer, system_prompt)
+        self.timings["total_s"] = time.perf_counter() - t0
+        self.log_in("Timings: " + ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in self.timings.items()))
+        return answer
+
+    def execute_stream(self, question: str, system_prompt: str | None = None,
+                       filters: Filters | None = None) -> Iterator[str]:
+        """execute(), yielding the reply in text deltas as they arrive (a cache hit comes as one chunk)."""
+        t0 = time.perf_counter()
+        filters = filters if filters is not None else self.filters
+        q_vec, cached = self._prepare_turn(question, system_prompt, filters)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        for delta in self.run_stream(instructions=system_prompt):
+            if not parts:
+                self.timings["first_token_s"] = time.perf_counter() - t0
+            parts.append(delta)
+            yield delta
+        if self.answer_cache is not None and q_vec is not None and not filters:
+            self.answer_cache.put(q_vec, question, "".join(parts), system_prompt)
+        self.timings["total_s"] = time.perf_counter() - t0
+
+
+class AsyncQnAAgent(AsyncAzureAgentBase):
+    """
+    QnAAgent for asyncio: embed_fn and vector_store are awaited
+    (e.g. helpers_func.aembed and AsyncAzureSearchStore / ThreadedAsyncStore).
+    Pass thread_id per conversation to serve many of them from one instance,
+    and filters per question to scope retrieval (as in QnAAgent).
+    """
+
+    def __init__(self, name, vector_store: AsyncVectorStore | None, embed_fn, similarity_threshold=0.75,
+                 answer_cache: SemanticAnswerCache | None = None, assembler: ContextAssembler | None = None,
+                 filters: Filters | None = None, **kw):
+        super().__init__(name=name, **kw)
+        self.vs = vector_store
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.answer_cache = answer_cache
+        self.assembler = assembler or ContextAssembler()
+        self.filters = filters
+
+    async def _prepare_thread(self, thread_id: str | None) -> str:
+        await self.ensure_thread(thread_id)
+        await self.maybe_compact(thread_id)
+        return await self.ensure_thread(thread_id)
+
+    async def retrieve(self, q_vec, filters: Filters | None = None):
+        if not self.vs:
+            return []
+        return await self.vs.search(q_vec, self.assembler.candidates, include_vectors=True, filters=filters)
+
+    async def build_augmented(self, question: str, q_vec=None, thread_id: str | None = None, results=None) -> str:
+        if not self.vs:
             return question
 
-        context = "\n\n".join(str(r.get("content", "")) for r in results if r.get("@search.score", 0) >= self.similarity_threshold)
-        return (
-            f"User question:\n{question}\n\n"
-            f"Relevant docs (only include if directly helpful to the user):\n{context}"
-        )
-
-    def execute(self, question: str, system_prompt: str | None = None) -> str:
-        content = self.build_augmented(question)
-        self.send_user_message(content)
-        self.run_once(instructions=system_prompt)
-        return self.fetch_last_assistant_reply()
+        q_vec = q_vec if q_vec is not None else await self.embed_fn(question)
+        results = results if results is not None else await self.retrieve(q_vec, self.filters)
+        return compose_augmented(question, results, self.similarity_threshold, await self.ledger(thread_id),
+                                 self.assembler, q_vec)
+
+    async def execute(self, question: str, system_prompt: str | None = None, thread_id: str | None = None,
+                      filters: Filters | None = None) -> str:
+        filters = filters if filters is not None else self.filters
+        cache = self.answer_cache if not filters else None
+        # Thread prep (create / compact) overlaps embedding and search, as in QnAAgent
+        prep = asyncio.create_task(self._prepare_thread(thread_id))
+        try:
+            q_vec = await self.embed_fn(question) if (self.vs or cache is not None) else None
+            if cache is not None:
+                cached = cache.get(q_vec, system_prompt)
+                if cached is not None:
+                    self.log_in("Answer cache hit")
+                    await prep             # a prep error belongs to this turn, not the next one
+                    return cached
+            results = await self.retrieve(q_vec, filters)
+        except BaseException:
+            # Never leave it running past this turn; gather retrieves its outcome so nothing is left unobserved
+            await asyncio.gather(prep, return_exceptions=True)
+            raise
+        tid = await prep
+
+        content = await self.build_augmented(question, q_vec, tid, results)
+        tid = await self.send_user_message(content, tid)
+        await self.run_once(instructions=system_prompt, thread_id=tid)
+        answer = await self.fetch_last_assistant_reply(tid)
+        if cache is not None:
+            cache.put(q_vec, question, answer, system_prompt)
+        return answer
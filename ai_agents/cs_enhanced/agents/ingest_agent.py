@@ -1,10 +1,39 @@
 # agents/simple_rest_ingest_agent.py
-import os, json, uuid, requests
-from typing import Iterable, List, Dict, Tuple, Union, Optional
+import os, json, time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Dict, Tuple, Union, Optional
+from utils.ingest_manifest import IngestManifest, bump_index_version, doc_id
+from utils.ingest_journal import IngestJournal, DeadLetterLog
+from utils.transport import HttpTransport, get_transport
+from utils.ratelimit import call_with_retry, limiter_for
 
-Pair = Tuple[str, str]
+Pair = Union[Tuple[str, str], Tuple[str, str, Dict[str, object]]]   # (title, content[, metadata])
 Doc  = Dict[str, object]
 
+
+def parse_filter_fields(spec: str) -> Dict[str, str]:
+    """AZURE_SEARCH_FILTER_FIELDS "product,rank:Edm.Int32" -> {"product": "Edm.String", "rank": "Edm.Int32"}"""
+    fields = {}
+    for part in spec.split(","):
+        name, _, edm = part.strip().partition(":")
+        if name:
+            fields[name] = edm.strip() or "Edm.String"
+    return fields
+
+
+class UploadError(RuntimeError):
+    def __init__(self, message: str, status_code: Optional[int] = None, response=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = response    # lets utils.ratelimit read Retry-After
+
+
+def _is_permanent(exc: Exception) -> bool:
+    """4xx (other than timeout/conflict/throttle) won't succeed on retry; everything else might."""
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    return status is not None and 400 <= int(status) < 500 and int(status) not in (408, 409, 429)
+
 class IngestAgent:
     """
     Minimal REST-based ingest agent for Azure Cognitive Search.
@@ -17,6 +46,11 @@ class IngestAgent:
       AZURE_SEARCH_API_VERSION=2024-07-01
       AZURE_SEARCH_VECTOR_FIELD=contentVector
       AZURE_EMBED_DIM=1536
+      AZURE_SEARCH_FILTER_FIELDS=product,locale,tenant
+
+    Filter fields are created filterable/facetable in the index schema and sent
+    with each document that has them (pairs may carry a metadata dict as a third
+    element), so QnA retrieval can be scoped by them.
     """
 
     def __init__(
@@ -29,7 +63,17 @@ class IngestAgent:
         api_version: Optional[str] = None,
         vector_field: Optional[str] = None,
         embed_dims: Optional[int] = None,
+        filter_fields: Optional[Dict[str, str]] = None,  # metadata field -> Edm type
         timeout: int = 60,
+        mirror_store=None,                       # optional local VectorStore (e.g. HNSWStore) fed on every upload
+        embed_concurrency: int = 8,              # parallel calls when embed_fn is single-text only
+        window_size: int = 512,                  # docs read/embedded/uploaded per pipeline step
+        max_upload_docs: int = 1000,             # Azure Search caps a docs/index batch at 1000 actions
+        max_upload_bytes: int = 15 * 1024 * 1024,  # ... and at 16 MB of request body
+        manifest_path: Optional[str] = None,     # local record of ids already in the index
+        journal_path: Optional[str] = None,      # checkpoint dir for embedded-but-unsent windows
+        dead_letter_path: Optional[str] = None,  # JSONL of docs that failed permanently
+        transport: Optional[HttpTransport] = None,  # pooled keep-alive session (shared by default)
     ):
         self.embed_fn    = embed_fn
         self.endpoint    = (endpoint or os.getenv("AZURE_SEARCH_ENDPOINT") or "").rstrip("/")
@@ -38,7 +82,16 @@ class IngestAgent:
         self.api_version = api_version or os.getenv("AZURE_SEARCH_API_VERSION") or "2024-07-01"
         self.vector_field = vector_field or os.getenv("AZURE_SEARCH_VECTOR_FIELD") or "contentVector"
         self.embed_dims   = int(embed_dims or os.getenv("AZURE_EMBED_DIM") or 1536)
+        self.filter_fields = filter_fields if filter_fields is not None else \
+            parse_filter_fields(os.getenv("AZURE_SEARCH_FILTER_FIELDS", "product,locale,tenant"))
         self.timeout = timeout
+        self.mirror_store = mirror_store
+        self.embed_concurrency = embed_concurrency
+        self.window_size = window_size
+        self.max_upload_docs = max_upload_docs
+        self.max_upload_bytes = max_upload_bytes
+        self.http = transport or get_transport()
+        self.limiter = limiter_for("index")   # RATE_LIMIT_INDEX_RPM
 
         if not self.endpoint or not self.api_key:
             raise RuntimeError("Set AZURE_SEARCH_ENDPOINT and AZURE_SEARCH_API_KEY (admin key).")
@@ -46,12 +99,15 @@ class IngestAgent:
         self._idx_url  = f"{self.endpoint}/indexes/{self.index_name}?api-version={self.api_version}"
         self._docs_url = f"{self.endpoint}/indexes/{self.index_name}/docs/index?api-version={self.api_version}"
         self._headers  = {"Content-Type": "application/json", "api-key": self.api_key}
+        self.manifest  = IngestManifest(self.index_name, manifest_path)
+        self.journal   = IngestJournal(self.index_name, journal_path)
+        self.dead_letters = DeadLetterLog(self.index_name, dead_letter_path)
 
     # ---------- Index ----------
     def delete_index_if_exists(self) -> bool:
-        r = requests.get(self._idx_url, headers=self._headers, timeout=self.timeout)
+        r = self.http.get(self._idx_url, headers=self._headers, timeout=self.timeout)
         if r.status_code == 200:
-            d = requests.delete(self._idx_url, headers=self._headers, timeout=self.timeout)
+            d = self.http.delete(self._idx_url, headers=self._headers, timeout=self.timeout)
             d.raise_for_status()
             return True
         if r.status_code == 404:
@@ -75,14 +131,19 @@ class IngestAgent:
                     "retrievable": True,
                     "dimensions": self.embed_dims,
                     "vectorSearchProfile": "vprofile"
-                }
+                },
+                *(
+                    {"name": name, "type": edm, "filterable": True, "facetable": True,
+                     "searchable": False, "retrievable": True}
+                    for name, edm in self.filter_fields.items()
+                ),
             ],
             "vectorSearch": {
                 "algorithms": [{ "name": "hnsw", "kind": "hnsw" }],
                 "profiles":   [{ "name": "vprofile", "algorithm": "hnsw" }]
             }
         }
-        r = requests.put(self._idx_url, headers=self._headers, data=json.dumps(schema), timeout=self.timeout)
+        r = self.http.put(self._idx_url, headers=self._headers, data=json.dumps(schema), timeout=self.timeout)
         if r.status_code not in (200, 201):
             try:
                 raise RuntimeError(f"Create index failed: {r.status_code} {r.json()}")
@@ -90,7 +151,7 @@ class IngestAgent:
                 raise RuntimeError(f"Create index failed: {r.status_code} {r.text}")
 
     def ensure_index(self) -> None:
-        r = requests.get(self._idx_url, headers=self._headers, timeout=self.timeout)
+        r = self.http.get(self._idx_url, headers=self._headers, timeout=self.timeout)
         if r.status_code == 404:
             self.create_index()
         elif r.status_code != 200:
@@ -106,9 +167,11 @@ class IngestAgent:
     # ---------- Embedding ----------
     def _embed_batch(self, texts: List[str]) -> List[List[float]]:
         try:
-            vecs = self.embed_fn(texts)       # batch style
+            vecs = self.embed_fn(texts)       # batch style (e.g. utils.batch_embed.BatchEmbedder)
         except TypeError:
-            vecs = [self.embed_fn(t) for t in texts]  # single-text style
+            # single-text style: bounded fan-out, map() keeps input order
+            with ThreadPoolExecutor(max_workers=max(1, self.embed_concurrency)) as pool:
+                vecs = list(pool.map(self.embed_fn, texts))
 
         if not vecs:
             return []
@@ -117,50 +180,277 @@ class IngestAgent:
         return vecs
 
     # ---------- Upload ----------
-    def _upload_docs(self, docs: List[Doc]) -> None:
-        payload = {"value": [
-            {
-                "@search.action": "mergeOrUpload",
-                "id": d["id"],
-                "title": d["title"],
-                "content": d["content"],
-                self.vector_field: d["vector"]
-            } for d in docs
-        ]}
-        r = requests.post(self._docs_url, headers=self._headers, data=json.dumps(payload), timeout=self.timeout)
+    def _doc_action(self, d: Doc) -> bytes:
+        return json.dumps({
+            "@search.action": "mergeOrUpload",
+            "id": d["id"],
+            "title": d["title"],
+            "content": d["content"],
+            **{f: d[f] for f in self.filter_fields if d.get(f) is not None},
+            self.vector_field: d["vector"]
+        }).encode("utf-8")
+
+    def _upload_batches(self, docs: List[Doc]) -> Iterator[Tuple[List[Doc], bytes]]:
+        """Yield (docs, body) request bodies capped by doc count and serialized size."""
+        batch: List[Doc] = []
+        parts: List[bytes] = []
+        size = 0
+        for d in docs:
+            action = self._doc_action(d)
+            if parts and (len(parts) >= self.max_upload_docs or size + len(action) + 1 > self.max_upload_bytes):
+                yield batch, b'{"value":[' + b",".join(parts) + b"]}"
+                batch, parts, size = [], [], 0
+            batch.append(d)
+            parts.append(action)
+            size += len(action) + 1
+        if parts:
+            yield batch, b'{"value":[' + b",".join(parts) + b"]}"
+
+    def _post_batch(self, body: bytes, what: str = "Upload"):
+        r = self.http.post(self._docs_url, headers=self._headers, data=body, timeout=self.timeout)
         if r.status_code >= 300:
             try:
-                raise RuntimeError(f"Upload failed: {r.status_code} {r.json()}")
+                detail = r.json()
             except Exception:
-                raise RuntimeError(f"Upload failed: {r.status_code} {r.text}")
+                detail = r.text
+            raise UploadError(f"{what} failed: {r.status_code} {detail}", r.status_code, r)
+        return r
 
-    # ---------- Public: execute ----------
-    def execute_pairs(self, pairs: Iterable[Pair], *, recreate: bool = False, create_if_missing: bool = True) -> Dict[str, int]:
-        """Ingest (title, content) pairs; embeds content and uploads."""
-        items: List[Doc] = [{"id": str(uuid.uuid4()), "title": t, "content": c} for (t, c) in pairs]
+    def _index_batch(self, docs: List[Doc], body: bytes) -> List[Tuple[Doc, str]]:
+        """POST once; raise on anything retryable (incl. per-document 429/503), return permanent per-doc failures."""
+        r = self._post_batch(body)
+        try:
+            results = r.json().get("value", [])
+        except Exception:
+            results = []
+        by_id = {str(d["id"]): d for d in docs}
+        failed = []
+        for item in results:
+            if item.get("status", True):
+                continue
+            code = item.get("statusCode")
+            err = UploadError(f"{code} {item.get('errorMessage')}", code, r)
+            if not _is_permanent(err):
+                # mergeOrUpload is idempotent, so the whole batch can simply be re-sent
+                raise UploadError(f"Upload partially failed: {err}", code, r)
+            doc = by_id.get(str(item.get("key")))
+            if doc is not None:
+                failed.append((doc, str(err)))
+        return failed
+
+    def _send_docs(self, docs: List[Doc], body: bytes) -> List[Tuple[Doc, str]]:
+        """POST one batch; returns [(doc, error)] for documents the service rejected permanently."""
+        try:
+            return call_with_retry(self._index_batch, docs, body, limiter=self.limiter)
+        except UploadError as e:
+            if not _is_permanent(e):
+                raise
+            if len(docs) == 1:
+                return [(docs[0], str(e))]
+            # One bad document fails the whole request: retry one by one to isolate it
+            failed: List[Tuple[Doc, str]] = []
+            for d in docs:
+                failed += self._send_docs([d], b'{"value":[' + self._doc_action(d) + b"]}")
+            return failed
+
+    def _upload_docs(self, docs: List[Doc]) -> Dict[str, object]:
+        requests_made = bytes_sent = 0
+        failed: List[Tuple[Doc, str]] = []
+        for batch, body in self._upload_batches(docs):
+            failed += self._send_docs(batch, body)
+            requests_made += 1
+            bytes_sent += len(body)
+        bad = {str(d["id"]) for d, _ in failed}
+        ok = [d for d in docs if str(d["id"]) not in bad] if bad else docs
+        if self.mirror_store is not None:
+            self.mirror_store.upsert(ok)
+        self.manifest.add(ok)
+        if ok:
+            bump_index_version(self.index_name)
+        return {"requests": requests_made, "bytes": bytes_sent, "ok": ok, "failed": failed}
 
+    def _delete_docs(self, ids: List[str]) -> int:
+        for i in range(0, len(ids), self.max_upload_docs):
+            chunk = ids[i:i + self.max_upload_docs]
+            body = json.dumps({"value": [{"@search.action": "delete", "id": d} for d in chunk]}).encode("utf-8")
+            call_with_retry(self._post_batch, body, "Delete", limiter=self.limiter)
+        if ids and self.mirror_store is not None:
+            self.mirror_store.delete(ids)
+        self.manifest.remove(ids)
+        if ids:
+            bump_index_version(self.index_name)
+        return len(ids)
+
+    # ---------- Streaming pipeline ----------
+    def _prepare(self, recreate: bool, create_if_missing: bool) -> None:
         if recreate:
             self.recreate_index()
+            self.manifest.clear()
+            bump_index_version(self.index_name)
         elif create_if_missing:
             self.ensure_index()
 
-        texts = [d["content"] for d in items]
-        vecs  = self._embed_batch(texts)
-        docs  = [{**d, "vector": v} for d, v in zip(items, vecs)]
+    def _embed_window(self, window: List[Doc], reuse: Dict[str, List[float]], stats) -> List[Doc]:
+        """Attach vectors, reusing journaled ones; isolate and dead-letter texts the API rejects."""
+        need = [d for d in window if d["id"] not in reuse]
+        vecs: Dict[str, List[float]] = {}
+        if need:
+            try:
+                vecs = dict(zip((d["id"] for d in need), self._embed_batch([d["content"] for d in need])))
+            except Exception as e:
+                if not _is_permanent(e):
+                    raise
+                for d in need:
+                    try:
+                        vecs[d["id"]] = self._embed_batch([d["content"]])[0]
+                    except Exception as one:
+                        if not _is_permanent(one):
+                            raise
+                        self.dead_letters.write(d, "embed", str(one))
+                        stats["dead_lettered"] += 1
+        stats["resumed"] += len(window) - len(need)
+        out = []
+        for d in window:
+            v = reuse.pop(d["id"], None) or vecs.get(d["id"])
+            if v is not None:
+                out.append({**d, "vector": v})
+        return out
+
+    def _run_windows(self, windows: Iterator[List[Doc]], embed: bool,
+                     reuse: Optional[Dict[str, List[float]]] = None) -> Dict[str, float]:
+        """
+        Embed window N+1 while window N uploads on a background thread, so at most
+        two windows are ever held in memory regardless of input size. Embedded
+        windows are journaled before upload and committed after, so a crashed run
+        can resume without re-embedding.
+        """
+        stats = {"ingested": 0, "windows": 0, "upload_requests": 0, "upload_bytes": 0,
+                 "dead_lettered": 0, "resumed": 0, "read_s": 0.0, "embed_s": 0.0, "upload_s": 0.0}
+        reuse = reuse if reuse is not None else {}
+
+        def upload(docs: List[Doc], seq: Optional[int]) -> Dict[str, float]:
+            # Runs on the uploader thread: returns its counts for the main thread to merge into stats
+            t0 = time.perf_counter()
+            res = self._upload_docs(docs)
+            for d, err in res["failed"]:
+                self.dead_letters.write(d, "upload", err)
+            if seq is not None:
+                self.journal.commit(seq, (str(d["id"]) for d in res["ok"]))
+            return {"upload_s": time.perf_counter() - t0, "upload_requests": res["requests"],
+                    "upload_bytes": res["bytes"], "ingested": len(res["ok"]), "dead_lettered": len(res["failed"])}
+
+        def merge(counts: Dict[str, float]) -> None:
+            for key, value in counts.items():
+                stats[key] += value
+
+        started = time.perf_counter()
+        pending = None
+        with ThreadPoolExecutor(max_workers=1) as uploader:
+            while True:
+                t0 = time.perf_counter()
+                window = next(windows, None)
+                stats["read_s"] += time.perf_counter() - t0
+                if window is None:
+                    break
+                seq = None
+                if embed:
+                    t0 = time.perf_counter()
+                    window = self._embed_window(window, reuse, stats)
+                    stats["embed_s"] += time.perf_counter() - t0
+                    if not window:
+                        continue
+                    seq = self.journal.record_embedded(window)
+                if pending is not None:
+                    merge(pending.result())
+                pending = uploader.submit(upload, window, seq)
+                stats["windows"] += 1
+            if pending is not None:
+                merge(pending.result())
+
+        elapsed = time.perf_counter() - started
+        n = stats["ingested"]
+        stats["elapsed_s"] = elapsed
+        stats["docs_per_s"] = n / elapsed if elapsed else 0.0
+        stats["embed_docs_per_s"] = n / stats["embed_s"] if stats["embed_s"] else 0.0
+        stats["upload_docs_per_s"] = n / stats["upload_s"] if stats["upload_s"] else 0.0
+        return stats
+
+    @staticmethod
+    def _windows(items: Iterable[Doc], size: int) -> Iterator[List[Doc]]:
+        it = iter(items)
+        while True:
+            window = list(islice(it, size))
+            if not window:
+                return
+            yield window
+
+    # ---------- Public: execute ----------
+    def execute_pairs(self, pairs: Iterable[Pair], *, recreate: bool = False, create_if_missing: bool = True,
+                      window: Optional[int] = None, delete_missing: bool = False) -> Dict[str, float]:
+        """
+        Ingest (title, content) pairs; embeds content and uploads in fixed-size
+        windows. `pairs` may be any iterator (e.g. a file reader). Returns counts
+        plus per-stage timings and throughput. A pair may carry a metadata dict
+        as a third element ({"product": "auto", "locale": "en"}); its filter
+        fields are uploaded with the document.
+
+        Ids are content-addressed (title + normalized content), so rows already in
+        the manifest are skipped without embedding. With delete_missing=True, rows
+        the index holds but `pairs` does not contain are deleted; the manifest
+        covers the whole index, so only use it when `pairs` is the full corpus.
+
+        If a previous run died part-way, its committed ids are folded into the
+        manifest and its embedded-but-unsent vectors are reused. Documents the
+        services reject permanently go to the dead-letter file instead of
+        aborting the run (see replay_dead_letters).
+        """
+        reuse, committed = self.journal.load()
+        self._prepare(recreate, create_if_missing)
+        if recreate:
+            self.journal.clear()
+        else:
+            self.manifest.add({"id": i} for i in committed if i not in self.manifest)
+        seen: set[str] = set()
+        skipped = 0
+
+        def new_items() -> Iterator[Doc]:
+            nonlocal skipped
+            for t, c, *rest in pairs:
+                meta = rest[0] if rest else {}
+                i = doc_id(t, c, meta)
+                if i in seen:
+                    continue
+                seen.add(i)
+                if i in self.manifest:
+                    skipped += 1
+                    continue
+                yield {**meta, "id": i, "title": t, "content": c}
+
+        try:
+            stats = self._run_windows(self._windows(new_items(), window or self.window_size), embed=True, reuse=reuse)
+            gone = [i for i in self.manifest.docs if i not in seen] if delete_missing else []
+            stats["deleted"] = self._delete_docs(gone)
+        finally:
+            self.manifest.save()
+        self.journal.clear()
+        stats["skipped"] = skipped
+        return stats
 
-        self._upload_docs(docs)
-        return {"ingested": len(docs)}
+    def replay_dead_letters(self) -> Dict[str, float]:
+        """Re-ingest everything in the dead-letter file; rows that fail again are re-appended."""
+        rows = self.dead_letters.take()
+        return self.execute_pairs(((str(r["title"]), str(r["content"]), r.get("metadata") or {}) for r in rows),
+                                  create_if_missing=False, delete_missing=False)
 
-    def execute_docs(self, docs: Iterable[Doc], *, recreate: bool = False, create_if_missing: bool = True) -> Dict[str, int]:
+    def execute_docs(self, docs: Iterable[Doc], *, recreate: bool = False, create_if_missing: bool = True,
+                     window: Optional[int] = None) -> Dict[str, float]:
         """
         Ingest dict docs that already have embeddings:
-        each doc must have keys: id, title, content, vector
+        each doc must have keys: id, title, content, vector (+ any filter fields)
         (kept for full compatibility with your old upload_docs path)
         """
-        docs = list(docs)
-        if recreate:
-            self.recreate_index()
-        elif create_if_missing:
-            self.ensure_index()
-        self._upload_docs(docs)
-        return {"ingested": len(docs)}
+        self._prepare(recreate, create_if_missing)
+        try:
+            return self._run_windows(self._windows(docs, window or self.window_size), embed=False)
+        finally:
+            self.manifest.save()
@@ -1,12 +1,18 @@
 # app.py
 import json
 import os
+import time
 import ast
 import re
 import streamlit as st
 from agents.customer_service_agent import QnAAgent
 from agents.ingest_agent import IngestAgent
 from vectordb.azure_search import AzureSearchStore
+from vectordb.local_store import LocalVectorStore
+from vectordb.hnsw import HNSWStore
+from vectordb.segment import SegmentStore, write_segment
+from vectordb.bm25 import HybridStore
+from vectordb.filters import parse_filters
 from dotenv import load_dotenv
 from pathlib import Path
 load_dotenv()
@@ -15,28 +21,84 @@ load_dotenv()
 INDEX_NAME = os.getenv("AZURE_SEARCH_INDEX_NAME", "my-index")
 AGENT_ID = os.getenv("AGENT_ID")
 SIM_THRESH = float(os.getenv("SIMILARITY_THRESHOLD", "0.75"))
+VECTOR_STORE = os.getenv("VECTOR_STORE", "azure")  # "azure" | "local" | "hnsw" | "segment"
+LOCAL_STORE = VECTOR_STORE in ("local", "hnsw", "segment")
+QUANTIZATION = os.getenv("VECTOR_QUANTIZATION") or None  # None | "int8" | "pq"
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") != "0"    # local stores: BM25 + vector with RRF
+SEGMENT_PATH = os.getenv("VECTOR_SEGMENT_PATH", str(Path(__file__).resolve().parent / "data" / "faq.segment"))
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "1") != "0"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "3600"))
 
 # Bring your own embedding function (sync wrapper)
 # Here we assume you have a utility `embed(text:str)->list[float]`
-from utils.helpers_func import embed,load_pairs_from_text
+from utils.helpers_func import embed,embed_batch,load_pairs_from_text
+from utils.ingest_manifest import bump_index_version, doc_id
+from utils.answer_cache import SemanticAnswerCache
+from utils.transport import get_transport
+from utils.credentials import get_credential
 
 st.set_page_config(page_title="Azure Foundry Agent", page_icon="🧩", layout="centered")
 st.title("🧩 Azure Foundry Agent — Q&A + Ingest")
 
 # Vector store
-store = AzureSearchStore(index_name=INDEX_NAME)
+@st.cache_resource(show_spinner=False)
+def init_local_store():
+    # Kept across reruns; a segment store also survives restarts (memory-mapped, shared page cache)
+    if VECTOR_STORE == "segment":
+        base = SegmentStore.open_or_create(SEGMENT_PATH, quantization=QUANTIZATION)
+    else:
+        base = HNSWStore() if VECTOR_STORE == "hnsw" else LocalVectorStore(quantization=QUANTIZATION)
+    return HybridStore(base) if HYBRID_SEARCH else base
+
+def base_store(s):
+    return s.store if isinstance(s, HybridStore) else s
+
+@st.cache_resource(show_spinner=False)
+def init_azure_store(index_name: str):
+    return AzureSearchStore(index_name=index_name)
 
-# Agents
-qna = QnAAgent(name="qna", vector_store=store, embed_fn=embed,similarity_threshold=SIM_THRESH, agent_id=AGENT_ID, verbose=True)
+@st.cache_resource(show_spinner=False)
+def init_ingest(index_name: str | None):
+    return IngestAgent(embed_fn=embed_batch, index_name=index_name)
 
-def embed_batch(texts):
-    return [embed(t) for t in texts]
+store = init_local_store() if LOCAL_STORE else init_azure_store(INDEX_NAME)
 
-ingest = IngestAgent(embed_fn=embed_batch, index_name=os.getenv("AZURE_SEARCH_INDEX"))
+ingest = None if LOCAL_STORE else init_ingest(os.getenv("AZURE_SEARCH_INDEX"))
+CACHE_INDEX = ingest.index_name if ingest else f"local-{VECTOR_STORE}"
+
+@st.cache_resource(show_spinner=False)
+def init_answer_cache(index_name: str):
+    return SemanticAnswerCache(index_name, threshold=ANSWER_CACHE_THRESHOLD, ttl_s=ANSWER_CACHE_TTL_S)
+
+# Agents: one per browser session, so its thread (and compaction/dedupe state) survives reruns.
+# The project client and credential underneath are shared by the whole process.
+if "qna" not in st.session_state:
+    st.session_state.qna = QnAAgent(name="qna", vector_store=store, embed_fn=embed, similarity_threshold=SIM_THRESH,
+                                    agent_id=AGENT_ID, verbose=True)
+qna = st.session_state.qna
+qna.vs = store              # the local store is rebuilt on "recreate"
+qna.answer_cache = init_answer_cache(CACHE_INDEX) if ANSWER_CACHE else None
 
 with st.sidebar:
     st.subheader("Settings")
     system_prompt = st.text_area("System prompt", value="You are a helpful, concise customer service agent acting as a co-worker.")
+    if st.button("New conversation"):
+        qna.thread_id = None
+    scope = st.text_input("Filter (field=value; field=a|b)", value="",
+                          help="Restrict retrieval by metadata, e.g. product=auto; locale=en|fr")
+    try:
+        qna.filters = parse_filters(scope) or None
+    except ValueError as e:
+        st.warning(str(e))
+        qna.filters = None
+    ms = qna.memory_stats()
+    st.caption(f"Thread: {qna.thread_id or '(none yet)'} · {ms['thread_messages']} messages · "
+               f"~{ms['thread_tokens']} tokens · {ms['compactions']} compactions")
+    cs = get_credential().stats()
+    st.caption(f"Credential: {cs['fetches']} token fetches ({cs['fetch_s']:.1f}s) · {cs['hits']} cache hits")
+    ts = get_transport().stats()
+    st.caption(f"HTTP: {ts['requests']} requests · {ts['reuse_rate']:.0%} on reused connections · {ts['avg_ms']:.0f} ms avg")
 
 st.header("Ask a question")
 q = st.text_input("Your question")
@@ -44,10 +106,23 @@ if st.button("Ask"):
     if not q.strip():
         st.warning("Type a question.")
     else:
-        with st.spinner("Thinking..."):
-            answer = qna.execute(question=q, system_prompt=system_prompt)
         st.success("Answer:")
-        st.write(answer)
+        t0, first = time.perf_counter(), []
+
+        def timed(deltas):
+            for d in deltas:
+                if not first:
+                    first.append(time.perf_counter() - t0)
+                yield d
+
+        # Tokens render as they stream in instead of after the whole run completes
+        st.write_stream(timed(qna.execute_stream(question=q, system_prompt=system_prompt)))
+        if first:
+            st.caption(f"First token after {first[0]:.2f}s · total {time.perf_counter() - t0:.2f}s")
+        if qna.assembler.last:
+            ctx = qna.assembler.last
+            st.caption(f"Context: {ctx['selected']} of {ctx['candidates']} chunks · {ctx['tokens']} tokens "
+                       f"(budget {qna.assembler.token_budget}) · {ctx['duplicates']} near-duplicates dropped")
 
 st.markdown("---")
 
@@ -59,6 +134,8 @@ file = st.file_uploader(
     accept_multiple_files=False
 )
 recreate = st.checkbox("Recreate index (delete & create)", value=False)
+# The manifest covers the whole index, not one file: pruning removes rows that came from any other file too
+prune = st.checkbox("Delete indexed rows that are not in this file (whole index)", value=False)
 
 if st.button("Ingest"):
     if not file:
@@ -73,9 +150,41 @@ if st.button("Ingest"):
 
         # Preview so you can confirm it's not line-splitting
         st.write(f"Parsed {len(pairs)} pairs.")
-        st.caption(f"Example: {pairs[0][0]} → {pairs[0][1][:120]}...")
+        st.caption(f"Example: {pairs[0][0]} → {pairs[0][1][:120]}..."
+                   + (f" · metadata {pairs[0][2]}" if len(pairs[0]) > 2 else ""))
 
         with st.spinner("Embedding & upserting..."):
-            res = ingest.execute_pairs(pairs, recreate=recreate, create_if_missing=not recreate)
-
-        st.success(f"Ingested {res['ingested']} pairs into '{ingest.index_name}'.")
\ No newline at end of file
+            if LOCAL_STORE:
+                if recreate:
+                    if VECTOR_STORE == "segment":
+                        base_store(store).segment = None
+                        write_segment(SEGMENT_PATH, [])
+                    init_local_store.clear()
+                    store = qna.vs = init_local_store()
+                rows = [(t, c, rest[0] if rest else {}) for t, c, *rest in pairs]
+                store.upsert(
+                    {**meta, "id": doc_id(t, c, meta), "title": t, "content": c, "vector": v}
+                    for (t, c, meta), v in zip(rows, embed_batch([c for _, c, _ in rows]))
+                )
+                if isinstance(base_store(store), SegmentStore):
+                    # Rewriting the segment costs O(corpus); do it once the overlay has grown (SEGMENT_COMPACT_FRACTION),
+                    # otherwise just write the overlay to delta/ so this ingest survives a restart
+                    base_store(store).maybe_compact()
+                bump_index_version(CACHE_INDEX)
+                res = {"ingested": len(pairs)}
+            else:
+                res = ingest.execute_pairs(pairs, recreate=recreate, create_if_missing=not recreate, delete_missing=prune)
+
+        target = "local store" if LOCAL_STORE else f"'{ingest.index_name}'"
+        st.success(f"Ingested {res['ingested']} pairs into {target}.")
+        if "skipped" in res:
+            st.caption(f"Unchanged (skipped): {res['skipped']} · deleted: {res['deleted']}")
+        if res.get("resumed"):
+            st.caption(f"Resumed {res['resumed']} embeddings from an interrupted run")
+        if res.get("dead_lettered"):
+            st.warning(f"{res['dead_lettered']} rows failed permanently; see {ingest.dead_letters.path}")
+        if "docs_per_s" in res:
+            st.caption(
+                f"{res['docs_per_s']:.0f} docs/s overall · embed {res['embed_s']:.1f}s · "
+                f"upload {res['upload_s']:.1f}s over {res['upload_requests']} requests"
+            )
\ No newline at end of file
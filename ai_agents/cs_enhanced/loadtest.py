@@ -0,0 +1,122 @@
+# loadtest.py
+"""
+Load test for server.QnAService against local stand-ins: embeddings and the
+agent run are simulated network waits, retrieval is a real LocalVectorStore.
+Requests go straight into the ASGI callable, so no server process is needed.
+
+  python loadtest.py --workers 1 4 16 64 --requests 400 --clients 128
+
+For each worker count (= API_MAX_CONCURRENCY) prints throughput, latency
+percentiles and how many requests were shed with 503.
+"""
+import argparse, asyncio, json, random, statistics, time, uuid
+import numpy as np
+
+from server import QnAService
+from vectordb.base import ThreadedAsyncStore
+from vectordb.local_store import LocalVectorStore
+
+
+class StandInQnA:
+    """Async QnA agent with the same call pattern as AsyncQnAAgent and fake network latencies."""
+
+    def __init__(self, store, dims: int, embed_ms: float, run_ms: float):
+        self.vs = store
+        self.dims = dims
+        self.embed_ms = embed_ms
+        self.run_ms = run_ms
+        self.answer_cache = None
+
+    async def new_thread(self) -> str:
+        await asyncio.sleep(0.02)
+        return f"thread_{uuid.uuid4().hex[:12]}"
+
+    async def execute(self, question: str, system_prompt=None, thread_id=None, filters=None) -> str:
+        await asyncio.sleep(random.uniform(0.5, 1.5) * self.embed_ms / 1000)
+        q_vec = np.random.default_rng(abs(hash(question)) % 2**32).standard_normal(self.dims).tolist()
+        hits = await self.vs.search(q_vec, 3, filters=filters)
+        content = "\n\n".join(str(h.get("content", "")) for h in hits)
+        await asyncio.sleep(random.uniform(0.5, 1.5) * self.run_ms / 1000)
+        return f"answer to {question!r} ({len(content)} chars of context)"
+
+
+async def call(app, method: str, path: str, body=None):
+    sent = []
+    payload = json.dumps(body).encode() if body is not None else b""
+    delivered = False
+
+    async def receive():
+        nonlocal delivered
+        if delivered:
+            await asyncio.sleep(3600)
+        delivered = True
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(msg):
+        sent.append(msg)
+
+    await app({"type": "http", "method": method, "path": path, "headers": []}, receive, send)
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+async def run_once(workers: int, args, store) -> dict:
+    app = QnAService(lambda: (StandInQnA(store, args.dims, args.embed_ms, args.run_ms), None),
+                     max_concurrency=workers, max_queue=args.queue)
+    await app.startup()
+    sessions = [f"s{i}" for i in range(args.sessions)]
+    latencies, statuses = [], []
+    todo = iter(range(args.requests))
+
+    async def client():
+        for i in todo:
+            t0 = time.perf_counter()
+            status, _ = await call(app, "POST", "/ask",
+                                   {"question": f"question {i % 50}", "session_id": random.choice(sessions)})
+            statuses.append(status)
+            if status == 200:
+                latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.clients)))
+    elapsed = time.perf_counter() - t0
+    ok = statuses.count(200)
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+    return {
+        "workers": workers,
+        "ok": ok,
+        "shed_503": statuses.count(503),
+        "req_per_s": ok / elapsed,
+        "p50_ms": 1000 * q[49],
+        "p95_ms": 1000 * q[94],
+        "sessions": len(app.sessions),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16, 64])
+    ap.add_argument("--requests", type=int, default=400)
+    ap.add_argument("--clients", type=int, default=128, help="concurrent client loops")
+    ap.add_argument("--sessions", type=int, default=200)
+    ap.add_argument("--queue", type=int, default=256, help="API_MAX_QUEUE")
+    ap.add_argument("--docs", type=int, default=20000, help="rows in the stand-in vector store")
+    ap.add_argument("--dims", type=int, default=1536)
+    ap.add_argument("--embed-ms", type=float, default=30.0)
+    ap.add_argument("--run-ms", type=float, default=800.0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    local = LocalVectorStore(dims=args.dims, initial_capacity=args.docs)
+    local.upsert({"id": str(i), "content": f"doc {i}", "vector": v}
+                 for i, v in enumerate(rng.standard_normal((args.docs, args.dims), dtype=np.float32)))
+    store = ThreadedAsyncStore(local)
+
+    print(f"{'workers':>8} {'ok':>6} {'503':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for w in args.workers:
+        r = asyncio.run(run_once(w, args, store))
+        print(f"{r['workers']:>8} {r['ok']:>6} {r['shed_503']:>5} {r['req_per_s']:>8.1f} "
+              f"{r['p50_ms']:>8.0f} {r['p95_ms']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
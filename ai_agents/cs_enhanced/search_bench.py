@@ -0,0 +1,93 @@
+# search_bench.py
+"""
+Batch vs serial retrieval throughput of the local vector stores: the same
+queries through a loop of search() and through one search_many() call.
+
+  python search_bench.py --queries 1000 --docs 20000 --stores local int8 segment
+
+Prints queries/s for both paths, the speed-up, and whether the batch returned
+the same ids as the loop (it should, query for query, in order). Stores are
+filled with random vectors; `--filter` adds a product= filter to every query.
+
+`--quant-report` also prints memory and recall@k of float32 vs int8 vs pq over
+the same vectors (vectordb.quantization.compare_modes).
+"""
+import argparse, shutil, tempfile, time
+import numpy as np
+
+from vectordb.hnsw import HNSWStore
+from vectordb.local_store import LocalVectorStore
+from vectordb.quantization import compare_modes
+from vectordb.segment import SegmentStore, write_segment
+
+PRODUCTS = ["auto", "home", "life", "travel"]
+
+
+def build(kind: str, items, dims: int, tmp: str):
+    if kind in ("segment", "segment-int8"):
+        write_segment(f"{tmp}/{kind}", items)
+        return SegmentStore(f"{tmp}/{kind}", quantization="int8" if kind == "segment-int8" else None)
+    if kind == "hnsw":
+        store = HNSWStore(dims, ef_construction=64)
+    else:
+        store = LocalVectorStore(dims=dims, initial_capacity=len(items),
+                                 quantization=None if kind == "local" else kind)
+    store.upsert(items)
+    return store
+
+
+def run(store, queries, k: int, filters) -> dict:
+    store.search_many(queries[:8], k, filters=filters)     # warm-up: codebooks, bitmaps, page cache
+    t0 = time.perf_counter()
+    serial = [store.search(q, k, filters=filters) for q in queries]
+    t1 = time.perf_counter()
+    batch = store.search_many(queries, k, filters=filters)
+    t2 = time.perf_counter()
+    same = sum([h["id"] for h in a] == [h["id"] for h in b] for a, b in zip(serial, batch))
+    return {
+        "serial_qps": len(queries) / (t1 - t0),
+        "batch_qps": len(queries) / (t2 - t1),
+        "speedup": (t1 - t0) / (t2 - t1),
+        "same": same,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--stores", nargs="+", default=["local", "int8", "segment"],
+                    choices=["local", "int8", "pq", "segment", "segment-int8", "hnsw"])
+    ap.add_argument("--queries", type=int, default=1000)
+    ap.add_argument("--docs", type=int, default=20000)
+    ap.add_argument("--dims", type=int, default=1536)
+    ap.add_argument("-k", type=int, default=5)
+    ap.add_argument("--filter", default=None, choices=PRODUCTS, help="restrict every query to one product")
+    ap.add_argument("--quant-report", action="store_true", help="also compare memory / recall of the quantizers")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.docs, args.dims)).astype(np.float32)
+    items = [{"id": str(i), "content": f"doc {i}", "product": PRODUCTS[i % len(PRODUCTS)], "vector": v}
+             for i, v in enumerate(vectors)]
+    queries = rng.standard_normal((args.queries, args.dims)).astype(np.float32)
+    filters = {"product": args.filter} if args.filter else None
+
+    tmp = tempfile.mkdtemp(prefix="search_bench-")
+    try:
+        print(f"{args.queries} queries, k={args.k}, {args.docs} docs x {args.dims} dims"
+              + (f", filter product={args.filter}" if filters else ""))
+        print(f"{'store':<14} {'serial q/s':>11} {'batch q/s':>10} {'speed-up':>9} {'same ids':>9}")
+        for kind in args.stores:
+            r = run(build(kind, items, args.dims, tmp), queries, args.k, filters)
+            print(f"{kind:<14} {r['serial_qps']:>11.0f} {r['batch_qps']:>10.0f} {r['speedup']:>8.1f}x "
+                  f"{r['same']:>5}/{args.queries}")
+        if args.quant_report:
+            print(f"\n{'mode':<8} {'bytes/vec':>10} {f'recall@{args.k}':>10} {'search ms':>10} {'build s':>8}")
+            for r in compare_modes(vectors, queries[:200], k=args.k):
+                print(f"{r['mode']:<8} {r['bytes_per_vector']:>10.1f} {r[f'recall@{args.k}']:>10.3f} "
+                      f"{r['search_ms']:>10.2f} {r['build_s']:>8.2f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
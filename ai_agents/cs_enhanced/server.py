@@ -0,0 +1,349 @@
+# server.py
+"""
+ASGI front-end for the Q&A and ingest agents, for the web widget.
+
+  uvicorn server:app --host 0.0.0.0 --port 8000
+
+  POST /ask     {"question": str, "session_id"?: str, "system_prompt"?: str, "filters"?: {field: value | [values]}}
+  POST /ingest  {"pairs": [[title, content, {metadata}?], ...], "recreate"?: bool, "delete_missing"?: bool}
+  GET  /health
+
+Each session_id is bound to its own agent thread, and questions within one
+session are serialized (a thread can only have one active run); a question
+waiting on its session does not hold a concurrency slot. At most
+API_MAX_CONCURRENCY questions run at once; up to API_MAX_QUEUE more wait, and
+anything beyond that gets 503 + Retry-After instead of piling up. Malformed
+filters are a 400; unexpected errors come back as a 500 with a JSON body.
+
+VECTOR_STORE is "azure" (default) or "segment"; the in-memory local / hnsw
+stores are rejected at startup, since nothing could ingest into them here.
+"""
+import asyncio, json, os, time, uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from vectordb.filters import check_filters
+
+load_dotenv()
+
+MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "32"))
+MAX_QUEUE = int(os.getenv("API_MAX_QUEUE", "256"))
+SESSION_TTL_S = float(os.getenv("API_SESSION_TTL_S", "3600"))
+MAX_SESSIONS = int(os.getenv("API_MAX_SESSIONS", "10000"))
+MAX_BODY_BYTES = int(os.getenv("API_MAX_BODY_BYTES", str(32 * 1024 * 1024)))
+DEFAULT_SYSTEM_PROMPT = os.getenv("SYSTEM_PROMPT", "You are a helpful, concise customer service agent acting as a co-worker.")
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class Overloaded(HTTPError):
+    def __init__(self):
+        super().__init__(503, "Server busy, retry shortly", {"retry-after": "1"})
+
+
+class ConcurrencyGate:
+    """Semaphore with a bounded wait queue: beyond max_queue waiters, callers are rejected."""
+
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self.in_flight = self.waiting = self.rejected = 0
+
+    async def __aenter__(self):
+        if self.waiting >= self.max_queue and self._sem.locked():
+            self.rejected += 1
+            raise Overloaded()
+        self.waiting += 1
+        try:
+            await self._sem.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.in_flight -= 1
+        self._sem.release()
+
+
+class _Session:
+    __slots__ = ("thread_id", "lock", "seen", "users")
+
+    def __init__(self, thread_id: str, now: float):
+        self.thread_id = thread_id
+        self.lock = asyncio.Lock()
+        self.seen = now
+        self.users = 0             # requests holding or waiting for the lock; pinned while > 0
+
+
+class SessionThreads:
+    """session_id -> agent thread id, LRU-bounded with idle expiry; one lock per session."""
+
+    def __init__(self, capacity: int = MAX_SESSIONS, ttl_s: float = SESSION_TTL_S,
+                 on_evict: Optional[Callable[[str], None]] = None):
+        self.capacity = capacity
+        self.ttl_s = ttl_s
+        self.on_evict = on_evict
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._creating: Dict[str, asyncio.Lock] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict(self, now: float) -> None:
+        while self._sessions:
+            sid, s = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.capacity and now - s.seen < self.ttl_s:
+                break
+            if s.users:                # never drop a session mid-question, or one a request is queued on
+                self._sessions.move_to_end(sid)
+                break
+            del self._sessions[sid]
+            if self.on_evict is not None:
+                self.on_evict(s.thread_id)
+
+    async def _pin(self, session_id: str, new_thread: Callable[[], Awaitable[str]]) -> _Session:
+        now = time.monotonic()
+        s = self._sessions.get(session_id)
+        if s is None:
+            # Two first requests for the same session must not create two threads
+            creating = self._creating.setdefault(session_id, asyncio.Lock())
+            try:
+                async with creating:
+                    s = self._sessions.get(session_id)
+                    if s is None:
+                        s = self._sessions[session_id] = _Session(await new_thread(), now)
+            finally:
+                self._creating.pop(session_id, None)
+        # No await between the lookup and this: an entry is never evicted while a request holds it
+        s.users += 1
+        s.seen = now
+        self._sessions.move_to_end(session_id)
+        self._evict(now)
+        return s
+
+    @asynccontextmanager
+    async def hold(self, session_id: str, new_thread: Callable[[], Awaitable[str]]) -> AsyncIterator[str]:
+        """The session's thread id, with its lock held; questions within one session run one at a time."""
+        s = await self._pin(session_id, new_thread)
+        try:
+            async with s.lock:
+                yield s.thread_id
+        finally:
+            s.users -= 1
+            s.seen = time.monotonic()
+
+
+class QnAService:
+    """
+    Plain ASGI app (no framework dependency). `components` returns (qna, ingest)
+    and is called on lifespan startup: qna needs async new_thread() and
+    execute(question, system_prompt, thread_id); ingest is a sync IngestAgent or None.
+    """
+
+    def __init__(self, components: Callable[[], Tuple[Any, Any]], *,
+                 max_concurrency: int = MAX_CONCURRENCY, max_queue: int = MAX_QUEUE):
+        self.components = components
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.qna = self.ingest = None
+        self.gate: Optional[ConcurrencyGate] = None
+        self.sessions = SessionThreads(on_evict=self._forget_thread)
+        self._ingest_lock: Optional[asyncio.Lock] = None
+        self.served = self.failed = 0
+        self.started = time.time()
+
+    async def startup(self) -> None:
+        if self.qna is None:
+            self.qna, self.ingest = self.components()
+        self.gate = ConcurrencyGate(self.max_concurrency, self.max_queue)
+        self._ingest_lock = asyncio.Lock()
+
+    async def shutdown(self) -> None:
+        close = getattr(self.qna, "close", None)
+        if close is not None:
+            await close()
+
+    async def _new_thread(self) -> str:
+        async with self.gate:          # creating a thread is an agent call like any other
+            return await self.qna.new_thread()
+
+    def _forget_thread(self, thread_id: str) -> None:
+        forget = getattr(self.qna, "forget_thread", None)
+        if forget is not None:
+            forget(thread_id)
+
+    # ---------- Handlers ----------
+    async def ask(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        question = str(body.get("question") or "").strip()
+        if not question:
+            raise HTTPError(400, "'question' is required")
+        session_id = str(body.get("session_id") or uuid.uuid4().hex)
+        system_prompt = body.get("system_prompt") or DEFAULT_SYSTEM_PROMPT
+        filters = body.get("filters") or None
+        if filters is not None and not isinstance(filters, dict):
+            raise HTTPError(400, "'filters' must be an object of field -> value or [values]")
+        try:
+            check_filters(filters)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+        t0 = time.perf_counter()
+        # Session first: a question queued behind its own session must not hold a slot others could use
+        async with self.sessions.hold(session_id, self._new_thread) as thread_id:
+            async with self.gate:
+                try:
+                    answer = await self.qna.execute(question, system_prompt=system_prompt, thread_id=thread_id,
+                                                    filters=filters)
+                except Exception as e:
+                    self.failed += 1
+                    raise HTTPError(502, f"Agent error: {e}")
+        self.served += 1
+        return {"answer": answer, "session_id": session_id, "thread_id": thread_id,
+                "elapsed_ms": round(1000 * (time.perf_counter() - t0), 1)}
+
+    async def run_ingest(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        if self.ingest is None:
+            raise HTTPError(501, "Ingest is not available with a local vector store")
+        pairs = body.get("pairs")
+        if not isinstance(pairs, list) or not all(
+            isinstance(p, (list, tuple)) and (len(p) == 2 or (len(p) == 3 and isinstance(p[2], dict))) for p in pairs
+        ):
+            raise HTTPError(400, "'pairs' must be a list of [title, content] or [title, content, {metadata}]")
+        if self._ingest_lock.locked():
+            raise HTTPError(409, "An ingest is already running")
+        async with self._ingest_lock:
+            recreate = bool(body.get("recreate", False))
+            try:
+                # IngestAgent is synchronous and long-running: keep it off the event loop
+                return await asyncio.to_thread(
+                    self.ingest.execute_pairs, [(str(p[0]), str(p[1]), *p[2:]) for p in pairs],
+                    recreate=recreate, create_if_missing=not recreate,
+                    delete_missing=bool(body.get("delete_missing", False)),
+                )
+            except Exception as e:
+                logger.exception("Ingest failed")
+                raise HTTPError(500, f"Ingest failed: {e}")
+
+    def health(self) -> Dict[str, Any]:
+        cache = getattr(self.qna, "answer_cache", None)
+        return {
+            "status": "ok",
+            "uptime_s": round(time.time() - self.started, 1),
+            "in_flight": self.gate.in_flight,
+            "waiting": self.gate.waiting,
+            "rejected": self.gate.rejected,
+            "served": self.served,
+            "failed": self.failed,
+            "sessions": len(self.sessions),
+            "ingesting": self._ingest_lock.locked(),
+            "answer_cache": cache.stats() if cache is not None else None,
+        }
+
+    # ---------- ASGI ----------
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                msg = await receive()
+                if msg["type"] == "lifespan.startup":
+                    await self.startup()
+                    await send({"type": "lifespan.startup.complete"})
+                elif msg["type"] == "lifespan.shutdown":
+                    await self.shutdown()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+        if self.gate is None:          # server without lifespan support
+            await self.startup()
+
+        route = (scope["method"], scope["path"].rstrip("/") or "/")
+        try:
+            if route == ("GET", "/health"):
+                status, payload = 200, self.health()
+            elif route == ("POST", "/ask"):
+                status, payload = 200, await self.ask(await self._json(receive))
+            elif route == ("POST", "/ingest"):
+                status, payload = 200, await self.run_ingest(await self._json(receive))
+            else:
+                raise HTTPError(404, "Not found")
+            headers = {}
+        except HTTPError as e:
+            status, payload, headers = e.status, {"error": str(e)}, e.headers
+        except Exception:
+            logger.exception(f"Unhandled error on {route[0]} {route[1]}")
+            status, payload, headers = 500, {"error": "Internal server error"}, {}
+        await self._respond(send, status, payload, headers)
+
+    @staticmethod
+    async def _json(receive) -> Dict[str, Any]:
+        chunks, size = [], 0
+        while True:
+            msg = await receive()
+            chunk = msg.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise HTTPError(413, "Request body too large")
+            chunks.append(chunk)
+            if not msg.get("more_body"):
+                break
+        try:
+            body = json.loads(b"".join(chunks) or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Body must be JSON")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+        return body
+
+    @staticmethod
+    async def _respond(send, status: int, payload: Dict[str, Any], headers: Dict[str, str]) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        raw = [(b"content-type", b"application/json"), (b"content-length", str(len(data)).encode())]
+        raw += [(k.encode(), v.encode()) for k, v in headers.items()]
+        await send({"type": "http.response.start", "status": status, "headers": raw})
+        await send({"type": "http.response.body", "body": data})
+
+
+def default_components():
+    """Real agents, configured from the same env vars as app.py."""
+    vector_store = os.getenv("VECTOR_STORE", "azure")
+    if vector_store not in ("azure", "segment"):
+        # local / hnsw live only in the process that ingested them, and /ingest has no local path
+        raise ValueError(f"VECTOR_STORE={vector_store!r} is not supported by the API server; use 'azure' or 'segment'")
+    from agents.customer_service_agent import AsyncQnAAgent
+    from agents.ingest_agent import IngestAgent
+    from utils.answer_cache import SemanticAnswerCache
+    from utils.helpers_func import aembed, embed_batch
+    from vectordb.azure_search import AsyncAzureSearchStore
+    from vectordb.base import ThreadedAsyncStore
+
+    if vector_store == "segment":
+        from vectordb.segment import SegmentStore
+        path = os.getenv("VECTOR_SEGMENT_PATH", os.path.join(os.path.dirname(__file__), "data", "faq.segment"))
+        store = ThreadedAsyncStore(SegmentStore.open_or_create(path, quantization=os.getenv("VECTOR_QUANTIZATION") or None))
+        ingest, cache_index = None, "local-segment"
+    else:
+        ingest = IngestAgent(embed_fn=embed_batch, index_name=os.getenv("AZURE_SEARCH_INDEX"))
+        store, cache_index = AsyncAzureSearchStore(index_name=ingest.index_name), ingest.index_name
+
+    cache = None
+    if os.getenv("ANSWER_CACHE", "1") != "0":
+        cache = SemanticAnswerCache(cache_index, threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+                                    ttl_s=float(os.getenv("ANSWER_CACHE_TTL_S", "3600")))
+    qna = AsyncQnAAgent(name="qna-api", vector_store=store, embed_fn=aembed,
+                        similarity_threshold=float(os.getenv("SIMILARITY_THRESHOLD", "0.75")),
+                        agent_id=os.getenv("AGENT_ID"), answer_cache=cache, verbose=False)
+    return qna, ingest
+
+
+app = QnAService(default_components)
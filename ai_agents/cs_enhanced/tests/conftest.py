@@ -0,0 +1,25 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Modules import each other as top-level packages (vectordb.*, utils.*), as when run from cs_enhanced/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+def make_items(vectors, **fields):
+    """Items shaped like the ingest path produces: id, title, content, vector (+ metadata)."""
+    items = []
+    for i, v in enumerate(vectors):
+        item = {"id": str(i), "title": f"t{i}", "content": f"doc {i}", "vector": v}
+        for name, values in fields.items():
+            item[name] = values[i % len(values)]
+        items.append(item)
+    return items
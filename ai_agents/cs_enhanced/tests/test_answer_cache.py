@@ -0,0 +1,41 @@
+# tests/test_answer_cache.py
+import pytest
+
+import utils.ingest_manifest as ingest_manifest
+from utils.answer_cache import SemanticAnswerCache
+from utils.ingest_manifest import bump_index_version
+
+
+@pytest.fixture(autouse=True)
+def version_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest_manifest, "DEFAULT_MANIFEST_DIR", tmp_path)
+
+
+def test_hit_above_threshold_only():
+    cache = SemanticAnswerCache("faq", threshold=0.95)
+    assert cache.get([1.0, 0.0], "p") is None
+    cache.put([1.0, 0.0], "q", "A", "p")
+    assert cache.get([0.99, 0.05], "p") == "A"
+    assert cache.get([0.0, 1.0], "p") is None
+    assert cache.stats()["entries"] == 1 and cache.hits == 1 and cache.misses == 2
+
+
+def test_prompt_change_and_ingest_invalidate():
+    cache = SemanticAnswerCache("faq")
+    cache.put([1.0, 0.0], "q", "A", "p")
+    assert cache.get([1.0, 0.0], "other prompt") is None and len(cache) == 0
+
+    cache.put([1.0, 0.0], "q", "A", "p")
+    bump_index_version("faq")
+    assert cache.get([1.0, 0.0], "p") is None and cache.invalidations == 2
+
+
+def test_ttl_and_capacity(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("utils.answer_cache.time.time", lambda: now[0])
+    cache = SemanticAnswerCache("faq", ttl_s=60, capacity=2)
+    for i, vec in enumerate(([1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0])):
+        cache.put(vec, f"q{i}", f"A{i}")
+    assert len(cache) == 2 and cache.get([1.0, 0.0, 0.0]) is None    # least recently used went first
+    now[0] += 61
+    assert cache.get([0.0, 0.0, 1.0]) is None and len(cache) == 0
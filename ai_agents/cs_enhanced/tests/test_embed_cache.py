@@ -0,0 +1,28 @@
+# tests/test_embed_cache.py
+import asyncio
+import threading
+
+from utils.embed_cache import EmbeddingCache
+
+
+def test_aembed_many_keeps_sqlite_off_the_event_loop(tmp_path):
+    loop_thread = threading.get_ident()
+    sqlite_threads = []
+
+    async def batch(texts):
+        return [[float(len(t)), 1.0] for t in texts]
+
+    cache = EmbeddingCache(lambda t: [0.0, 0.0], model="m", dims=2, path=str(tmp_path / "e.sqlite"),
+                           async_batch_fn=batch)
+    load, store = cache._load, cache._store
+    cache._load = lambda hashes: sqlite_threads.append(threading.get_ident()) or load(hashes)
+    cache._store = lambda entries: sqlite_threads.append(threading.get_ident()) or store(entries)
+
+    async def go():
+        first = await cache.aembed_many(["ab", "c"])
+        cache._lru.clear()                              # force the second lookup to disk
+        return first, await cache.aembed_many(["ab", "xyz"])
+
+    assert asyncio.run(go()) == ([[2.0, 1.0], [1.0, 1.0]], [[2.0, 1.0], [3.0, 1.0]])
+    assert sqlite_threads and loop_thread not in sqlite_threads
+    assert cache.stats()["disk_hits"] == 1 and cache.misses == 3
@@ -0,0 +1,59 @@
+# tests/test_filters.py
+import numpy as np
+import pytest
+
+from vectordb.filters import BitmapIndex, matches, parse_filters, to_odata
+
+
+def test_to_odata():
+    assert to_odata(None) is None
+    assert to_odata("product eq 'auto'") == "product eq 'auto'"
+    assert to_odata({"product": "auto", "rank": 2}) == "product eq 'auto' and rank eq 2"
+    assert to_odata({"locale": ["en", "fr"]}) == "search.in(locale, 'en,fr', ',')"
+    assert to_odata({"name": ["O'Brien", "a,b"]}) == "(name eq 'O''Brien' or name eq 'a,b')"
+    assert to_odata({"flag": True, "none": []}) == "flag eq true and false"
+    with pytest.raises(ValueError):
+        to_odata({"bad field": "x"})
+
+
+def test_matches():
+    doc = {"product": "auto", "locale": ["en", "fr"]}
+    assert matches(doc, None)
+    assert matches(doc, {"product": "auto", "locale": "fr"})
+    assert matches(doc, {"product": ["home", "auto"]})
+    assert not matches(doc, {"product": "home"})
+    assert not matches(doc, {"tenant": "acme"})
+    with pytest.raises(ValueError):
+        matches(doc, "product eq 'auto'")
+
+
+def test_parse_filters():
+    assert parse_filters("product=auto; locale=en|fr") == {"product": "auto", "locale": ["en", "fr"]}
+    assert parse_filters("") == {}
+    with pytest.raises(ValueError):
+        parse_filters("product")
+
+
+def test_bitmap_index_mask_clear_and_state():
+    docs = [{"id": str(i), "product": ["auto", "home"][i % 2], "locale": "en" if i < 10 else "fr"}
+            for i in range(20)]
+    bm = BitmapIndex()
+    for row, doc in enumerate(docs):
+        bm.set(row, doc)
+
+    mask = bm.mask({"product": "home", "locale": ["en"]}, 20)
+    assert np.flatnonzero(mask).tolist() == [1, 3, 5, 7, 9]
+    assert bm.mask(None, 20) is None
+    assert not bm.mask({"product": "life"}, 20).any()
+
+    bm.clear(3, docs[3])
+    assert np.flatnonzero(bm.mask({"product": "home", "locale": "en"}, 20)).tolist() == [1, 5, 7, 9]
+    restored = BitmapIndex.from_state(bm.state())
+    assert np.array_equal(restored.mask({"locale": "fr"}, 20), bm.mask({"locale": "fr"}, 20))
+
+
+def test_bitmap_index_only_indexes_listed_fields():
+    bm = BitmapIndex(["product"])
+    bm.set(0, {"id": "0", "product": "auto", "locale": "en"})
+    assert bm.mask({"product": "auto"}, 1).tolist() == [True]
+    assert bm.mask({"locale": "en"}, 1).tolist() == [False]
@@ -0,0 +1,43 @@
+# tests/test_hnsw.py
+import numpy as np
+
+from vectordb.hnsw import HNSWStore
+from conftest import make_items
+
+
+def test_reupsert_unchanged_vector_does_not_tombstone(rng):
+    vectors = rng.standard_normal((50, 16)).astype(np.float32)
+    store = HNSWStore(16, ef_construction=32, compact_fraction=1.0)
+    store.upsert(make_items(vectors, product=["auto", "home"]))
+    store.upsert(make_items(vectors, product=["life"]))
+
+    assert len(store.index) == 50 and not store.index._deleted
+    assert store.search(vectors[7], 1)[0]["product"] == "life"
+    assert store.search(vectors[7], 5, filters={"product": "auto"}) == []
+
+
+def test_reupsert_changed_vector_replaces_row(rng):
+    vectors = rng.standard_normal((20, 16)).astype(np.float32)
+    store = HNSWStore(16, ef_construction=32, compact_fraction=1.0)
+    store.upsert(make_items(vectors))
+    store.upsert([{"id": "3", "title": "t3", "content": "moved", "vector": vectors[9] + 0.01}])
+
+    assert store.index._deleted == {3}
+    assert [h["id"] for h in store.search(vectors[3], 20)].count("3") == 1
+
+
+def test_compacts_once_tombstones_pass_fraction(rng, monkeypatch):
+    monkeypatch.setattr("vectordb.hnsw.COMPACT_MIN", 1)
+    vectors = rng.standard_normal((40, 16)).astype(np.float32)
+    store = HNSWStore(16, ef_construction=32, compact_fraction=0.25)
+    store.upsert(make_items(vectors, product=["auto", "home"]))
+    store.delete([str(i) for i in range(9)])
+    assert len(store.index._deleted) == 9                  # 9/40 is under the threshold
+
+    store.delete(["9"])
+    assert not store.index._deleted and len(store.index) == 30
+    assert len(store) == 30
+    for i in (10, 25, 39):
+        assert store.search(vectors[i], 1)[0]["id"] == str(i)
+    hits = store.search(vectors[11], 30, filters={"product": "home"})
+    assert sorted(int(h["id"]) for h in hits) == list(range(11, 40, 2))
@@ -0,0 +1,74 @@
+# tests/test_hybrid.py
+import numpy as np
+
+from vectordb.bm25 import BM25Index, HybridStore, analyze
+from vectordb.local_store import LocalVectorStore
+from vectordb.segment import SegmentStore, write_segment
+
+DOCS = [
+    ("Express shipping", "Express shipping takes two business days."),
+    ("Policy number 456", "Policy number 456 covers phone screen damage for 12 months."),
+    ("Returns", "Items can be returned within 30 days for a refund."),
+    ("Policy number 789", "Policy number 789 covers water damage."),
+]
+
+
+def make_store(rng):
+    vectors = rng.standard_normal((len(DOCS), 8)).astype(np.float32)
+    store = HybridStore(LocalVectorStore())
+    store.upsert({"id": f"d{i}", "title": t, "content": c, "product": "home" if i % 2 else "auto", "vector": v}
+                 for i, ((t, c), v) in enumerate(zip(DOCS, vectors)))
+    return store, vectors
+
+
+def test_analyze_drops_stopwords_and_folds_plurals():
+    assert analyze("How long does Express shipping take?") == ["long", "express", "shipping", "take"]
+    assert analyze("it takes days") == ["take", "day"]
+    assert analyze("Policy number AB-12") == ["policy", "number", "ab", "12"]
+
+
+def test_bm25_ranks_title_matches_and_supports_remove():
+    idx = BM25Index()
+    idx.add("a", "refund", "how refunds work")
+    idx.add("b", "shipping", "no refund talk here beyond refund")
+    assert [d for _, d in idx.search(analyze("refund"))] == ["a", "b"]
+    idx.remove("a")
+    assert [d for _, d in idx.search(analyze("refund"))] == ["b"] and len(idx) == 1
+
+
+def test_exact_match_needs_a_token_with_digits_and_full_coverage(rng):
+    store, _ = make_store(rng)
+    assert [h["id"] for h in store.exact_match("Policy number 456")] == ["d1"]
+    assert store.exact_match("policy number") == []              # no digit: left to hybrid search
+    assert store.exact_match("Policy number 999") == []
+    assert store.exact_match("Policy number 456", filters={"product": "auto"}) == []
+
+
+def test_hybrid_search_fuses_keyword_and_vector_ranks(rng):
+    store, vectors = make_store(rng)
+    hits = store.hybrid_search("returned refund", vectors[2], k=2)
+    assert hits[0]["id"] == "d2"                                  # first in both lists
+    assert hits[0]["@search.rrf"] == 2.0 / (store.rrf_k + 1)
+    assert hits[0]["@search.score"] == 1.0
+
+    store.delete(["d2"])
+    assert "d2" not in {h["id"] for h in store.hybrid_search("returned refund", vectors[2], k=4)}
+
+
+def test_keyword_only_hits_do_not_pass_the_threshold_on_coverage(rng):
+    store, vectors = make_store(rng)
+    far = -vectors[3]                                             # d3 ranks last by vector
+    hits = {h["id"]: h for h in store.hybrid_search("water damage", far, k=4, candidates=1)}
+    assert hits["d3"]["@search.coverage"] == 1.0
+    assert hits["d3"]["@search.score"] < 0.75
+
+
+def test_hybrid_over_a_segment_reads_docs_from_the_store(rng, tmp_path):
+    vectors = rng.standard_normal((len(DOCS), 8)).astype(np.float32)
+    write_segment(str(tmp_path / "seg"), ({"id": f"d{i}", "title": t, "content": c, "vector": v}
+                                          for i, ((t, c), v) in enumerate(zip(DOCS, vectors))))
+    store = HybridStore(SegmentStore(str(tmp_path / "seg")))
+    assert len(store) == len(DOCS) and not hasattr(store, "_docs")
+    assert [h["content"] for h in store.exact_match("Policy number 789")] == [DOCS[3][1]]
+    store.delete(["d3"])
+    assert store.exact_match("Policy number 789") == []
@@ -0,0 +1,123 @@
+# tests/test_ingest.py
+import json
+
+import pytest
+
+import utils.ingest_manifest as ingest_manifest
+from agents.ingest_agent import IngestAgent
+from utils.ingest_manifest import IngestManifest, doc_id
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self._body = body or {}
+        self.text = json.dumps(self._body)
+
+    def json(self):
+        return self._body
+
+
+class Rejected(Exception):
+    status_code = 400
+
+
+class RecordingTransport:
+    """
+    Stands in for HttpTransport: records the actions sent and accepts them, except
+    documents whose content is in `reject` (a permanent 400 each). With `down`
+    set every POST raises, like a connection that went away mid-run.
+    """
+
+    def __init__(self):
+        self.actions = []
+        self.reject = set()
+        self.down = False
+
+    def post(self, url, *, headers=None, data=None, timeout=None):
+        if self.down:
+            raise RuntimeError("connection lost")
+        value = json.loads(data)["value"]
+        self.actions += [(a["@search.action"], a["id"]) for a in value]
+        return FakeResponse(200, {"value": [
+            {"key": a["id"], "status": False, "statusCode": 400, "errorMessage": "bad doc"}
+            if a.get("content") in self.reject else {"key": a["id"], "status": True} for a in value]})
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest_manifest, "DEFAULT_MANIFEST_DIR", tmp_path)    # index-version tokens
+    embedded = []
+
+    def embed(texts):
+        if "bad-embed" in texts:
+            raise Rejected("input rejected")
+        embedded.extend(texts)
+        return [[float(len(t)), 1.0, 0.0, 0.0] for t in texts]
+
+    ag = IngestAgent(embed, endpoint="https://search.example", api_key="k", index_name="t", embed_dims=4,
+                     manifest_path=str(tmp_path / "manifest.json"), journal_path=str(tmp_path / "journal"),
+                     dead_letter_path=str(tmp_path / "dead.jsonl"), transport=RecordingTransport())
+    ag.embedded = embedded
+    return ag
+
+
+def test_doc_id_is_stable_and_metadata_aware():
+    assert doc_id("T", "a  b\n c") == doc_id(" T ", "a b c")
+    assert doc_id("T", "a b c") != doc_id("T", "a b d")
+    assert doc_id("T", "x", {"locale": "en"}) != doc_id("T", "x", {"locale": "fr"})
+    assert doc_id("T", "x", {}) == doc_id("T", "x")
+
+
+def test_reingest_skips_unchanged_and_prunes_only_when_asked(agent, tmp_path):
+    pairs = [("q1", "one"), ("q2", "two"), ("q3", "three", {"product": "auto"})]
+    first = agent.execute_pairs(pairs, create_if_missing=False)
+    assert first["ingested"] == 3 and first["skipped"] == 0
+    assert len(IngestManifest("t", str(tmp_path / "manifest.json"))) == 3
+
+    agent.embedded.clear()
+    second = agent.execute_pairs([("q1", "one"), ("q2", "two, edited")], create_if_missing=False)
+    assert agent.embedded == ["two, edited"]
+    assert second["skipped"] == 1 and second["deleted"] == 0      # q3 is kept: pruning is opt-in
+
+    agent.http.actions.clear()
+    third = agent.execute_pairs([("q1", "one")], create_if_missing=False, delete_missing=True)
+    gone = {doc_id("q2", "two"), doc_id("q2", "two, edited"), doc_id("q3", "three", {"product": "auto"})}
+    assert third["deleted"] == 3
+    assert {i for a, i in agent.http.actions if a == "delete"} == gone
+    assert set(agent.manifest.docs) == {doc_id("q1", "one")}
+
+
+def test_windowed_run_counts_uploads_and_dead_letters(agent, tmp_path):
+    agent.http.reject.add("bad-upload")
+    pairs = [(f"q{i}", f"answer {i}") for i in range(4)] + [("e", "bad-embed"), ("u", "bad-upload")]
+    stats = agent.execute_pairs(pairs, create_if_missing=False, window=2)
+
+    assert stats["windows"] == 3 and stats["ingested"] == 4 and stats["dead_lettered"] == 2
+    assert stats["upload_requests"] == 3              # a per-document 400 is not retried
+    assert sorted(r["stage"] for r in agent.dead_letters) == ["embed", "upload"]
+
+
+def test_rerun_after_a_crash_reuses_journaled_vectors(agent):
+    pairs = [(f"q{i}", f"answer {i}") for i in range(4)]
+    agent.http.down = True
+    with pytest.raises(RuntimeError):
+        agent.execute_pairs(pairs, create_if_missing=False, window=2)
+    embedded_before = list(agent.embedded)
+    assert embedded_before                              # the first window(s) were embedded and journaled
+
+    agent.http.down = False
+    agent.embedded.clear()
+    stats = agent.execute_pairs(pairs, create_if_missing=False, window=2)
+    assert stats["ingested"] == 4 and stats["resumed"] == len(embedded_before)
+    assert not set(agent.embedded) & set(embedded_before)
+
+
+def test_replay_dead_letters_reingests_them(agent):
+    agent.http.reject.add("flaky")
+    agent.execute_pairs([("q", "flaky"), ("ok", "fine")], create_if_missing=False)
+    assert [r["content"] for r in agent.dead_letters] == ["flaky"]
+
+    agent.http.reject.clear()
+    assert agent.replay_dead_letters()["ingested"] == 1
+    assert list(agent.dead_letters) == [] and doc_id("q", "flaky") in agent.manifest
@@ -0,0 +1,32 @@
+# tests/test_local_store.py
+import numpy as np
+import pytest
+
+from vectordb.local_store import LocalVectorStore
+from conftest import make_items
+
+
+@pytest.mark.parametrize("quantization", [None, "int8"])
+def test_delete_after_upsert_with_trained_quantizer(rng, quantization):
+    vectors = rng.standard_normal((15, 16)).astype(np.float32)
+    store = LocalVectorStore(quantization=quantization)
+    store.upsert(make_items(vectors[:10]))
+    store.search(vectors[0], 3)                    # trains the quantizer on 10 rows
+    store.upsert(make_items(vectors)[10:])         # 5 rows without codes yet
+    store.delete(["0", "3"])
+
+    assert len(store) == 13
+    for i in (14, 12, 5):
+        assert store.search(vectors[i], 1)[0]["id"] == str(i)
+    assert all(h["id"] not in ("0", "3") for h in store.search(vectors[0], 13))
+
+
+def test_quantized_store_maps_float_rows_instead_of_holding_them(rng):
+    vectors = rng.standard_normal((50, 100)).astype(np.float32)     # 100 dims: PQ picks m=5
+    store = LocalVectorStore(quantization="pq")
+    store.upsert(make_items(vectors))
+
+    assert store.search(vectors[7], 1)[0]["id"] == "7"
+    usage = store.memory_usage()
+    assert usage["vectors"] == 0 and usage["mapped_vectors"] == vectors.nbytes
+    assert usage["codes"] > 0 and store._quantizer.m == 5
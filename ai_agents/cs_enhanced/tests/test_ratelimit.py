@@ -0,0 +1,80 @@
+# tests/test_ratelimit.py
+import asyncio
+
+import pytest
+
+from utils.ratelimit import EndpointLimiter, acall_with_retry, call_with_retry, is_retryable, retry_after_s
+
+
+class Throttled(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type("R", (), {"status_code": status_code, "headers": headers or {}})()
+
+
+def flaky(errors, result="ok"):
+    calls = []
+
+    def fn(*args, **kw):
+        calls.append((args, kw))
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    fn.calls = calls
+    return fn
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    slept = []
+    monkeypatch.setattr("utils.ratelimit.time.sleep", slept.append)
+    return slept
+
+
+def test_retries_transient_errors_then_returns(no_sleep):
+    fn = flaky([Throttled(429), Throttled(503)])
+    assert call_with_retry(fn, 1, key="v", base_delay=0.1) == "ok"
+    assert fn.calls == [((1,), {"key": "v"})] * 3
+    assert len(no_sleep) == 2
+
+
+def test_does_not_retry_client_errors():
+    fn = flaky([Throttled(400)])
+    with pytest.raises(Throttled):
+        call_with_retry(fn)
+    assert len(fn.calls) == 1
+
+
+def test_gives_up_after_max_attempts():
+    fn = flaky([Throttled(500)] * 5)
+    with pytest.raises(Throttled):
+        call_with_retry(fn, max_attempts=3)
+    assert len(fn.calls) == 3
+
+
+def test_retry_after_is_honoured_and_reported_to_the_limiter(no_sleep):
+    limiter = EndpointLimiter("test")          # no quota: backoff() still counts the throttle
+    fn = flaky([Throttled(429, {"retry-after-ms": "2000"})])
+    assert call_with_retry(fn, limiter=limiter) == "ok"
+    assert 2.0 <= no_sleep[0] <= 2.5
+    assert limiter.throttled == 1
+
+
+def test_error_classification():
+    assert retry_after_s(Throttled(429, {"retry-after": "3"})) == 3.0
+    assert retry_after_s(Throttled(429)) is None
+    assert is_retryable(type("ReadTimeout", (Exception,), {})())
+    assert not is_retryable(ValueError("bad input"))
+
+
+def test_async_retry(monkeypatch):
+    async def no_wait(_):
+        pass
+    monkeypatch.setattr("utils.ratelimit.asyncio.sleep", no_wait)
+    sync = flaky([Throttled(429)])
+
+    async def fn():
+        return sync()
+    assert asyncio.run(acall_with_retry(fn)) == "ok"
+    assert len(sync.calls) == 2
@@ -0,0 +1,68 @@
+# tests/test_segment.py
+import numpy as np
+import pytest
+
+from vectordb.segment import SegmentStore, write_segment
+from conftest import make_items
+
+
+@pytest.fixture
+def segment_store(rng, tmp_path):
+    vectors = rng.standard_normal((200, 16)).astype(np.float32)
+    write_segment(str(tmp_path / "seg"), make_items(vectors))
+    return SegmentStore(str(tmp_path / "seg")), vectors
+
+
+def test_overlay_shadows_and_deletes_hide_segment_rows(segment_store):
+    store, vectors = segment_store
+    store.delete(["5", "6"])
+    store.upsert([{"id": "7", "title": "t7", "content": "moved", "vector": vectors[100]},
+                  {"id": "new", "title": "tn", "content": "fresh", "vector": vectors[8]}])
+
+    assert store._shadowed == {5, 6, 7}                # "new" is not in the segment
+    assert len(store) == 199
+    assert all(h["id"] not in ("5", "6") for h in store.search(vectors[5], 10))
+    top = store.search(vectors[100], 2)
+    assert {(h["id"], h["content"]) for h in top} == {("7", "moved"), ("100", "doc 100")}
+    assert [h["id"] for h in store.search(vectors[7], 200)].count("7") == 1
+
+
+def test_maybe_compact_waits_for_threshold(segment_store):
+    store, vectors = segment_store
+    store.upsert(make_items(vectors[:5]))
+    assert not store.maybe_compact(0.1)                # 5 overlaid rows of 200
+    assert store.maybe_compact(0.02)
+    assert len(store.overlay) == 0 and not store._shadowed
+    assert len(store) == 200 and store.search(vectors[3], 1)[0]["id"] == "3"
+
+
+def test_flushed_overlay_survives_reopen(segment_store, tmp_path):
+    store, vectors = segment_store
+    store.delete(["5"])
+    store.upsert([{"id": "7", "title": "t7", "content": "moved", "vector": vectors[100]}])
+    assert not store.maybe_compact(0.1)                # flushes to delta/ instead
+
+    reopened = SegmentStore(str(tmp_path / "seg"))
+    assert reopened._shadowed == {5, 7} and len(reopened) == 199
+    assert {(h["id"], h["content"]) for h in reopened.search(vectors[100], 2)} == {("7", "moved"), ("100", "doc 100")}
+    assert "5" not in {h["id"] for h in reopened.search(vectors[5], 10)}
+    reopened.compact()
+    assert not (tmp_path / "seg" / "delta").exists() and len(SegmentStore(str(tmp_path / "seg"))) == 199
+
+
+def test_interrupted_swap_keeps_the_old_segment(segment_store, tmp_path):
+    store, vectors = segment_store
+    store.segment = None
+    (tmp_path / "seg").rename(tmp_path / "seg.old")    # crash between the renames in _swap_dir
+    assert len(SegmentStore.open_or_create(str(tmp_path / "seg"))) == 200
+
+
+def test_filtered_search_is_the_same_block_by_block(rng, tmp_path, monkeypatch):
+    vectors = rng.standard_normal((200, 16)).astype(np.float32)
+    write_segment(str(tmp_path / "seg"), make_items(vectors, product=["auto", "home", "life"]))
+    store = SegmentStore(str(tmp_path / "seg"))
+    queries = rng.standard_normal((3, 16)).astype(np.float32)
+    whole = store.search_many(queries, 5, filters={"product": "home"})
+    monkeypatch.setattr("vectordb.segment.SCAN_ROWS", 16)
+    assert store.search_many(queries, 5, filters={"product": "home"}) == whole
+    assert all(int(h["id"]) % 3 == 1 for hits in whole for h in hits) and all(len(h) == 5 for h in whole)
@@ -0,0 +1,95 @@
+# tests/test_server.py
+import asyncio
+import itertools
+
+import pytest
+
+from loadtest import StandInQnA, call
+from server import QnAService, SessionThreads
+from vectordb.base import ThreadedAsyncStore
+from vectordb.local_store import LocalVectorStore
+
+
+class FailingIngest:
+    def execute_pairs(self, pairs, **kw):
+        raise ValueError("index unreachable")
+
+
+def make_app(ingest=None, run_ms=1, **kw):
+    qna = StandInQnA(ThreadedAsyncStore(LocalVectorStore(dims=8)), dims=8, embed_ms=1, run_ms=run_ms)
+    return QnAService(lambda: (qna, ingest), **kw)
+
+
+def test_ask_binds_sessions_to_threads():
+    async def go():
+        app = make_app()
+        s1, first = await call(app, "POST", "/ask", {"question": "hi", "session_id": "s"})
+        s2, again = await call(app, "POST", "/ask", {"question": "again", "session_id": "s"})
+        s3, other = await call(app, "POST", "/ask", {"question": "hi"})
+        return (s1, s2, s3), first, again, other
+    statuses, first, again, other = asyncio.run(go())
+    assert statuses == (200, 200, 200)
+    assert first["thread_id"] == again["thread_id"] != other["thread_id"]
+    assert first["answer"].startswith("answer to 'hi'")
+
+
+@pytest.mark.parametrize("method,path,body,status", [
+    ("POST", "/ask", {}, 400),
+    ("POST", "/ask", {"question": "q", "filters": "product eq 'x'"}, 400),
+    ("POST", "/ask", {"question": "q", "filters": {"bad field": "x"}}, 400),
+    ("POST", "/ask", {"question": "q", "filters": {"product": {"nested": 1}}}, 400),
+    ("GET", "/nope", None, 404),
+    ("POST", "/ingest", {"pairs": [["t", "c"]]}, 501),
+    ("POST", "/ingest", {"pairs": "nope"}, 501),
+])
+def test_bad_requests(method, path, body, status):
+    got, payload = asyncio.run(call(make_app(), method, path, body))
+    assert got == status and "error" in payload
+
+
+def test_unexpected_errors_are_500_json():
+    app = make_app(ingest=FailingIngest())
+    status, payload = asyncio.run(call(app, "POST", "/ingest", {"pairs": [["t", "c"]]}))
+    assert status == 500 and "index unreachable" in payload["error"]
+
+    app.health = lambda: 1 / 0
+    assert asyncio.run(call(app, "GET", "/health")) == (500, {"error": "Internal server error"})
+
+
+def test_queued_session_does_not_hold_a_slot():
+    # One slot: "a2" waits for its session behind "a1", so "b" (another session) goes next
+    async def go():
+        app = make_app(run_ms=50, max_concurrency=1, max_queue=8)
+        done = []
+
+        async def ask(session, q):
+            status, _ = await call(app, "POST", "/ask", {"question": q, "session_id": session})
+            done.append((session + q, status))
+        await asyncio.gather(ask("a", "1"), ask("a", "2"), ask("b", "3"))
+        return done
+    assert asyncio.run(go()) == [("a1", 200), ("b3", 200), ("a2", 200)]
+
+
+def test_session_waiting_on_its_lock_is_not_evicted():
+    async def go():
+        evicted, ids = [], itertools.count()
+        sessions = SessionThreads(capacity=1, on_evict=evicted.append)
+
+        async def new_thread():
+            return f"t{next(ids)}"
+
+        async def ask(session):
+            async with sessions.hold(session, new_thread) as thread_id:
+                return thread_id
+
+        async with sessions.hold("a", new_thread) as first:
+            queued = asyncio.create_task(ask("a"))
+            await asyncio.sleep(0)                      # "a" is now pinned by the queued request
+        # "a" is unlocked but its waiter has not run yet: a new session must not evict it
+        other = await sessions._pin("b", new_thread)
+        other.users -= 1
+        second = await queued
+        third = await ask("a")
+        return first, second, third, evicted
+    first, second, third, evicted = asyncio.run(go())
+    assert first == second == third == "t0" and evicted == ["t1"]
@@ -0,0 +1,69 @@
+# tests/test_stores.py
+import numpy as np
+import pytest
+
+from vectordb.hnsw import HNSWStore
+from vectordb.local_store import LocalVectorStore
+from vectordb.segment import SegmentStore, write_segment
+from conftest import make_items
+
+KINDS = ["local", "int8", "hnsw", "segment"]
+PRODUCTS = ["auto", "home", "life"]
+
+
+def build(kind, items, tmp_path):
+    if kind == "segment":
+        write_segment(str(tmp_path / "seg"), items)
+        return SegmentStore(str(tmp_path / "seg"))
+    store = HNSWStore(ef_construction=64) if kind == "hnsw" else \
+        LocalVectorStore(quantization="int8" if kind == "int8" else None)
+    store.upsert(items)
+    return store
+
+
+@pytest.fixture
+def vectors(rng):
+    return rng.standard_normal((120, 32)).astype(np.float32)
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_search_finds_each_doc_first(kind, vectors, tmp_path):
+    store = build(kind, make_items(vectors, product=PRODUCTS), tmp_path)
+    assert len(store) == 120
+    for i in (0, 41, 119):
+        hits = store.search(vectors[i], 3)
+        assert hits[0]["id"] == str(i) and hits[0]["content"] == f"doc {i}"
+        assert hits[0]["@search.score"] >= hits[1]["@search.score"] >= hits[2]["@search.score"]
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_upsert_replaces_and_delete_removes(kind, vectors, tmp_path):
+    store = build(kind, make_items(vectors, product=PRODUCTS), tmp_path)
+    store.upsert([{"id": "5", "title": "t5", "content": "edited", "product": "auto", "vector": vectors[5]}])
+    store.delete(["9", "not-there"])
+
+    assert len(store) == 119
+    hits = store.search(vectors[5], 120)
+    assert [h["id"] for h in hits].count("5") == 1 and hits[0]["content"] == "edited"
+    assert "9" not in {h["id"] for h in hits}
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_search_many_matches_search(kind, vectors, rng, tmp_path):
+    store = build(kind, make_items(vectors, product=PRODUCTS), tmp_path)
+    queries = rng.standard_normal((6, 32)).astype(np.float32)
+    for filters in (None, {"product": ["home", "life"]}):
+        batch = store.search_many(queries, 4, filters=filters)
+        assert len(batch) == len(queries)
+        for q, hits in zip(queries, batch):
+            single = store.search(q, 4, filters=filters)
+            assert [h["id"] for h in hits] == [h["id"] for h in single]
+            assert [h["@search.score"] for h in hits] == pytest.approx([h["@search.score"] for h in single], abs=1e-5)
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_filters_restrict_results(kind, vectors, tmp_path):
+    store = build(kind, make_items(vectors, product=PRODUCTS), tmp_path)
+    hits = store.search(vectors[0], 10, filters={"product": "home"})      # doc 0 is "auto"
+    assert len(hits) == 10 and all(h["product"] == "home" for h in hits)
+    assert store.search(vectors[0], 5, filters={"product": "none"}) == []
@@ -0,0 +1,115 @@
+# utils/answer_cache.py
+import hashlib, threading, time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+from utils.ingest_manifest import index_version
+
+
+def prompt_hash(system_prompt: Optional[str]) -> str:
+    return hashlib.sha256((system_prompt or "").encode("utf-8")).hexdigest()
+
+
+class SemanticAnswerCache:
+    """
+    Reuses a past answer when a new question embeds close enough to one already
+    answered (cosine >= threshold), skipping search, the agent message and the run.
+
+    Entries expire after ttl_s and the least recently used are evicted past
+    `capacity`. The whole cache is dropped when the index version for
+    `index_name` changes (bumped by IngestAgent) or the system prompt changes.
+
+      cache = SemanticAnswerCache(index_name="faq", threshold=0.95)
+      hit = cache.get(q_vec, system_prompt)   # answer or None
+      cache.put(q_vec, question, answer, system_prompt)
+    """
+
+    def __init__(self, index_name: str, *, threshold: float = 0.95, ttl_s: float = 3600.0, capacity: int = 1000):
+        self.index_name = index_name
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.capacity = capacity
+        self.hits = self.misses = self.invalidations = 0
+
+        self._entries: "OrderedDict[int, Tuple[np.ndarray, str, str, float]]" = OrderedDict()
+        self._next_key = 0
+        self._matrix: Optional[np.ndarray] = None     # stacked unit vectors, rebuilt lazily
+        self._keys: list[int] = []
+        self._index_version = index_version(index_name)
+        self._prompt = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ---------- Invalidation ----------
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def _check_versions(self, system_prompt: Optional[str]) -> None:
+        version, ph = index_version(self.index_name), prompt_hash(system_prompt)
+        if version != self._index_version or (self._prompt is not None and ph != self._prompt):
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._matrix = None
+        self._index_version, self._prompt = version, ph
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl_s
+        stale = [k for k, (_, _, _, ts) in self._entries.items() if ts < cutoff]
+        for k in stale:
+            del self._entries[k]
+        if stale:
+            self._matrix = None
+
+    # ---------- Lookup ----------
+    @staticmethod
+    def _unit(vec) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        n = np.linalg.norm(v)
+        return v / n if n else v
+
+    def get(self, q_vec, system_prompt: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            self._check_versions(system_prompt)
+            self._expire()
+            if not self._entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._keys = list(self._entries)
+                self._matrix = np.stack([self._entries[k][0] for k in self._keys])
+            sims = self._matrix @ self._unit(q_vec)
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+            key = self._keys[best]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][2]
+
+    def put(self, q_vec, question: str, answer: str, system_prompt: Optional[str] = None) -> None:
+        if not answer:
+            return
+        with self._lock:
+            self._check_versions(system_prompt)
+            self._entries[self._next_key] = (self._unit(q_vec), question, answer, time.time())
+            self._next_key += 1
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,112 @@
+# utils/batch_embed.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, List, Sequence
+from utils.tokens import count_tokens
+
+# Azure OpenAI embeddings limits: 2048 inputs and ~300k tokens per request, 8191 tokens per input
+MAX_INPUTS = 2048
+MAX_REQUEST_TOKENS = 300_000
+
+
+def plan_batches(texts: Sequence[str], max_inputs: int = MAX_INPUTS, max_tokens: int = MAX_REQUEST_TOKENS) -> List[List[int]]:
+    """Greedy split of positions into batches that respect both the input-count and token budgets."""
+    batches: List[List[int]] = []
+    cur: List[int] = []
+    cur_tokens = 0
+    for i, t in enumerate(texts):
+        n = count_tokens(t)
+        if cur and (len(cur) >= max_inputs or cur_tokens + n > max_tokens):
+            batches.append(cur)
+            cur, cur_tokens = [], 0
+        cur.append(i)
+        cur_tokens += n
+    if cur:
+        batches.append(cur)
+    return batches
+
+
+class BatchEmbedder:
+    """
+    Turns a list-input embeddings call into a bulk embedder:
+    splits the texts into request-sized batches and runs up to `concurrency`
+    requests at once. Output order always matches input order.
+
+      create_fn: (List[str]) -> List[List[float]]   one embeddings.create call
+    """
+
+    def __init__(
+        self,
+        create_fn: Callable[[List[str]], List[List[float]]],
+        *,
+        max_inputs: int = MAX_INPUTS,
+        max_tokens: int = MAX_REQUEST_TOKENS,
+        concurrency: int = 4,
+    ):
+        self.create_fn = create_fn
+        self.max_inputs = max_inputs
+        self.max_tokens = max_tokens
+        self.concurrency = concurrency
+        self.requests = 0
+
+    def __call__(self, texts: Sequence[str]) -> List[List[float]]:
+        texts = list(texts)
+        if not texts:
+            return []
+        batches = plan_batches(texts, self.max_inputs, self.max_tokens)
+        self.requests += len(batches)
+        out: List[List[float]] = [None] * len(texts)
+
+        def run(positions: List[int]):
+            vecs = self.create_fn([texts[i] for i in positions])
+            if len(vecs) != len(positions):
+                raise RuntimeError(f"Embedding batch returned {len(vecs)} vectors for {len(positions)} inputs")
+            for i, v in zip(positions, vecs):
+                out[i] = v
+
+        if len(batches) == 1 or self.concurrency <= 1:
+            for b in batches:
+                run(b)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as pool:
+                for f in [pool.submit(run, b) for b in batches]:
+                    f.result()
+        return out
+
+
+class AsyncBatchEmbedder:
+    """BatchEmbedder for an async create_fn: same batching, up to `concurrency` requests awaited at once."""
+
+    def __init__(
+        self,
+        create_fn: Callable[[List[str]], Awaitable[List[List[float]]]],
+        *,
+        max_inputs: int = MAX_INPUTS,
+        max_tokens: int = MAX_REQUEST_TOKENS,
+        concurrency: int = 4,
+    ):
+        self.create_fn = create_fn
+        self.max_inputs = max_inputs
+        self.max_tokens = max_tokens
+        self.concurrency = concurrency
+        self.requests = 0
+
+    async def __call__(self, texts: Sequence[str]) -> List[List[float]]:
+        texts = list(texts)
+        if not texts:
+            return []
+        batches = plan_batches(texts, self.max_inputs, self.max_tokens)
+        self.requests += len(batches)
+        out: List[List[float]] = [None] * len(texts)
+        gate = asyncio.Semaphore(max(1, self.concurrency))
+
+        async def run(positions: List[int]):
+            async with gate:
+                vecs = await self.create_fn([texts[i] for i in positions])
+            if len(vecs) != len(positions):
+                raise RuntimeError(f"Embedding batch returned {len(vecs)} vectors for {len(positions)} inputs")
+            for i, v in zip(positions, vecs):
+                out[i] = v
+
+        await asyncio.gather(*(run(b) for b in batches))
+        return out
@@ -0,0 +1,86 @@
+# utils/context_assembly.py
+import os
+from typing import Any, Dict, List, Optional
+import numpy as np
+from utils.tokens import count_tokens, truncate_tokens
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "12"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+MMR_DUPLICATE_COS = float(os.getenv("MMR_DUPLICATE_COS", "0.95"))
+
+
+def _unit(rows: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(rows, axis=-1, keepdims=True)
+    return rows / np.where(norms > 0, norms, 1.0)
+
+
+def mmr_order(query, vectors: np.ndarray, lambda_mult: float = MMR_LAMBDA,
+              duplicate_cos: float = MMR_DUPLICATE_COS) -> List[int]:
+    """
+    Greedy maximal-marginal-relevance ordering of candidate rows:
+    argmax  lambda * cos(q, d) - (1 - lambda) * max cos(d, picked).
+    Rows at or above duplicate_cos to something already picked are dropped.
+    """
+    cands = _unit(np.asarray(vectors, dtype=np.float32))
+    rel = cands @ _unit(np.asarray(query, dtype=np.float32).reshape(-1))
+    pair = cands @ cands.T
+    redundancy = np.full(len(cands), -np.inf, dtype=np.float32)
+    left = np.ones(len(cands), dtype=bool)
+    order: List[int] = []
+    while left.any():
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        gain = np.where(left, lambda_mult * rel - (1.0 - lambda_mult) * penalty, -np.inf)
+        i = int(np.argmax(gain))
+        left[i] = False
+        if redundancy[i] >= duplicate_cos:
+            continue
+        order.append(i)
+        redundancy = np.maximum(redundancy, pair[i])
+    return order
+
+
+class ContextAssembler:
+    """
+    Picks which retrieved chunks go into the prompt. Over-fetch `candidates`
+    hits (with vectors), order them by MMR so near-duplicate FAQ rows don't
+    crowd out different ones, then pack whole chunks into `token_budget`.
+    Hits without vectors keep their relevance order.
+
+      hits = store.search(q_vec, assembler.candidates, include_vectors=True)
+      chunks = assembler.select(q_vec, hits)
+      assembler.last   # {'candidates', 'selected', 'duplicates', 'tokens'}
+    """
+
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET, candidates: int = CONTEXT_CANDIDATES,
+                 lambda_mult: float = MMR_LAMBDA, duplicate_cos: float = MMR_DUPLICATE_COS):
+        self.token_budget = token_budget
+        self.candidates = candidates
+        self.lambda_mult = lambda_mult
+        self.duplicate_cos = duplicate_cos
+        self.last: Dict[str, int] = {}
+
+    def _ordered(self, q_vec, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if q_vec is None or len(hits) < 2 or any(h.get("vector") is None for h in hits):
+            return hits
+        rows = np.stack([np.asarray(h["vector"], dtype=np.float32) for h in hits])
+        return [hits[i] for i in mmr_order(q_vec, rows, self.lambda_mult, self.duplicate_cos)]
+
+    def select(self, q_vec, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Chunks to send, in prompt order, within the token budget. Vectors are stripped."""
+        ordered = self._ordered(q_vec, hits)
+        picked, used = [], 0
+        for h in ordered:
+            content = str(h.get("content", ""))
+            n = count_tokens(content)
+            if used + n > self.token_budget:
+                if picked:
+                    continue            # a smaller chunk further down may still fit
+                # Even the best chunk is over budget: send its head rather than nothing
+                content = truncate_tokens(content, self.token_budget)
+                n = count_tokens(content)
+            picked.append({**{k: v for k, v in h.items() if k != "vector"}, "content": content})
+            used += n
+        self.last = {"candidates": len(hits), "selected": len(picked),
+                     "duplicates": len(hits) - len(ordered), "tokens": used}
+        return picked
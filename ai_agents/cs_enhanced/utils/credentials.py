@@ -0,0 +1,61 @@
+# utils/credentials.py
+import os, threading, time
+from typing import Any, Dict, Optional, Tuple
+
+TOKEN_REFRESH_MARGIN_S = float(os.getenv("TOKEN_REFRESH_MARGIN_S", "300"))
+
+
+class CachedTokenCredential:
+    """
+    TokenCredential wrapper that hands out each scope's token until shortly
+    before it expires. AzureCliCredential shells out to `az` (~1-2 s) on every
+    get_token, and each new SDK client starts with an empty token cache, so
+    without this every client built on a Streamlit rerun pays that again.
+    """
+
+    def __init__(self, inner, refresh_margin_s: float = TOKEN_REFRESH_MARGIN_S):
+        self.inner = inner
+        self.refresh_margin_s = refresh_margin_s
+        self._tokens: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+        self.fetches = self.hits = 0
+        self.fetch_s = 0.0
+
+    def get_token(self, *scopes: str, claims: Optional[str] = None, tenant_id: Optional[str] = None, **kw):
+        if claims:                      # a claims challenge must go to the real credential
+            return self.inner.get_token(*scopes, claims=claims, tenant_id=tenant_id, **kw)
+        key = (scopes, tenant_id)
+        with self._lock:
+            token = self._tokens.get(key)
+            if token is not None and token.expires_on - self.refresh_margin_s > time.time():
+                self.hits += 1
+                return token
+            # Fetch under the lock: concurrent callers wait for one `az` call instead of each making one
+            t0 = time.perf_counter()
+            token = self.inner.get_token(*scopes, **({"tenant_id": tenant_id} if tenant_id else {}), **kw)
+            self.fetch_s += time.perf_counter() - t0
+            self.fetches += 1
+            self._tokens[key] = token
+            return token
+
+    def close(self) -> None:
+        close = getattr(self.inner, "close", None)
+        if close is not None:
+            close()
+
+    def stats(self) -> Dict[str, float]:
+        return {"fetches": self.fetches, "hits": self.hits, "fetch_s": self.fetch_s}
+
+
+_shared: Optional[CachedTokenCredential] = None
+_shared_lock = threading.Lock()
+
+
+def get_credential() -> CachedTokenCredential:
+    """Process-wide Azure CLI credential with token caching (requires `az login`)."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            from azure.identity import AzureCliCredential
+            _shared = CachedTokenCredential(AzureCliCredential())
+        return _shared
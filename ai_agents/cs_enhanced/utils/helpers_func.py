@@ -1,11 +1,13 @@
 # agent_connect_loop_high.py
 import ast
-import os, time, json, requests
+import os, time, json, re
+from functools import lru_cache
 from dotenv import load_dotenv
-from openai import AzureOpenAI
-from azure.ai.projects import AIProjectClient
-from azure.identity import AzureCliCredential
-from azure.ai.agents.models import ListSortOrder
+from utils.credentials import get_credential
+from utils.embed_cache import EmbeddingCache
+from utils.batch_embed import BatchEmbedder, AsyncBatchEmbedder
+from utils.ratelimit import acall_with_retry, call_with_retry, limiter_for
+from utils.tokens import count_tokens
 
 load_dotenv()
 
@@ -13,6 +15,9 @@ load_dotenv()
 AOAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AOAI_KEY = os.getenv("AZURE_OPENAI_API_KEY") or os.getenv("AZURE_OPENAI_KEY")
 EMBED_MODEL = os.getenv("AZURE_EMBED_MODEL", "text-embedding-3-small")
+EMBED_DIMS = int(os.getenv("AZURE_EMBED_DIM", "1536"))
+EMBED_CACHE = os.getenv("EMBED_CACHE", "1") != "0"
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
 AOAI_API_VERSION = "2024-02-15-preview"
 
 # Azure AI Search
@@ -31,29 +36,95 @@ TOP_K = int(os.getenv("TOP_K", "3"))
 SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.80"))
 
 # ---------- Clients ----------
-aoai = AzureOpenAI(
-    azure_endpoint=AOAI_ENDPOINT,
-    api_key=AOAI_KEY,
-    api_version=AOAI_API_VERSION,
-)
+# Built on first use, once per process: importing this module pulls in neither
+# the openai nor the Azure SDKs (see ai_agents/startup_bench.py).
+@lru_cache(maxsize=None)
+def get_aoai():
+    from openai import AzureOpenAI
+    return AzureOpenAI(
+        azure_endpoint=AOAI_ENDPOINT,
+        api_key=AOAI_KEY,
+        api_version=AOAI_API_VERSION,
+        max_retries=0,   # retries go through utils.ratelimit so they share the endpoint's backoff
+    )
 
-project = AIProjectClient(
-    credential=AzureCliCredential(),
-    endpoint=FOUNDRY_PROJECT_ENDPOINT,
-)
+@lru_cache(maxsize=None)
+def get_aoai_async():
+    from openai import AsyncAzureOpenAI
+    return AsyncAzureOpenAI(
+        azure_endpoint=AOAI_ENDPOINT,
+        api_key=AOAI_KEY,
+        api_version=AOAI_API_VERSION,
+        max_retries=0,
+    )
+
+@lru_cache(maxsize=None)
+def get_project():
+    from azure.ai.projects import AIProjectClient
+    return AIProjectClient(credential=get_credential(), endpoint=FOUNDRY_PROJECT_ENDPOINT)
+
+_LAZY_CLIENTS = {"aoai": get_aoai, "aoai_async": get_aoai_async, "project": get_project}
+
+def __getattr__(name):
+    # helpers_func.aoai / .project still work, built on first access
+    if name in _LAZY_CLIENTS:
+        return _LAZY_CLIENTS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ---------- Helpers ----------
-def embed(text: str):
-    resp = aoai.embeddings.create(model=EMBED_MODEL, input=text)
+_embed_limiter = limiter_for("embed")   # RATE_LIMIT_EMBED_RPM / RATE_LIMIT_EMBED_TPM
+
+def _embed_uncached(text: str):
+    resp = call_with_retry(get_aoai().embeddings.create, model=EMBED_MODEL, input=text,
+                           limiter=_embed_limiter, tokens=count_tokens(text))
     return resp.data[0].embedding
 
+def _embed_many_uncached(texts):
+    texts = list(texts)
+    resp = call_with_retry(get_aoai().embeddings.create, model=EMBED_MODEL, input=texts,
+                           limiter=_embed_limiter, tokens=sum(count_tokens(t) for t in texts))
+    return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+async def _aembed_many_uncached(texts):
+    texts = list(texts)
+    resp = await acall_with_retry(get_aoai_async().embeddings.create, model=EMBED_MODEL, input=texts,
+                                  limiter=_embed_limiter, tokens=sum(count_tokens(t) for t in texts))
+    return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+# Many texts per embeddings.create call, several calls in flight
+_embed_batched = BatchEmbedder(_embed_many_uncached, concurrency=EMBED_CONCURRENCY)
+_aembed_batched = AsyncBatchEmbedder(_aembed_many_uncached, concurrency=EMBED_CONCURRENCY)
+
+# Cached on (model, dims, sha256(text)); get_embed().stats() exposes hit/miss counters.
+# Built on first use like the clients, so importing this module creates no .cache/ or SQLite file.
+@lru_cache(maxsize=None)
+def get_embed():
+    return EmbeddingCache(_embed_uncached, model=EMBED_MODEL, dims=EMBED_DIMS, batch_fn=_embed_batched,
+                          async_batch_fn=_aembed_batched)
+
+def embed(text: str):
+    return get_embed()(text) if EMBED_CACHE else _embed_uncached(text)
+
+def embed_batch(texts):
+    """(List[str]) -> List[List[float]]; order preserved, only cache misses hit the API."""
+    return get_embed().embed_many(texts) if EMBED_CACHE else _embed_batched(texts)
+
+async def aembed_batch(texts):
+    return await (get_embed().aembed_many(texts) if EMBED_CACHE else _aembed_batched(texts))
+
+async def aembed(text: str):
+    """Async counterpart of embed(), sharing its cache and rate limiter."""
+    return (await aembed_batch([text]))[0]
+
 
 def load_pairs_from_text(raw: str):
     """
     Accepts text that is:
       - JSON: [["Title","Content"], ...]  OR [{"title":"...","content":"..."}, ...]
       - Python literal: [("Title","Content"), ...]  (possibly assigned: FAQ_ENTRIES = [ ... ])
-    Returns: List[Tuple[str, str]]
+    Metadata for filtering may follow as a dict (["Title","Content",{"locale":"en"}])
+    or as extra keys of a dict item ({"title", "content", "locale": "en"}).
+    Returns: List[Tuple[str, str]] (Tuple[str, str, dict] for items with metadata)
     """
     raw = raw.strip()
 
@@ -70,17 +141,21 @@ def load_pairs_from_text(raw: str):
     # Normalize to list of (title, content)
     pairs = []
     for item in data:
+        meta = {}
         if isinstance(item, (list, tuple)) and len(item) == 2:
             t, c = item
+        elif isinstance(item, (list, tuple)) and len(item) == 3 and isinstance(item[2], dict):
+            t, c, meta = item
         elif isinstance(item, dict) and "title" in item and "content" in item:
             t, c = item["title"], item["content"]
+            meta = {k: v for k, v in item.items() if k not in ("title", "content", "id")}
         else:
-            raise ValueError("Each item must be (title, content) or {'title','content'}.")
+            raise ValueError("Each item must be (title, content[, metadata]) or {'title','content', ...}.")
 
         t = str(t).strip()
         c = str(c).strip()
         if c:  # skip empty content
-            pairs.append((t, c))
+            pairs.append((t, c, meta) if meta else (t, c))
 
     if not pairs:
         raise ValueError("Parsed zero valid (title, content) pairs.")
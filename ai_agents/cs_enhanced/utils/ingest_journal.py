@@ -0,0 +1,92 @@
+# utils/ingest_journal.py
+import json, os, shutil, time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+DEFAULT_JOURNAL_DIR = Path(__file__).resolve().parent.parent / ".cache"
+
+
+class IngestJournal:
+    """
+    Checkpoints for a long ingest run, one directory per index:
+
+      embedded-<seq>.npz   ids + float32 vectors of a window that was embedded
+                           but not yet confirmed uploaded
+      committed.txt        ids confirmed uploaded, one per line (append-only)
+
+    A window's .npz is deleted once its upload commits, so the journal only ever
+    holds the (at most two) in-flight windows. After a crash, load() hands back
+    the embedded-but-unsent vectors so the rerun doesn't pay for them again.
+    """
+
+    def __init__(self, index_name: str, path: Optional[str] = None):
+        self.path = Path(path or DEFAULT_JOURNAL_DIR / f"journal-{index_name}")
+        self.path.mkdir(parents=True, exist_ok=True)
+        existing = [int(p.stem.split("-")[1]) for p in self.path.glob("embedded-*.npz")]
+        self._seq = max(existing, default=0)
+
+    def load(self) -> Tuple[Dict[str, List[float]], List[str]]:
+        """Return ({id: vector} still pending upload, [ids already committed])."""
+        committed: List[str] = []
+        log = self.path / "committed.txt"
+        if log.exists():
+            committed = [line for line in log.read_text(encoding="utf-8").splitlines() if line]
+        done = set(committed)
+        pending: Dict[str, List[float]] = {}
+        for p in sorted(self.path.glob("embedded-*.npz")):
+            with np.load(p) as st:
+                for i, v in zip(st["ids"].tolist(), st["vectors"]):
+                    if i not in done:
+                        pending[i] = v.tolist()
+        return pending, committed
+
+    def record_embedded(self, docs: List[Dict[str, object]]) -> int:
+        self._seq += 1
+        tmp = self.path / f"embedded-{self._seq}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, ids=np.array([str(d["id"]) for d in docs]),
+                     vectors=np.asarray([d["vector"] for d in docs], dtype=np.float32))
+        os.replace(tmp, self.path / f"embedded-{self._seq}.npz")
+        return self._seq
+
+    def commit(self, seq: int, ids: Iterable[str]) -> None:
+        with open(self.path / "committed.txt", "a", encoding="utf-8") as f:
+            f.write("".join(f"{i}\n" for i in ids))
+            f.flush()
+            os.fsync(f.fileno())
+        (self.path / f"embedded-{seq}.npz").unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._seq = 0
+
+
+class DeadLetterLog:
+    """Append-only JSONL of documents that failed permanently, for later replay."""
+
+    def __init__(self, index_name: str, path: Optional[str] = None):
+        self.path = Path(path or DEFAULT_JOURNAL_DIR / f"deadletter-{index_name}.jsonl")
+
+    def write(self, doc: Dict[str, object], stage: str, error: str) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        metadata = {k: v for k, v in doc.items() if k not in ("id", "title", "content", "vector")}
+        row = {"id": doc.get("id"), "title": doc.get("title"), "content": doc.get("content"),
+               "metadata": metadata, "stage": stage, "error": error, "ts": time.time()}
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def __iter__(self) -> Iterator[Dict[str, object]]:
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def take(self) -> List[Dict[str, object]]:
+        """Read and empty the log (entries that fail again get re-appended)."""
+        rows = list(self)
+        self.path.unlink(missing_ok=True)
+        return rows
@@ -0,0 +1,84 @@
+# utils/ingest_manifest.py
+import hashlib, json, os, re, unicodedata, uuid
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+DEFAULT_MANIFEST_DIR = Path(__file__).resolve().parent.parent / ".cache"
+
+
+def normalize_content(text: str) -> str:
+    """Unicode NFC + collapsed whitespace, so cosmetic edits don't change a doc's id."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def doc_id(title: str, content: str, metadata: Optional[Dict] = None) -> str:
+    """
+    Deterministic, Azure-key-safe id derived from (title, normalized content),
+    plus the metadata when there is any, so the same FAQ under two tenants or
+    locales is two documents. Ids of plain pairs are unchanged.
+    """
+    raw = f"{title.strip()}\x1f{normalize_content(content)}"
+    if metadata:
+        raw += "\x1f" + json.dumps(metadata, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:40]
+
+
+def _version_path(index_name: str) -> Path:
+    return DEFAULT_MANIFEST_DIR / f"index-version-{index_name}"
+
+
+def index_version(index_name: str) -> str:
+    """Opaque token that changes whenever an ingest modifies the index ("" if never ingested)."""
+    try:
+        return _version_path(index_name).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return ""
+
+
+def bump_index_version(index_name: str) -> str:
+    path = _version_path(index_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    token = uuid.uuid4().hex
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(token, encoding="utf-8")
+    os.replace(tmp, path)
+    return token
+
+
+class IngestManifest:
+    """
+    Local record of which doc ids an index already holds (id -> title), so a
+    re-ingest only embeds/uploads new or changed rows and can delete the rest.
+    Saved atomically as JSON next to the other local caches.
+    """
+
+    def __init__(self, index_name: str, path: Optional[str] = None):
+        self.index_name = index_name
+        self.path = Path(path or DEFAULT_MANIFEST_DIR / f"manifest-{index_name}.json")
+        self.docs: Dict[str, str] = {}
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.docs = data.get("docs", {})
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.docs
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, docs: Iterable[Dict[str, object]]) -> None:
+        for d in docs:
+            self.docs[str(d["id"])] = str(d.get("title", ""))
+
+    def remove(self, ids: Iterable[str]) -> None:
+        for i in ids:
+            self.docs.pop(i, None)
+
+    def clear(self) -> None:
+        self.docs = {}
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"index": self.index_name, "docs": self.docs}), encoding="utf-8")
+        os.replace(tmp, self.path)
@@ -0,0 +1,85 @@
+# utils/message_cursor.py
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional
+
+
+class Message(NamedTuple):
+    id: str
+    role: str
+    text: str
+
+
+def _to_message(m) -> Message:
+    texts = getattr(m, "text_messages", None)
+    role = getattr(m.role, "value", m.role)
+    return Message(m.id, str(role), texts[-1].text.value if texts else "")
+
+
+class MessageCursor:
+    """
+    Incremental reader for one agent thread. Lists newest-first with a small page
+    size and stops at the last message already seen, so each refresh costs
+    O(new messages) rather than O(thread length); the SDK pages further (via
+    `after`) only when more than one page is new. Seen messages are kept locally,
+    up to `max_cached` of them.
+
+      cur = MessageCursor(project.agents, thread_id)
+      for m in cur.refresh():            # only what arrived since the last call
+          print(f"{m.role}: {m.text}")
+      cur.last_reply()                   # latest assistant text, from the local cache
+    """
+
+    def __init__(self, agents_client, thread_id: str, page_size: int = 20, max_cached: int = 500):
+        self.agents = agents_client
+        self.thread_id = thread_id
+        self.page_size = page_size
+        self.messages: Deque[Message] = deque(maxlen=max_cached)
+        self.last_id: Optional[str] = None
+        self.requests = 0
+
+    def _list(self):
+        from azure.ai.agents.models import ListSortOrder   # deferred: keeps this module cheap to import
+        self.requests += 1
+        return self.agents.messages.list(thread_id=self.thread_id, order=ListSortOrder.DESCENDING, limit=self.page_size)
+
+    def _take(self, m, fresh: List[Message], first: bool) -> bool:
+        """Collect m; returns False once the cursor (or, on a first read, one page) is reached."""
+        if m.id == self.last_id:
+            return False
+        fresh.append(_to_message(m))
+        return not (first and len(fresh) >= self.page_size)
+
+    def _commit(self, fresh: List[Message]) -> List[Message]:
+        fresh.reverse()                   # back to chronological order
+        self.messages.extend(fresh)
+        if fresh:
+            self.last_id = fresh[-1].id
+        return fresh
+
+    def refresh(self) -> List[Message]:
+        """Fetch messages newer than the cursor, oldest first. A first read returns the latest page only."""
+        fresh: List[Message] = []
+        first = self.last_id is None
+        for m in self._list():
+            if not self._take(m, fresh, first):
+                break
+        return self._commit(fresh)
+
+    async def arefresh(self) -> List[Message]:
+        """refresh() for the aio agents client."""
+        fresh: List[Message] = []
+        first = self.last_id is None
+        async for m in self._list():
+            if not self._take(m, fresh, first):
+                break
+        return self._commit(fresh)
+
+    def advance(self, message: Message) -> None:
+        """Record a message already read another way (e.g. a streamed reply) so refresh() skips it."""
+        self._commit([message])
+
+    def last_reply(self) -> str:
+        for m in reversed(self.messages):
+            if m.role == "assistant" and m.text:
+                return m.text
+        return ""
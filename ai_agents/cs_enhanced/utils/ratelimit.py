@@ -0,0 +1,221 @@
+# utils/ratelimit.py
+import asyncio, os, random, threading, time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+TRANSIENT_ERRORS = {
+    # by class name, so callers don't need openai / azure-core / requests imported here
+    "ConnectionError", "Timeout", "ReadTimeout", "ConnectTimeout", "TimeoutError",
+    "APIConnectionError", "APITimeoutError", "ServiceRequestError", "ServiceResponseError",
+}
+MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "5"))
+BASE_DELAY_S = float(os.getenv("RETRY_BASE_DELAY_S", "0.5"))
+MAX_DELAY_S = float(os.getenv("RETRY_MAX_DELAY_S", "30"))
+
+
+class TokenBucket:
+    """
+    Refills at `rate` units/second up to `capacity`. acquire(n) blocks until n
+    units are available; a request larger than the bucket waits for a full
+    bucket and leaves it in debt, so oversized requests still go through.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._level = self.capacity
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._level = min(self.capacity, self._level + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def _take(self, n: float) -> float:
+        """Take n units if available (returns 0), else the seconds to wait before trying again."""
+        need = min(n, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self._paused_until and self._level >= need:
+                self._level -= n
+                return 0.0
+            return max(self._paused_until - now, (need - self._level) / self.rate)
+
+    def acquire(self, n: float = 1.0) -> float:
+        """Take n units; returns seconds spent waiting."""
+        waited = 0.0
+        while (delay := self._take(n)) > 0:
+            time.sleep(delay)
+            waited += delay
+        return waited
+
+    async def aacquire(self, n: float = 1.0) -> float:
+        waited = 0.0
+        while (delay := self._take(n)) > 0:
+            await asyncio.sleep(delay)
+            waited += delay
+        return waited
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller back, e.g. after the service answered 429 with Retry-After."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class EndpointLimiter:
+    """Requests-per-minute and tokens-per-minute buckets for one endpoint (either may be None)."""
+
+    def __init__(self, name: str, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.name = name
+        # Burst of ~10 s of quota: Azure evaluates RPM/TPM over short windows, not the full minute
+        self.requests = TokenBucket(rpm / 60.0, rpm / 6.0) if rpm else None
+        self.tokens = TokenBucket(tpm / 60.0, tpm / 6.0) if tpm else None
+        self.waited_s = 0.0
+        self.throttled = 0
+
+    def acquire(self, tokens: float = 0) -> None:
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.acquire(1)
+        if self.tokens is not None and tokens:
+            waited += self.tokens.acquire(tokens)
+        self.waited_s += waited
+
+    async def aacquire(self, tokens: float = 0) -> None:
+        waited = 0.0
+        if self.requests is not None:
+            waited += await self.requests.aacquire(1)
+        if self.tokens is not None and tokens:
+            waited += await self.tokens.aacquire(tokens)
+        self.waited_s += waited
+
+    def backoff(self, seconds: float) -> None:
+        self.throttled += 1
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.pause(seconds)
+
+    def stats(self) -> Dict[str, float]:
+        return {"waited_s": self.waited_s, "throttled": self.throttled}
+
+
+_limiters: Dict[str, EndpointLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(name: str) -> EndpointLimiter:
+    """
+    Shared limiter per endpoint name ("embed", "search", "index", "agent"), sized
+    from RATE_LIMIT_<NAME>_RPM / RATE_LIMIT_<NAME>_TPM. Unset quotas are unlimited.
+    """
+    with _limiters_lock:
+        if name not in _limiters:
+            key = name.upper()
+            rpm = os.getenv(f"RATE_LIMIT_{key}_RPM")
+            tpm = os.getenv(f"RATE_LIMIT_{key}_TPM")
+            _limiters[name] = EndpointLimiter(name, float(rpm) if rpm else None, float(tpm) if tpm else None)
+        return _limiters[name]
+
+
+# ---------- Error classification ----------
+def status_of(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    return int(status) if status is not None else None
+
+
+def retry_after_s(exc: BaseException) -> Optional[float]:
+    """Server-requested delay from retry-after-ms / x-ms-retry-after-ms / Retry-After (secs or HTTP date)."""
+    explicit = getattr(exc, "retry_after", None)
+    if explicit is not None:
+        return float(explicit)
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    for h in ("retry-after-ms", "x-ms-retry-after-ms"):
+        if headers.get(h):
+            try:
+                return float(headers[h]) / 1000.0
+            except ValueError:
+                pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    status = status_of(exc)
+    if status is not None:
+        return status in RETRY_STATUS
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(exc).__mro__)
+
+
+# ---------- Retry ----------
+def backoff_delay(e: Exception, attempt: int, base_delay: float, max_delay: float,
+                   limiter: Optional[EndpointLimiter]) -> float:
+    hinted = retry_after_s(e)
+    delay = hinted if hinted is not None else min(max_delay, base_delay * 2 ** attempt)
+    delay *= random.uniform(1.0, 1.25) if hinted is not None else random.uniform(0.5, 1.0)
+    if limiter is not None and status_of(e) == 429:
+        limiter.backoff(delay)
+    return delay
+
+
+def call_with_retry(
+    fn: Callable[..., T],
+    *args,
+    limiter: Optional[EndpointLimiter] = None,
+    tokens: float = 0,
+    max_attempts: int = MAX_ATTEMPTS,
+    base_delay: float = BASE_DELAY_S,
+    max_delay: float = MAX_DELAY_S,
+    **kw,
+) -> T:
+    """
+    Call fn through the limiter, retrying 408/429/5xx and connection errors with
+    jittered exponential backoff. A Retry-After from the service wins over the
+    computed delay and pauses the shared limiter, so concurrent callers back off
+    together instead of retrying in lockstep.
+    """
+    for attempt in range(max_attempts):
+        if limiter is not None:
+            limiter.acquire(tokens)
+        try:
+            return fn(*args, **kw)
+        except Exception as e:
+            if attempt == max_attempts - 1 or not is_retryable(e):
+                raise
+            time.sleep(backoff_delay(e, attempt, base_delay, max_delay, limiter))
+    raise AssertionError("unreachable")
+
+
+async def acall_with_retry(
+    fn: Callable[..., Awaitable[T]],
+    *args,
+    limiter: Optional[EndpointLimiter] = None,
+    tokens: float = 0,
+    max_attempts: int = MAX_ATTEMPTS,
+    base_delay: float = BASE_DELAY_S,
+    max_delay: float = MAX_DELAY_S,
+    **kw,
+) -> T:
+    """call_with_retry for coroutine functions; waits with asyncio.sleep so the loop keeps serving."""
+    for attempt in range(max_attempts):
+        if limiter is not None:
+            await limiter.aacquire(tokens)
+        try:
+            return await fn(*args, **kw)
+        except Exception as e:
+            if attempt == max_attempts - 1 or not is_retryable(e):
+                raise
+            await asyncio.sleep(backoff_delay(e, attempt, base_delay, max_delay, limiter))
+    raise AssertionError("unreachable")
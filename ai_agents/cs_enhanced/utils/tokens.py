@@ -0,0 +1,27 @@
+# utils/tokens.py
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    # tiktoken is optional; without it we fall back to the ~4 chars/token rule of thumb
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    enc = _encoding()
+    if enc is not None:
+        ids = enc.encode(text, disallowed_special=())
+        return text if len(ids) <= max_tokens else enc.decode(ids[:max_tokens])
+    return text[:max(0, max_tokens - 1) * 4]
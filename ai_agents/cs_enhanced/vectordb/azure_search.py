@@ -1,21 +1,36 @@
 # vectordb/azure_search.py
-import os, time, json, requests
+import asyncio, os, time, json
+from concurrent.futures import ThreadPoolExecutor
 from typing import Iterable, Dict, Any, List
 from azure.core.credentials import AzureKeyCredential
 from azure.search.documents import SearchClient
 from azure.search.documents.indexes import SearchIndexClient
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
 from dotenv import load_dotenv
 from azure.search.documents.models import VectorizedQuery
 
 load_dotenv()
 
-from vectordb.base import VectorStore
+from vectordb.base import AsyncVectorStore, VectorStore
+from vectordb.filters import to_odata
+from utils.transport import get_transport
+from utils.ratelimit import acall_with_retry, call_with_retry, limiter_for
 
 # Azure AI Search
 SEARCH_ENDPOINT = os.getenv("AZURE_SEARCH_ENDPOINT")
 SEARCH_KEY = os.getenv("AZURE_SEARCH_KEY")
 INDEX_NAME = os.getenv("AZURE_SEARCH_INDEX_NAME")
 VECTOR_FIELD = os.getenv("AZURE_SEARCH_VECTOR_FIELD", "contentVector")
+SEARCH_CONCURRENCY = int(os.getenv("AZURE_SEARCH_CONCURRENCY", "8"))   # in-flight requests per search_many
+
+def _with_vectors(hits, include_vectors):
+    # The vector field is retrievable, so it comes back under its index name; expose it as 'vector'
+    if include_vectors:
+        for h in hits:
+            if VECTOR_FIELD in h:
+                h["vector"] = h.pop(VECTOR_FIELD)
+    return hits
+
 
 class AzureSearchStore(VectorStore):
     """
@@ -23,7 +38,14 @@ class AzureSearchStore(VectorStore):
       - id (key, Edm.String)
       - content (Edm.String)
       - vector (Collection(Single)) with appropriate dimensions
-      - (optional) metadata fields
+      - (optional) metadata fields, filterable for search(..., filters=...)
+
+    Filters go out as an OData $filter applied before the vector search
+    (vectorFilterMode=preFilter), so all k results satisfy it.
+
+    search_many() sends one request per query, SEARCH_CONCURRENCY at a time
+    over the pooled transport. Several vectorQueries in one request would be
+    fused into a single ranking, not one result list per query.
     """
     def __init__(self, index_name: str):
         self.endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
@@ -32,12 +54,20 @@ class AzureSearchStore(VectorStore):
             raise RuntimeError("Set AZURE_SEARCH_ENDPOINT and AZURE_SEARCH_API_KEY")
         self.index_name = index_name
         self.client = SearchClient(self.endpoint, index_name, AzureKeyCredential(self.key))
+        self.http = get_transport()
+        self.search_limiter = limiter_for("search")
+        self.index_limiter = limiter_for("index")
 
     def upsert(self, items: Iterable[Dict[str, Any]]) -> None:
-        # 'merge_or_upload' works well for idempotent updates
-        self.client.merge_or_upload_documents(list(items))
+        # 'merge_or_upload' works well for idempotent updates, so retrying is safe
+        call_with_retry(self.client.merge_or_upload_documents, list(items), limiter=self.index_limiter)
+
+    def delete(self, ids: Iterable[str]) -> None:
+        docs = [{"id": i} for i in ids]
+        if docs:
+            call_with_retry(self.client.delete_documents, docs, limiter=self.index_limiter)
 
-    def search(self, query_vector, k):
+    def search(self, query_vector, k, include_vectors=False, filters=None):
 
         url = f"{SEARCH_ENDPOINT}/indexes/{INDEX_NAME}/docs/search?api-version=2024-07-01"
         headers = {"Content-Type": "application/json", "api-key": SEARCH_KEY}
@@ -52,7 +82,24 @@ class AzureSearchStore(VectorStore):
                 }
             ]
         }
-        resp = requests.post(url, headers=headers, data=json.dumps(payload))
+        odata = to_odata(filters)
+        if odata:
+            payload["filter"] = odata
+            payload["vectorFilterMode"] = "preFilter"
+        body = json.dumps(payload)
+        hits = call_with_retry(self._post_search, url, headers, body, limiter=self.search_limiter)
+        return _with_vectors(hits, include_vectors)
+
+    def search_many(self, query_vectors, k, include_vectors=False, filters=None):
+        vectors = list(query_vectors)
+        if len(vectors) <= 1:
+            return [self.search(v, k, include_vectors, filters) for v in vectors]
+        with ThreadPoolExecutor(max_workers=min(SEARCH_CONCURRENCY, len(vectors))) as pool:
+            # map() keeps input order; each request still goes through the search rate limiter
+            return list(pool.map(lambda v: self.search(v, k, include_vectors, filters), vectors))
+
+    def _post_search(self, url, headers, body):
+        resp = self.http.post(url, headers=headers, data=body, timeout=30)
         if resp.status_code >= 400:
             try:
                 print("❌ Search error:", resp.json())
@@ -60,3 +107,51 @@ class AzureSearchStore(VectorStore):
                 print("❌ Search error:", resp.text)
             resp.raise_for_status()
         return resp.json().get("value", [])
+
+
+class AsyncAzureSearchStore(AsyncVectorStore):
+    """AzureSearchStore on the azure.search.documents.aio client; shares the sync store's rate limiters."""
+
+    def __init__(self, index_name: str):
+        self.endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
+        self.key = os.getenv("AZURE_SEARCH_KEY")
+        if not (self.endpoint and self.key):
+            raise RuntimeError("Set AZURE_SEARCH_ENDPOINT and AZURE_SEARCH_API_KEY")
+        self.index_name = index_name
+        self.client = AsyncSearchClient(self.endpoint, index_name, AzureKeyCredential(self.key))
+        self.search_limiter = limiter_for("search")
+        self.index_limiter = limiter_for("index")
+
+    async def upsert(self, items: Iterable[Dict[str, Any]]) -> None:
+        await acall_with_retry(self.client.merge_or_upload_documents, list(items), limiter=self.index_limiter)
+
+    async def delete(self, ids: Iterable[str]) -> None:
+        docs = [{"id": i} for i in ids]
+        if docs:
+            await acall_with_retry(self.client.delete_documents, docs, limiter=self.index_limiter)
+
+    async def _search(self, query_vector, k, filters=None):
+        odata = to_odata(filters)
+        results = await self.client.search(
+            search_text=None,
+            vector_queries=[VectorizedQuery(vector=query_vector, k_nearest_neighbors=k, fields=VECTOR_FIELD)],
+            top=k,
+            **({"filter": odata, "vector_filter_mode": "preFilter"} if odata else {}),
+        )
+        return [dict(r) async for r in results]
+
+    async def search(self, query_vector, k, include_vectors=False, filters=None):
+        hits = await acall_with_retry(self._search, query_vector, k, filters, limiter=self.search_limiter)
+        return _with_vectors(hits, include_vectors)
+
+    async def search_many(self, query_vectors, k, include_vectors=False, filters=None):
+        gate = asyncio.Semaphore(SEARCH_CONCURRENCY)
+
+        async def one(v):
+            async with gate:
+                return await self.search(v, k, include_vectors, filters)
+
+        return list(await asyncio.gather(*(one(v) for v in query_vectors)))
+
+    async def close(self) -> None:
+        await self.client.close()
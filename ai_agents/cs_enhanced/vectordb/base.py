@@ -1,6 +1,9 @@
 # vectordb/base.py
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Iterable, Dict, Any, List
+from typing import Iterable, Dict, Any, List, Optional
+
+from vectordb.filters import Filters
 
 class VectorStore(ABC):
     @abstractmethod
@@ -9,6 +12,73 @@ class VectorStore(ABC):
         pass
 
     @abstractmethod
-    def search(self, vector: list[float], k: int = 5) -> List[Dict[str, Any]]:
-        """Return top-k results with '@search.score' & 'content'."""
+    def search(self, vector: list[float], k: int = 5, include_vectors: bool = False,
+               filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        """
+        Return top-k results with '@search.score' & 'content' (and 'vector' if include_vectors).
+        filters, e.g. {"locale": "en", "product": ["auto", "home"]}, restrict the
+        candidates before ranking (see vectordb.filters).
+        """
+        pass
+
+    def search_many(self, vectors, k: int = 5, include_vectors: bool = False,
+                    filters: Optional[Filters] = None) -> List[List[Dict[str, Any]]]:
+        """
+        search() for a batch of query vectors: one result list per query, in input
+        order. This default loops; stores that can score a batch at once override it.
+        """
+        return [self.search(v, k, include_vectors, filters) for v in vectors]
+
+    def delete(self, ids: Iterable[str]) -> None:
+        """Remove documents by id (optional; stores that can't delete raise)."""
+        raise NotImplementedError(f"{type(self).__name__} does not support delete")
+
+
+class AsyncVectorStore(ABC):
+    """Same contract as VectorStore, for asyncio callers (AsyncQnAAgent)."""
+
+    @abstractmethod
+    async def upsert(self, items: Iterable[Dict[str, Any]]) -> None:
+        pass
+
+    @abstractmethod
+    async def search(self, vector: list[float], k: int = 5, include_vectors: bool = False,
+                     filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
         pass
+
+    async def search_many(self, vectors, k: int = 5, include_vectors: bool = False,
+                          filters: Optional[Filters] = None) -> List[List[Dict[str, Any]]]:
+        """One result list per query vector, in order; the default runs the searches concurrently."""
+        return list(await asyncio.gather(*(self.search(v, k, include_vectors, filters) for v in vectors)))
+
+    async def delete(self, ids: Iterable[str]) -> None:
+        raise NotImplementedError(f"{type(self).__name__} does not support delete")
+
+    async def close(self) -> None:
+        pass
+
+
+class ThreadedAsyncStore(AsyncVectorStore):
+    """
+    Async facade over an in-process VectorStore (local / hnsw / segment).
+    Searches are CPU-bound numpy work, so they run in a worker thread instead
+    of blocking the event loop; numpy releases the GIL for the heavy parts.
+    """
+
+    def __init__(self, store: VectorStore):
+        self.store = store
+
+    async def upsert(self, items: Iterable[Dict[str, Any]]) -> None:
+        await asyncio.to_thread(self.store.upsert, list(items))
+
+    async def search(self, vector: list[float], k: int = 5, include_vectors: bool = False,
+                     filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.search, vector, k, include_vectors, filters)
+
+    async def search_many(self, vectors, k: int = 5, include_vectors: bool = False,
+                          filters: Optional[Filters] = None) -> List[List[Dict[str, Any]]]:
+        # One worker-thread hop for the whole batch, so the store can score it in one pass
+        return await asyncio.to_thread(self.store.search_many, list(vectors), k, include_vectors, filters)
+
+    async def delete(self, ids: Iterable[str]) -> None:
+        await asyncio.to_thread(self.store.delete, list(ids))
@@ -0,0 +1,212 @@
+# vectordb/bm25.py
+import math, os, re
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from vectordb.base import VectorStore
+from vectordb.filters import Filters, matches
+from vectordb.local_store import to_search_score
+
+RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+TITLE_WEIGHT = float(os.getenv("BM25_TITLE_WEIGHT", "2.0"))
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or our so "
+    "that the their there this to was we what when where which who why will with you your".split()
+)
+
+
+def _fold(term: str) -> str:
+    # Plural / 3rd-person "s" only: enough for "takes" ~ "take" without a stemmer dependency
+    return term[:-1] if len(term) > 3 and term.endswith("s") and not term.endswith("ss") else term
+
+
+def analyze(text: str) -> List[str]:
+    """Lower-cased word tokens without stopwords; numbers and ids ("456", "ab-12" -> "ab", "12") are kept."""
+    return [_fold(t) for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Inverted index with BM25 scoring over a document's title and content.
+    Title terms count TITLE_WEIGHT times (a BM25F-style field boost).
+    Supports incremental add / remove; scoring touches only the query terms'
+    posting lists.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, title_weight: float = TITLE_WEIGHT):
+        self.k1 = k1
+        self.b = b
+        self.title_weight = title_weight
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)   # term -> {doc_id: weighted tf}
+        self._terms: Dict[str, Tuple[str, ...]] = {}                       # doc_id -> its distinct terms
+        self._length: Dict[str, float] = {}
+        self._total_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self._length)
+
+    def add(self, doc_id: str, title: str = "", content: str = "") -> None:
+        self.remove(doc_id)
+        tf: Counter = Counter()
+        for t in analyze(title):
+            tf[t] += self.title_weight
+        for t in analyze(content):
+            tf[t] += 1.0
+        for term, n in tf.items():
+            self._postings[term][doc_id] = n
+        self._terms[doc_id] = tuple(tf)
+        self._length[doc_id] = sum(tf.values())
+        self._total_length += self._length[doc_id]
+
+    def remove(self, doc_id: str) -> None:
+        terms = self._terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            docs = self._postings[term]
+            docs.pop(doc_id, None)
+            if not docs:
+                del self._postings[term]
+        self._total_length -= self._length.pop(doc_id)
+
+    def idf(self, term: str) -> float:
+        n, df = len(self._length), len(self._postings.get(term, ()))
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, terms: List[str], k: int = 10,
+               allow: Optional[Callable[[str], bool]] = None) -> List[Tuple[float, str]]:
+        """Top-k (score, doc_id) for already-analyzed query terms; `allow` drops docs before the cut."""
+        if not self._length or not terms:
+            return []
+        avg = self._total_length / len(self._length) or 1.0
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(terms):
+            docs = self._postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf(term)
+            for doc_id, tf in docs.items():
+                norm = self.k1 * (1.0 - self.b + self.b * self._length[doc_id] / avg)
+                scores[doc_id] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return sorted(((s, d) for d, s in scores.items() if allow is None or allow(d)), reverse=True)[:k]
+
+    def max_score(self, terms: List[str]) -> float:
+        """Upper bound of search() scores for these terms: each term's part saturates at idf * (k1 + 1)."""
+        return sum(self.idf(t) * (self.k1 + 1.0) for t in set(terms))
+
+    def coverage(self, doc_id: str, terms: List[str]) -> float:
+        """Share of the distinct query terms that occur in the document."""
+        distinct = set(terms)
+        if not distinct:
+            return 0.0
+        have = set(self._terms.get(doc_id, ()))
+        return len(distinct & have) / len(distinct)
+
+
+class HybridStore(VectorStore):
+    """
+    Keyword + vector retrieval over a local VectorStore (local / hnsw / segment).
+    A BM25 index over title/content is kept next to the wrapped store; results
+    of both are merged with reciprocal-rank fusion (sum of 1 / (RRF_K + rank)).
+
+    '@search.score' stays on the vector scale so SIMILARITY_THRESHOLD keeps its
+    meaning: a hit keeps its vector score, and one found by keywords alone gets
+    to_search_score() of its BM25 score over the query's BM25 ceiling
+    (max_score), so containing every query term is not enough to pass the
+    threshold. Hits are ordered by the fused score ('@search.rrf').
+
+    Only the BM25 index is held here; hit documents are read back from the
+    wrapped store (get), so a memory-mapped segment stays on disk.
+
+      store = HybridStore(LocalVectorStore())
+      store.exact_match("Policy number 456", k=3)     # no embedding needed
+      store.hybrid_search("Policy number 456", q_vec, k=3)
+      store.search(q_vec, 3)                           # plain vector search
+    """
+
+    def __init__(self, store: VectorStore, rrf_k: int = RRF_K, index: Optional[BM25Index] = None):
+        self.store = store
+        self.rrf_k = rrf_k
+        self.index = index or BM25Index()
+        iter_items = getattr(store, "iter_items", None)
+        if iter_items is not None:      # pick up what is already in the store
+            self._index_items(iter_items())
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _index_items(self, items: Iterable[Dict[str, Any]]) -> None:
+        for item in items:
+            self.index.add(str(item["id"]), str(item.get("title", "")), str(item.get("content", "")))
+
+    def upsert(self, items: Iterable[Dict[str, Any]]) -> None:
+        items = list(items)
+        self.store.upsert(items)
+        self._index_items(items)
+
+    def delete(self, ids: Iterable[str]) -> None:
+        ids = [str(i) for i in ids]
+        self.store.delete(ids)
+        for doc_id in ids:
+            self.index.remove(doc_id)
+
+    def search(self, vector: list[float], k: int = 5, include_vectors: bool = False,
+               filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        return self.store.search(vector, k, include_vectors, filters)
+
+    def search_many(self, vectors, k: int = 5, include_vectors: bool = False,
+                    filters: Optional[Filters] = None) -> List[List[Dict[str, Any]]]:
+        return self.store.search_many(vectors, k, include_vectors, filters)
+
+    # ---------- Keyword ----------
+    def _keyword_hits(self, terms: List[str], k: int, filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        allow = (lambda doc_id: matches(self.store.get(doc_id) or {}, filters)) if filters else None
+        ceiling = self.index.max_score(terms) or 1.0
+        hits = []
+        for score, doc_id in self.index.search(terms, k, allow):
+            doc = self.store.get(doc_id)
+            if doc is None:
+                continue
+            hits.append({**doc, "@search.score": float(to_search_score(score / ceiling)),
+                         "@search.bm25": score, "@search.coverage": self.index.coverage(doc_id, terms)})
+        return hits
+
+    def keyword_search(self, text: str, k: int = 5, filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        return self._keyword_hits(analyze(text), k, filters)
+
+    def exact_match(self, text: str, k: int = 5, filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        """
+        Keyword-only fast path for exact-token queries ("Policy number 456"):
+        when the query has a term with a digit in it and the best BM25 hits
+        contain every query term, return those hits, scored 1.0; otherwise [].
+        Natural language questions fall through to hybrid search.
+        """
+        terms = analyze(text)
+        if not any(any(c.isdigit() for c in t) for t in terms):
+            return []
+        return [{**h, "@search.score": 1.0} for h in self._keyword_hits(terms, k, filters)
+                if h["@search.coverage"] == 1.0]
+
+    # ---------- Hybrid ----------
+    def hybrid_search(self, text: str, vector, k: int = 5, include_vectors: bool = False,
+                      candidates: Optional[int] = None, filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        n = candidates or max(4 * k, 20)
+        terms = analyze(text)
+        vector_hits = self.store.search(vector, n, include_vectors, filters) if vector is not None else []
+        keyword_hits = self._keyword_hits(terms, n, filters)
+
+        fused: Dict[str, Dict[str, Any]] = {}
+        for hits in (vector_hits, keyword_hits):
+            for rank, h in enumerate(hits):
+                doc_id = str(h["id"])
+                if doc_id not in fused:
+                    fused[doc_id] = {**h, "@search.rrf": 0.0}
+                else:
+                    merged = fused[doc_id]          # the vector score stands
+                    for key in ("@search.bm25", "@search.coverage"):
+                        if key in h:
+                            merged[key] = h[key]
+                fused[doc_id]["@search.rrf"] += 1.0 / (self.rrf_k + rank + 1)
+        return sorted(fused.values(), key=lambda h: -h["@search.rrf"])[:k]
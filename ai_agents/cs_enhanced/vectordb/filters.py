@@ -0,0 +1,196 @@
+# vectordb/filters.py
+"""
+Metadata filters for VectorStore.search(..., filters=...).
+
+A filter is a dict of field -> value (equality) or field -> list of values
+(any of them); fields are ANDed:
+
+  {"product": "auto", "locale": ["en", "fr"]}
+
+AzureSearchStore sends it as an OData $filter (to_odata); the local stores
+resolve it against a BitmapIndex before scoring, so only matching rows are
+scanned. An OData string is passed through to Azure as-is.
+"""
+import json, re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+
+Filters = Union[Dict[str, Any], str]
+
+UNINDEXED = frozenset({"id", "title", "content", "vector"})
+_FIELD = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _values(want) -> List[Any]:
+    return list(want) if isinstance(want, (list, tuple, set, frozenset)) else [want]
+
+
+def _literal(v) -> str:
+    if isinstance(v, bool):
+        return "true" if v else "false"
+    if isinstance(v, (int, float)):
+        return repr(v)
+    return "'" + str(v).replace("'", "''") + "'"
+
+
+def check_filters(filters: Optional[Filters]) -> None:
+    """Raise ValueError unless a dict filter maps valid field names to a scalar or a list of scalars."""
+    if not filters or isinstance(filters, str):
+        return
+    for field, want in filters.items():
+        if not isinstance(field, str) or not _FIELD.match(field):
+            raise ValueError(f"Invalid filter field: {field!r}")
+        if not all(isinstance(v, (str, int, float, bool)) for v in _values(want)):
+            raise ValueError(f"Filter values for {field!r} must be strings, numbers or booleans")
+
+
+def to_odata(filters: Optional[Filters]) -> Optional[str]:
+    """OData $filter for Azure AI Search, e.g. "product eq 'auto' and search.in(locale, 'en,fr', ',')"."""
+    if not filters:
+        return None
+    if isinstance(filters, str):
+        return filters
+    check_filters(filters)
+    clauses = []
+    for field, want in filters.items():
+        values = _values(want)
+        if not values:
+            clauses.append("false")
+        elif len(values) == 1:
+            clauses.append(f"{field} eq {_literal(values[0])}")
+        elif all(isinstance(v, str) and "," not in v for v in values):
+            # search.in is evaluated as one set lookup instead of a chain of comparisons
+            joined = ",".join(values).replace("'", "''")
+            clauses.append(f"search.in({field}, '{joined}', ',')")
+        else:
+            clauses.append("(" + " or ".join(f"{field} eq {_literal(v)}" for v in values) + ")")
+    return " and ".join(clauses)
+
+
+def matches(doc: Dict[str, Any], filters: Optional[Filters]) -> bool:
+    """Whether a stored doc passes a dict filter (list-valued fields match if any element does)."""
+    if not filters:
+        return True
+    if isinstance(filters, str):
+        raise ValueError("Local stores take dict filters; OData strings only work with AzureSearchStore")
+    for field, want in filters.items():
+        have = doc.get(field)
+        values = _values(want)
+        if isinstance(have, (list, tuple, set)):
+            if not any(h in values for h in have):
+                return False
+        elif have is None or have not in values:
+            return False
+    return True
+
+
+def parse_filters(text: str) -> Dict[str, Any]:
+    """
+    Filters from a short text form, for UIs and CLIs:
+      "product=auto; locale=en|fr"  ->  {"product": "auto", "locale": ["en", "fr"]}
+    """
+    out: Dict[str, Any] = {}
+    for part in re.split(r"[;,]", text or ""):
+        if not part.strip():
+            continue
+        field, sep, value = part.partition("=")
+        if not sep or not field.strip():
+            raise ValueError(f"Expected field=value, got {part.strip()!r}")
+        values = [v.strip() for v in value.split("|") if v.strip()]
+        out[field.strip()] = values[0] if len(values) == 1 else values
+    return out
+
+
+class BitmapIndex:
+    """
+    One bitset per (field, value) over store row numbers, packed 8 rows per
+    byte in a numpy uint8 array. A filter ORs the bitsets of each field's
+    values and ANDs the fields, then unpacks to a boolean row mask, so a
+    filtered search touches only the rows that pass.
+
+      bitmaps.set(row, doc) / bitmaps.clear(row, doc)   # keep in step with the store
+      mask = bitmaps.mask({"locale": "en"}, n_rows)     # bool[n_rows]
+
+    fields=None indexes every scalar (or list-of-scalars) metadata field.
+    """
+
+    def __init__(self, fields: Optional[Iterable[str]] = None):
+        self.fields = set(fields) if fields is not None else None
+        self._bits: Dict[Tuple[str, Any], np.ndarray] = {}
+        self._nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._bits)
+
+    def _keys(self, doc: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+        for field, value in doc.items():
+            if field in UNINDEXED or field.startswith("@"):
+                continue
+            if self.fields is not None and field not in self.fields:
+                continue
+            for v in _values(value):
+                if isinstance(v, (str, int, float, bool)):
+                    yield field, v
+
+    def _grow(self, row: int) -> None:
+        need = (row >> 3) + 1
+        if need <= self._nbytes:
+            return
+        size = max(need, 2 * self._nbytes, 128)
+        for key, bits in self._bits.items():
+            grown = np.zeros(size, dtype=np.uint8)
+            grown[:len(bits)] = bits
+            self._bits[key] = grown
+        self._nbytes = size
+
+    def set(self, row: int, doc: Dict[str, Any]) -> None:
+        keys = list(self._keys(doc))
+        if not keys:
+            return
+        self._grow(row)
+        for key in keys:
+            bits = self._bits.get(key)
+            if bits is None:
+                bits = self._bits[key] = np.zeros(self._nbytes, dtype=np.uint8)
+            bits[row >> 3] |= 1 << (row & 7)
+
+    def clear(self, row: int, doc: Dict[str, Any]) -> None:
+        for key in self._keys(doc):
+            bits = self._bits.get(key)
+            if bits is not None and (row >> 3) < len(bits):
+                bits[row >> 3] &= 0xFF ^ (1 << (row & 7))
+
+    def mask(self, filters: Optional[Filters], n: int) -> Optional[np.ndarray]:
+        """Boolean mask over rows [0, n) that pass `filters`; None when there is nothing to filter."""
+        if not filters:
+            return None
+        if isinstance(filters, str):
+            raise ValueError("Local stores take dict filters; OData strings only work with AzureSearchStore")
+        acc: Optional[np.ndarray] = None
+        for field, want in filters.items():
+            any_of = np.zeros(self._nbytes, dtype=np.uint8)
+            for v in _values(want):
+                bits = self._bits.get((field, v))
+                if bits is not None:
+                    any_of |= bits
+            acc = any_of if acc is None else np.bitwise_and(acc, any_of, out=acc)
+        # unpackbits zero-pads past the last indexed row
+        return np.unpackbits(acc, count=n, bitorder="little").astype(bool)
+
+    def stats(self) -> Dict[str, int]:
+        return {"bitmaps": len(self._bits), "bytes": len(self._bits) * self._nbytes}
+
+    # ---------- Persistence ----------
+    def state(self) -> Dict[str, np.ndarray]:
+        keys = list(self._bits)
+        bits = np.stack([self._bits[k] for k in keys]) if keys else np.zeros((0, 0), dtype=np.uint8)
+        return {"keys": np.array(json.dumps([list(k) for k in keys])), "bits": bits}
+
+    @classmethod
+    def from_state(cls, st: Dict[str, np.ndarray], fields: Optional[Iterable[str]] = None) -> "BitmapIndex":
+        idx = cls(fields)
+        bits = st["bits"]
+        idx._nbytes = int(bits.shape[1]) if bits.ndim == 2 else 0
+        for (field, value), row in zip(json.loads(str(st["keys"])), bits):
+            idx._bits[(field, value)] = np.array(row, dtype=np.uint8)
+        return idx
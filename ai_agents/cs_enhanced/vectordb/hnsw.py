@@ -0,0 +1,413 @@
+# vectordb/hnsw.py
+import heapq, json, math, os, random, time
+from typing import Iterable, Dict, Any, List, Optional, Tuple
+import numpy as np
+
+from vectordb.base import VectorStore
+from vectordb.filters import BitmapIndex, Filters
+from vectordb.local_store import to_search_score
+
+FILTER_EXACT_ROWS = int(os.getenv("HNSW_FILTER_EXACT_ROWS", "4096"))
+# Rebuild the graph once this fraction of its nodes are tombstones (and at least COMPACT_MIN of them)
+COMPACT_FRACTION = float(os.getenv("HNSW_COMPACT_FRACTION", "0.2"))
+COMPACT_MIN = int(os.getenv("HNSW_COMPACT_MIN", "64"))
+
+
+class HNSWIndex:
+    """
+    Hierarchical Navigable Small World graph over unit-normalised float32 vectors
+    (cosine distance = 1 - dot). Rows are addressed by integer position.
+
+      M               - links per node on upper layers (layer 0 keeps 2*M)
+      ef_construction - beam width while inserting (build quality)
+      ef_search       - beam width while querying (recall vs latency)
+    """
+
+    def __init__(self, dims: int, M: int = 16, ef_construction: int = 200, ef_search: int = 64, seed: int = 42):
+        self.dims = dims
+        self.M = M
+        self.M0 = 2 * M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._ml = 1.0 / math.log(max(M, 2))
+        self._rng = random.Random(seed)
+
+        self._vectors = np.zeros((1024, dims), dtype=np.float32)
+        self._links: List[List[List[int]]] = []   # node -> level -> neighbour rows
+        self._deleted: set[int] = set()
+        self.entry: Optional[int] = None
+        self.max_level = -1
+
+    def __len__(self) -> int:
+        return len(self._links)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:len(self._links)]
+
+    # ---------- Helpers ----------
+    @staticmethod
+    def _normalise(vec) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32).reshape(-1)
+        n = np.linalg.norm(v)
+        return v / n if n else v
+
+    def _dist(self, q: np.ndarray, rows: List[int]) -> np.ndarray:
+        return 1.0 - self._vectors[rows] @ q
+
+    def _search_layer(self, q: np.ndarray, entry: List[int], ef: int, level: int) -> List[Tuple[float, int]]:
+        """Greedy beam search on one layer; returns [(dist, row)] sorted ascending."""
+        visited = set(entry)
+        d0 = self._dist(q, entry)
+        candidates = [(float(d), r) for d, r in zip(d0, entry)]
+        heapq.heapify(candidates)
+        best = [(-d, r) for d, r in candidates]     # max-heap of the ef closest
+        heapq.heapify(best)
+        while len(best) > ef:
+            heapq.heappop(best)
+
+        while candidates:
+            d, r = heapq.heappop(candidates)
+            if d > -best[0][0] and len(best) >= ef:
+                break
+            links = self._links[r]
+            if level >= len(links):
+                continue
+            fresh = [n for n in links[level] if n not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            for dn, n in zip(self._dist(q, fresh).tolist(), fresh):
+                if len(best) < ef or dn < -best[0][0]:
+                    heapq.heappush(candidates, (dn, n))
+                    heapq.heappush(best, (-dn, n))
+                    if len(best) > ef:
+                        heapq.heappop(best)
+        return sorted((-d, r) for d, r in best)
+
+    def _select_neighbours(self, q: np.ndarray, found: List[Tuple[float, int]], m: int) -> List[int]:
+        """Diversity heuristic from the HNSW paper, topped up with the closest pruned rows."""
+        if len(found) <= m:
+            return [r for _, r in found]
+        rows = [r for _, r in found]
+        pair = 1.0 - self._vectors[rows] @ self._vectors[rows].T   # candidate-to-candidate distances
+        nearest_selected = np.full(len(rows), np.inf, dtype=np.float32)
+        selected: List[int] = []
+        pruned: List[int] = []
+        for i, (d, _) in enumerate(found):
+            if len(selected) >= m:
+                break
+            if nearest_selected[i] < d:
+                pruned.append(i)
+            else:
+                selected.append(i)
+                np.minimum(nearest_selected, pair[i], out=nearest_selected)
+        selected.extend(pruned[:m - len(selected)])
+        return [rows[i] for i in selected]
+
+    def _shrink(self, row: int, level: int) -> None:
+        limit = self.M0 if level == 0 else self.M
+        links = self._links[row][level]
+        if len(links) <= limit:
+            return
+        d = self._dist(self._vectors[row], links)
+        self._links[row][level] = self._select_neighbours(
+            self._vectors[row], sorted(zip(d.tolist(), links)), limit
+        )
+
+    # ---------- Build ----------
+    def add(self, vec) -> int:
+        q = self._normalise(vec)
+        row = len(self._links)
+        if row >= self._vectors.shape[0]:
+            grown = np.zeros((self._vectors.shape[0] * 2, self.dims), dtype=np.float32)
+            grown[:row] = self._vectors[:row]
+            self._vectors = grown
+        self._vectors[row] = q
+
+        level = int(-math.log(1.0 - self._rng.random()) * self._ml)
+        self._links.append([[] for _ in range(level + 1)])
+
+        if self.entry is None:
+            self.entry, self.max_level = row, level
+            return row
+
+        ep = [self.entry]
+        for lc in range(self.max_level, level, -1):
+            ep = [self._search_layer(q, ep, 1, lc)[0][1]]
+
+        for lc in range(min(level, self.max_level), -1, -1):
+            found = self._search_layer(q, ep, self.ef_construction, lc)
+            neighbours = self._select_neighbours(q, found, self.M0 if lc == 0 else self.M)
+            self._links[row][lc] = list(neighbours)
+            for n in neighbours:
+                self._links[n][lc].append(row)
+                self._shrink(n, lc)
+            ep = [r for _, r in found]
+
+        if level > self.max_level:
+            self.entry, self.max_level = row, level
+        return row
+
+    def mark_deleted(self, row: int) -> None:
+        """Tombstone a row; it still routes searches but is never returned."""
+        self._deleted.add(row)
+
+    # ---------- Query ----------
+    def search(self, vec, k: int, ef: Optional[int] = None,
+               allowed: Optional[np.ndarray] = None) -> List[Tuple[float, int]]:
+        """
+        Return up to k (cosine, row) pairs, best first. Rows where `allowed` is
+        False still route the walk but are not returned.
+        """
+        if self.entry is None or k <= 0:
+            return []
+        q = self._normalise(vec)
+        ep = [self.entry]
+        for lc in range(self.max_level, 0, -1):
+            ep = [self._search_layer(q, ep, 1, lc)[0][1]]
+        ef = ef or self.ef_search
+        # Tombstones still fill the beam; widen it for them, but at most double it
+        ef = max(ef, k + min(len(self._deleted), ef))
+        found = self._search_layer(q, ep, ef, 0)
+        return [(1.0 - d, r) for d, r in found
+                if r not in self._deleted and (allowed is None or allowed[r])][:k]
+
+    def exact_search(self, vec, k: int, rows: Optional[np.ndarray] = None) -> List[Tuple[float, int]]:
+        """Brute-force top-k over every live row, or only over `rows` when given."""
+        if rows is not None:
+            if self._deleted:
+                rows = rows[~np.isin(rows, list(self._deleted))]
+            if not len(rows) or k <= 0:
+                return []
+            sims = self._vectors[rows] @ self._normalise(vec)
+            k = min(k, len(rows))
+            top = np.argpartition(-sims, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+            top = top[np.argsort(-sims[top], kind="stable")]
+            return [(float(sims[i]), int(rows[i])) for i in top]
+        n = len(self._links)
+        if not n or k <= 0:
+            return []
+        sims = self._vectors[:n] @ self._normalise(vec)
+        if self._deleted:
+            sims[list(self._deleted)] = -np.inf
+        k = min(k, n - len(self._deleted))
+        top = np.argpartition(-sims, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.argsort(-sims[top], kind="stable")][:k]
+        return [(float(sims[r]), int(r)) for r in top]
+
+    # ---------- Persistence ----------
+    def state(self) -> Dict[str, np.ndarray]:
+        levels = np.array([len(l) for l in self._links], dtype=np.int32)
+        flat = [l for node in self._links for l in node]
+        offsets = np.zeros(len(flat) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(l) for l in flat])
+        neighbours = np.fromiter((n for l in flat for n in l), dtype=np.int32, count=int(offsets[-1]))
+        params = np.array([self.dims, self.M, self.ef_construction, self.ef_search,
+                           -1 if self.entry is None else self.entry, self.max_level], dtype=np.int64)
+        return {
+            "vectors": self.vectors, "levels": levels, "offsets": offsets, "neighbours": neighbours,
+            "deleted": np.array(sorted(self._deleted), dtype=np.int64), "params": params,
+        }
+
+    @classmethod
+    def from_state(cls, st: Dict[str, np.ndarray]) -> "HNSWIndex":
+        dims, M, efc, efs, entry, max_level = (int(x) for x in st["params"])
+        idx = cls(dims, M=M, ef_construction=efc, ef_search=efs)
+        vectors = st["vectors"]
+        idx._vectors = np.zeros((max(len(vectors), 1024), dims), dtype=np.float32)
+        idx._vectors[:len(vectors)] = vectors
+        offsets, neighbours = st["offsets"], st["neighbours"]
+        pos = 0
+        for lv in st["levels"].tolist():
+            node = []
+            for _ in range(lv):
+                node.append(neighbours[offsets[pos]:offsets[pos + 1]].tolist())
+                pos += 1
+            idx._links.append(node)
+        idx._deleted = set(st["deleted"].tolist())
+        idx.entry = None if entry < 0 else entry
+        idx.max_level = max_level
+        return idx
+
+
+class HNSWStore(VectorStore):
+    """
+    VectorStore over an in-repo HNSW graph, for corpora too large to brute-force.
+    Re-upserting an id with a new vector tombstones the old row and links a
+    fresh one (an unchanged vector only updates the metadata in place). Once
+    tombstones reach compact_fraction of the nodes the graph is rebuilt from
+    the live rows (compact()).
+
+    Filtered searches take the row mask from a BitmapIndex over the metadata:
+    when at most filter_exact_rows rows pass, those rows are scored directly
+    (cheaper than a walk that would mostly visit excluded nodes); otherwise the
+    graph is walked with ef widened by the filter's selectivity.
+    """
+
+    def __init__(self, dims: Optional[int] = None, *, M: int = 16, ef_construction: int = 200,
+                 ef_search: int = 64, vector_field: str = "vector", filter_fields: Optional[Iterable[str]] = None,
+                 filter_exact_rows: int = FILTER_EXACT_ROWS, compact_fraction: float = COMPACT_FRACTION):
+        self.dims = dims
+        self.vector_field = vector_field
+        self._params = dict(M=M, ef_construction=ef_construction, ef_search=ef_search)
+        self.index: Optional[HNSWIndex] = HNSWIndex(dims, **self._params) if dims else None
+        self._docs: List[Dict[str, Any]] = []
+        self._row: Dict[str, int] = {}
+        self.filter_exact_rows = filter_exact_rows
+        self.compact_fraction = compact_fraction
+        self.bitmaps = BitmapIndex(filter_fields)
+
+    def __len__(self) -> int:
+        return len(self._row)
+
+    @property
+    def ef_search(self) -> int:
+        return self.index.ef_search if self.index else self._params["ef_search"]
+
+    @ef_search.setter
+    def ef_search(self, value: int) -> None:
+        self._params["ef_search"] = value
+        if self.index:
+            self.index.ef_search = value
+
+    def upsert(self, items: Iterable[Dict[str, Any]]) -> None:
+        for item in items:
+            vec = item.get(self.vector_field)
+            if vec is None:
+                vec = item.get("vector")
+            if vec is None:
+                raise ValueError(f"Item {item.get('id')!r} has no '{self.vector_field}' vector")
+            if self.index is None:
+                self.dims = len(vec)
+                self.index = HNSWIndex(self.dims, **self._params)
+            if len(vec) != self.dims:
+                raise ValueError(f"Embedding dim mismatch: got {len(vec)}, expected {self.dims}")
+
+            doc_id = str(item["id"])
+            doc = {k: v for k, v in item.items() if k not in (self.vector_field, "vector")}
+            old = self._row.get(doc_id)
+            if old is not None:
+                self.bitmaps.clear(old, self._docs[old])
+                if np.array_equal(self.index.vectors[old], HNSWIndex._normalise(vec)):
+                    self._docs[old] = doc
+                    self.bitmaps.set(old, doc)
+                    continue
+                self.index.mark_deleted(old)
+            row = self.index.add(vec)
+            self._docs.append(doc)
+            self._row[doc_id] = row
+            self.bitmaps.set(row, doc)
+        self._maybe_compact()
+
+    def delete(self, ids: Iterable[str]) -> None:
+        for doc_id in ids:
+            row = self._row.pop(str(doc_id), None)
+            if row is not None:
+                self.index.mark_deleted(row)
+                self.bitmaps.clear(row, self._docs[row])
+        self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        dead = len(self.index._deleted) if self.index else 0
+        if dead >= max(COMPACT_MIN, self.compact_fraction * len(self.index)):
+            self.compact()
+
+    def compact(self) -> None:
+        """Rebuild the graph from the live rows, dropping tombstones (row numbers change)."""
+        if self.index is None:
+            return
+        old, docs, live = self.index, self._docs, sorted(self._row.items(), key=lambda p: p[1])
+        self.index = HNSWIndex(self.dims, **self._params)
+        self._docs, self._row = [], {}
+        self.bitmaps = BitmapIndex(self.bitmaps.fields)
+        for doc_id, row in live:
+            new = self.index.add(old.vectors[row])
+            self._docs.append(docs[row])
+            self._row[doc_id] = new
+            self.bitmaps.set(new, docs[row])
+
+    def _filtered(self, vector, k: int, filters: Filters) -> List[Tuple[float, int]]:
+        mask = self.bitmaps.mask(filters, len(self.index))
+        rows = np.flatnonzero(mask)
+        if len(rows) <= self.filter_exact_rows:
+            return self.index.exact_search(vector, k, rows)
+        # Widen the beam so roughly ef_search passing rows are still collected
+        ef = min(len(self.index), int(self.index.ef_search * len(self.index) / len(rows)))
+        found = self.index.search(vector, k, ef=ef, allowed=mask)
+        return found if len(found) >= k else self.index.exact_search(vector, k, rows)
+
+    def search(self, vector: list[float], k: int = 5, include_vectors: bool = False,
+               filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        if self.index is None:
+            return []
+        hits = []
+        found = self._filtered(vector, k, filters) if filters else self.index.search(vector, k)
+        for c, r in found:
+            hit = {**self._docs[r], "@search.score": float(to_search_score(c))}
+            if include_vectors:
+                hit["vector"] = self.index.vectors[r]    # unit-normalised
+            hits.append(hit)
+        return hits
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        row = self._row.get(doc_id)
+        return None if row is None else dict(self._docs[row])
+
+    def iter_items(self):
+        """Yield live items with their (unit-normalised) vectors."""
+        for row in sorted(self._row.values()):
+            yield {**self._docs[row], self.vector_field: self.index.vectors[row].tolist()}
+
+    def recall(self, queries, k: int = 10, ef_search: Optional[int] = None) -> Dict[str, float]:
+        """
+        recall@k of the graph against exact search over the same vectors,
+        plus mean per-query latency of each, so ef_search can be tuned.
+        """
+        if self.index is None:
+            return {"recall": 0.0, "hnsw_ms": 0.0, "exact_ms": 0.0}
+        queries = [np.asarray(q, dtype=np.float32) for q in queries]
+        hits = total = 0
+        t_ann = t_exact = 0.0
+        for q in queries:
+            t0 = time.perf_counter()
+            approx = {r for _, r in self.index.search(q, k, ef=ef_search)}
+            t1 = time.perf_counter()
+            exact = {r for _, r in self.index.exact_search(q, k)}
+            t2 = time.perf_counter()
+            hits += len(approx & exact)
+            total += len(exact)
+            t_ann += t1 - t0
+            t_exact += t2 - t1
+        n = max(len(queries), 1)
+        return {
+            "recall": hits / total if total else 0.0,
+            "k": k,
+            "ef_search": ef_search or self.index.ef_search,
+            "hnsw_ms": 1000 * t_ann / n,
+            "exact_ms": 1000 * t_exact / n,
+        }
+
+    # ---------- Persistence ----------
+    def save(self, path: str) -> None:
+        if self.index is None:
+            raise RuntimeError("Nothing to save: index is empty")
+        ids = [None] * len(self._docs)
+        for doc_id, row in self._row.items():
+            ids[row] = doc_id
+        with open(path, "wb") as f:
+            np.savez(f, **self.index.state(), docs=np.array(json.dumps({"docs": self._docs, "ids": ids})))
+
+    @classmethod
+    def load(cls, path: str, vector_field: str = "vector", **kw) -> "HNSWStore":
+        with np.load(path, allow_pickle=False) as st:
+            index = HNSWIndex.from_state(st)
+            meta = json.loads(str(st["docs"]))
+        store = cls(index.dims, M=index.M, ef_construction=index.ef_construction,
+                    ef_search=index.ef_search, vector_field=vector_field, **kw)
+        store.index = index
+        store._docs = meta["docs"]
+        store._row = {doc_id: row for row, doc_id in enumerate(meta["ids"]) if doc_id is not None}
+        for row in store._row.values():
+            store.bitmaps.set(row, store._docs[row])
+        return store
@@ -0,0 +1,291 @@
+# vectordb/local_store.py
+import os, tempfile
+from typing import Iterable, Dict, Any, List, Optional
+import numpy as np
+
+from vectordb.base import VectorStore
+from vectordb.filters import BitmapIndex, Filters
+from vectordb.quantization import build_quantizer, rescored_topk
+
+SEARCH_BATCH_CELLS = int(os.getenv("SEARCH_BATCH_CELLS", str(1 << 24)))   # query x row scores held at once
+SPILL_DIR = os.getenv("VECTOR_SPILL_DIR") or None   # quantized stores: where the float32 rows are memmapped
+
+
+def to_search_score(cos):
+    """
+    Azure AI Search reports cosine hits as 1 / (1 + (1 - cos)).
+    Using the same scale keeps SIMILARITY_THRESHOLD meaningful across stores.
+    """
+    return 1.0 / (2.0 - cos)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k largest scores, best first."""
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process brute-force cosine store.
+
+    Vectors live in one contiguous float32 matrix (rows grow geometrically),
+    with row norms precomputed on upsert so a query is a single mat-vec.
+    Items use the same shape as AzureSearchStore.upsert:
+      {'id': str, 'content': str, 'vector': list[float], ...metadata}
+
+    quantization="int8" | "pq" scans compressed codes first and rescores the
+    best k * oversample rows against the full-precision matrix. That matrix is
+    then memmapped from an unlinked temp file (VECTOR_SPILL_DIR), so only the
+    codes and norms are held in RAM; rescoring pages in just the candidates.
+
+    Metadata fields are kept in a BitmapIndex (`filter_fields`, default all),
+    so search(..., filters=...) scores only the rows that pass the filter.
+
+    search_many() scores a batch of queries with one matrix-matrix product per
+    chunk of queries (chunks keep queries x rows under SEARCH_BATCH_CELLS).
+    """
+
+    def __init__(self, dims: Optional[int] = None, vector_field: str = "vector", initial_capacity: int = 1024,
+                 quantization: Optional[str] = None, oversample: Optional[int] = None,
+                 filter_fields: Optional[Iterable[str]] = None):
+        self.dims = dims
+        self.vector_field = vector_field
+        self._capacity = initial_capacity
+        self._matrix: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+        self._docs: List[Dict[str, Any]] = []
+        self._ids: List[str] = []
+        self._row: Dict[str, int] = {}
+        self.quantization = quantization
+        self.oversample = oversample
+        self._quantizer = None
+        self._stale: set[int] = set()   # rows upserted since their codes were computed
+        self.bitmaps = BitmapIndex(filter_fields)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # ---------- Storage ----------
+    def _vector_of(self, item: Dict[str, Any]):
+        vec = item.get(self.vector_field)
+        if vec is None:
+            vec = item.get("vector")
+        if vec is None:
+            raise ValueError(f"Item {item.get('id')!r} has no '{self.vector_field}' vector")
+        return vec
+
+    def _alloc(self, cap: int) -> np.ndarray:
+        if not self.quantization:
+            return np.zeros((cap, self.dims), dtype=np.float32)
+        # The mapping keeps the unlinked file alive; it is freed with the array
+        with tempfile.TemporaryFile(dir=SPILL_DIR) as f:
+            return np.memmap(f, dtype=np.float32, mode="w+", shape=(cap, self.dims))
+
+    def _ensure_capacity(self, n: int) -> None:
+        if self._matrix is None:
+            cap = max(self._capacity, n)
+            self._matrix = self._alloc(cap)
+            self._norms = np.zeros(cap, dtype=np.float32)
+            return
+        cap = self._matrix.shape[0]
+        if n <= cap:
+            return
+        while cap < n:
+            cap *= 2
+        matrix = self._alloc(cap)
+        norms = np.zeros(cap, dtype=np.float32)
+        size = len(self._ids)
+        matrix[:size] = self._matrix[:size]
+        norms[:size] = self._norms[:size]
+        self._matrix, self._norms = matrix, norms
+
+    def upsert(self, items: Iterable[Dict[str, Any]]) -> None:
+        for item in items:
+            vec = np.asarray(self._vector_of(item), dtype=np.float32)
+            if self.dims is None:
+                self.dims = int(vec.shape[0])
+            if vec.shape != (self.dims,):
+                raise ValueError(f"Embedding dim mismatch: got {vec.shape[0]}, expected {self.dims}")
+
+            doc_id = str(item["id"])
+            row = self._row.get(doc_id)
+            if row is None:
+                row = len(self._ids)
+                self._ensure_capacity(row + 1)
+                self._ids.append(doc_id)
+                self._docs.append({})
+                self._row[doc_id] = row
+            else:
+                self.bitmaps.clear(row, self._docs[row])
+
+            self._matrix[row] = vec
+            self._norms[row] = np.linalg.norm(vec)
+            self._docs[row] = {k: v for k, v in item.items() if k not in (self.vector_field, "vector")}
+            self.bitmaps.set(row, self._docs[row])
+            if self.quantization:
+                self._stale.add(row)
+
+    def delete(self, ids: Iterable[str]) -> None:
+        """Swap-remove: the last row moves into the freed slot so the matrix stays contiguous."""
+        for doc_id in ids:
+            row = self._row.pop(str(doc_id), None)
+            if row is None:
+                continue
+            last = len(self._ids) - 1
+            self.bitmaps.clear(row, self._docs[row])
+            if row != last:
+                moved = self._ids[last]
+                self.bitmaps.clear(last, self._docs[last])
+                self.bitmaps.set(row, self._docs[last])
+                self._matrix[row] = self._matrix[last]
+                self._norms[row] = self._norms[last]
+                self._ids[row], self._docs[row] = moved, self._docs[last]
+                self._row[moved] = row
+                if last in self._stale:
+                    self._stale.add(row)
+            self._stale.discard(last)
+            if self._quantizer is not None:
+                codes = self._quantizer.codes
+                if last < len(codes):
+                    codes[row] = codes[last]
+                elif row != last:
+                    self._stale.add(row)    # the moved row was upserted after the codes were computed
+                self._quantizer.codes = codes[:last]
+            self._ids.pop()
+            self._docs.pop()
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        row = self._row.get(doc_id)
+        return None if row is None else dict(self._docs[row])
+
+    def iter_items(self):
+        """Yield stored items (with vectors) in insertion order, e.g. for write_segment."""
+        for row, doc in enumerate(self._docs):
+            yield {**doc, self.vector_field: self._matrix[row].tolist()}
+
+    # ---------- Quantization ----------
+    def train_quantizer(self) -> None:
+        """(Re)fit codebooks on everything stored so far and encode all rows."""
+        self._quantizer = build_quantizer(self.quantization, self._matrix[:len(self._ids)])
+        self._stale.clear()
+
+    def _sync_quantizer(self) -> None:
+        if self._quantizer is None:
+            self.train_quantizer()
+            return
+        if not self._stale:
+            return
+        codes = self._quantizer.codes
+        n = len(self._ids)
+        if len(codes) < n:
+            grown = np.zeros((n, codes.shape[1]), dtype=codes.dtype)
+            grown[:len(codes)] = codes
+            self._quantizer.codes = grown
+        rows = np.fromiter(sorted(self._stale), dtype=np.int64)
+        self._quantizer.codes[rows] = self._quantizer.encode(self._matrix[rows])
+        self._stale.clear()
+
+    def _exact(self, rows: np.ndarray, unit_query: np.ndarray) -> np.ndarray:
+        norms = self._norms[rows]
+        return (self._matrix[rows] @ unit_query) / np.where(norms > 0, norms, 1.0)
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes resident in this process; a quantized store's float rows are mapped, not resident."""
+        n = len(self._ids)
+        vectors = int(self._matrix[:n].nbytes) if n else 0
+        return {
+            "vectors": 0 if self.quantization else vectors,
+            "mapped_vectors": vectors if self.quantization else 0,
+            "norms": int(self._norms[:n].nbytes) if n else 0,
+            "codes": int(self._quantizer.nbytes) if self._quantizer is not None else 0,
+        }
+
+    # ---------- Search ----------
+    def _topk(self, queries: np.ndarray, k: int):
+        """Cosine top-k for a (q, d) batch; returns (rows, cos) each shaped (q, k)."""
+        n = len(self._ids)
+        k = min(k, n)
+        q_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        q_norms[q_norms == 0] = 1.0
+        denom = self._norms[:n].copy()
+        denom[denom == 0] = 1.0
+
+        sims = (queries / q_norms) @ self._matrix[:n].T
+        sims /= denom
+
+        if k < n:
+            part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        else:
+            part = np.tile(np.arange(n), (sims.shape[0], 1))
+        part_scores = np.take_along_axis(sims, part, axis=1)
+        order = np.argsort(-part_scores, axis=1, kind="stable")
+        rows = np.take_along_axis(part, order, axis=1)
+        return rows, np.take_along_axis(part_scores, order, axis=1)
+
+    def _hits(self, rows, cos, include_vectors: bool = False) -> List[Dict[str, Any]]:
+        hits = [
+            {**self._docs[r], "@search.score": float(to_search_score(c))}
+            for r, c in zip(rows.tolist(), cos.tolist())
+        ]
+        if include_vectors:
+            for h, r in zip(hits, rows.tolist()):
+                h["vector"] = self._matrix[r]
+        return hits
+
+    def search(self, vector: list[float], k: int = 5, include_vectors: bool = False,
+               filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        if not self._ids or k <= 0:
+            return []
+        query = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        mask = self.bitmaps.mask(filters, len(self._ids))
+        if self.quantization:
+            self._sync_quantizer()
+            qn = np.linalg.norm(query[0])
+            rows, cos = rescored_topk(self._quantizer, query[0] / (qn or 1.0), k, self._exact, self.oversample, mask)
+            return self._hits(rows, cos, include_vectors)
+        if mask is not None:
+            # Score just the rows that pass the filter
+            rows = np.flatnonzero(mask)
+            qn = np.linalg.norm(query[0])
+            cos = self._exact(rows, query[0] / (qn or 1.0))
+            top = top_k(cos, k)
+            return self._hits(rows[top], cos[top], include_vectors)
+        rows, cos = self._topk(query, k)
+        return self._hits(rows[0], cos[0], include_vectors)
+
+    def search_many(self, vectors, k: int = 5, include_vectors: bool = False,
+                    filters: Optional[Filters] = None) -> List[List[Dict[str, Any]]]:
+        queries = np.asarray(vectors, dtype=np.float32)
+        if not self._ids or k <= 0 or not len(queries):
+            return [[] for _ in range(len(queries))]
+        queries = queries.reshape(len(queries), -1)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        units = queries / np.where(norms > 0, norms, 1.0)
+        mask = self.bitmaps.mask(filters, len(self._ids))
+        if self.quantization:
+            self._sync_quantizer()
+
+        rows = np.flatnonzero(mask) if mask is not None else None
+        if rows is not None and not self.quantization:
+            denom = self._norms[rows]
+            subset, denom = self._matrix[rows], np.where(denom > 0, denom, 1.0)   # gathered once per batch
+        step = max(1, SEARCH_BATCH_CELLS // (len(self._ids) if rows is None else max(len(rows), 1)))
+        out: List[List[Dict[str, Any]]] = []
+        for start in range(0, len(units), step):
+            chunk = units[start:start + step]
+            if self.quantization:
+                approx = self._quantizer.scores_many(chunk)
+                for q, a in zip(chunk, approx):
+                    top, cos = rescored_topk(self._quantizer, q, k, self._exact, self.oversample, mask, a)
+                    out.append(self._hits(top, cos, include_vectors))
+            elif rows is not None:
+                sims = (chunk @ subset.T) / denom
+                for s in sims:
+                    top = top_k(s, k)
+                    out.append(self._hits(rows[top], s[top], include_vectors))
+            else:
+                top, cos = self._topk(chunk, k)
+                out.extend(self._hits(r, c, include_vectors) for r, c in zip(top, cos))
+        return out
@@ -0,0 +1,250 @@
+# vectordb/quantization.py
+import time
+from typing import Dict, Any, List, Optional
+import numpy as np
+
+SCAN_ROWS = 65536      # rows decoded per block while scoring
+TRAIN_SAMPLE = 20000   # rows used to fit ranges / codebooks
+DEFAULT_OVERSAMPLE = {"int8": 4, "pq": 16}   # rescoring candidates per requested hit
+
+
+def _unit(X: np.ndarray) -> np.ndarray:
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def _sample(X: np.ndarray, n: int, rng: np.random.Generator) -> np.ndarray:
+    if len(X) <= n:
+        return _unit(X)
+    rows = np.sort(rng.choice(len(X), size=n, replace=False))
+    return _unit(X[rows])
+
+
+class ScalarQuantizer:
+    """
+    Per-dimension 8-bit scalar quantisation of unit vectors:
+    code = round((x - lo) / step), x ~= lo + code * step.
+    4x smaller than float32; dot products are computed straight from the codes.
+    """
+    mode = "int8"
+
+    def __init__(self, dims: int):
+        self.dims = dims
+        self.lo: Optional[np.ndarray] = None
+        self.step: Optional[np.ndarray] = None
+        self.codes = np.zeros((0, dims), dtype=np.uint8)
+
+    def train(self, X: np.ndarray, seed: int = 0) -> None:
+        S = _sample(X, TRAIN_SAMPLE, np.random.default_rng(seed))
+        self.lo = S.min(axis=0)
+        self.step = np.maximum(S.max(axis=0) - self.lo, 1e-12) / 255.0
+
+    def encode(self, X: np.ndarray) -> np.ndarray:
+        q = np.rint((_unit(X) - self.lo) / self.step)
+        return np.clip(q, 0, 255).astype(np.uint8)
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate dot of a unit query with every encoded row."""
+        base = float(query @ self.lo)
+        weights = (query * self.step).astype(np.float32)
+        out = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), SCAN_ROWS):
+            block = self.codes[start:start + SCAN_ROWS]
+            out[start:start + len(block)] = block.astype(np.float32) @ weights
+        return out + base
+
+    def scores_many(self, queries: np.ndarray) -> np.ndarray:
+        """scores() for a (q, d) batch of unit queries; each code block is decoded once for all of them."""
+        base = queries @ self.lo
+        weights = (queries * self.step).astype(np.float32)
+        out = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        for start in range(0, len(self.codes), SCAN_ROWS):
+            block = self.codes[start:start + SCAN_ROWS]
+            out[:, start:start + len(block)] = weights @ block.astype(np.float32).T
+        return out + base[:, None]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (2 * self.lo.nbytes if self.lo is not None else 0)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"lo": self.lo, "step": self.step, "codes": self.codes}
+
+    def load_state(self, st) -> None:
+        self.lo, self.step, self.codes = st["lo"], st["step"], st["codes"]
+
+
+class ProductQuantizer:
+    """
+    Product quantisation: split each unit vector into `m` sub-vectors and store the
+    index of the nearest of `ksub` (<= 256) k-means centroids per sub-space, i.e.
+    `m` bytes per vector. Queries use asymmetric distance: one (m, ksub) lookup
+    table of query/centroid dots, then a gather-and-sum over the codes.
+    """
+    mode = "pq"
+
+    def __init__(self, dims: int, m: Optional[int] = None, ksub: int = 256, iters: int = 15):
+        m = m or self.default_m(dims)
+        if dims % m:
+            raise ValueError(f"dims ({dims}) must be divisible by m ({m})")
+        self.dims, self.m, self.ksub, self.iters = dims, m, ksub, iters
+        self.dsub = dims // m
+        self.centroids: Optional[np.ndarray] = None   # (m, ksub, dsub)
+        self.codes = np.zeros((0, m), dtype=np.uint8)
+
+    @staticmethod
+    def default_m(dims: int) -> int:
+        """Largest divisor of dims that keeps sub-vectors at 16 dims or more (96 for 1536)."""
+        return max(m for m in range(1, max(1, dims // 16) + 1) if dims % m == 0)
+
+    @staticmethod
+    def _kmeans(X: np.ndarray, k: int, iters: int, rng: np.random.Generator) -> np.ndarray:
+        C = X[rng.choice(len(X), size=k, replace=False)].copy()
+        x2 = (X * X).sum(axis=1, keepdims=True)
+        for _ in range(iters):
+            d = x2 - 2.0 * X @ C.T + (C * C).sum(axis=1)
+            assign = d.argmin(axis=1)
+            counts = np.bincount(assign, minlength=k)
+            sums = np.zeros_like(C)
+            np.add.at(sums, assign, X)
+            empty = counts == 0
+            C[~empty] = sums[~empty] / counts[~empty, None]
+            if empty.any():
+                C[empty] = X[rng.choice(len(X), size=int(empty.sum()), replace=False)]
+        return C
+
+    def train(self, X: np.ndarray, seed: int = 0) -> None:
+        rng = np.random.default_rng(seed)
+        S = _sample(X, TRAIN_SAMPLE, rng)
+        k = min(self.ksub, len(S))
+        self.centroids = np.stack([
+            self._kmeans(S[:, j * self.dsub:(j + 1) * self.dsub], k, self.iters, rng)
+            for j in range(self.m)
+        ]).astype(np.float32)
+
+    def encode(self, X: np.ndarray) -> np.ndarray:
+        U = _unit(X)
+        codes = np.empty((len(U), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            sub = U[:, j * self.dsub:(j + 1) * self.dsub]
+            C = self.centroids[j]
+            d = -2.0 * sub @ C.T + (C * C).sum(axis=1)
+            codes[:, j] = d.argmin(axis=1)
+        return codes
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        lut = np.einsum("mkd,md->mk", self.centroids, query.reshape(self.m, self.dsub))
+        cols = np.arange(self.m)
+        out = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), SCAN_ROWS):
+            block = self.codes[start:start + SCAN_ROWS]
+            out[start:start + len(block)] = lut[cols, block].sum(axis=1)
+        return out
+
+    def scores_many(self, queries: np.ndarray) -> np.ndarray:
+        # Lookup tables differ per query, so there is no shared product to batch
+        return np.stack([self.scores(q) for q in queries])
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.centroids.nbytes if self.centroids is not None else 0)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"centroids": self.centroids, "codes": self.codes}
+
+    def load_state(self, st) -> None:
+        self.centroids, self.codes = st["centroids"], st["codes"]
+        self.m, self.ksub, self.dsub = self.centroids.shape
+
+
+QUANTIZERS = {"int8": ScalarQuantizer, "pq": ProductQuantizer}
+
+
+def make_quantizer(mode: str, dims: int, **kw):
+    if mode not in QUANTIZERS:
+        raise ValueError(f"Unknown quantization mode {mode!r}; expected one of {sorted(QUANTIZERS)}")
+    return QUANTIZERS[mode](dims, **kw)
+
+
+def build_quantizer(mode: str, vectors: np.ndarray, **kw):
+    """Train on `vectors` and encode all of them, block by block (works on memmaps)."""
+    qz = make_quantizer(mode, vectors.shape[1], **kw)
+    qz.train(vectors)
+    qz.codes = np.concatenate(
+        [qz.encode(vectors[s:s + SCAN_ROWS]) for s in range(0, len(vectors), SCAN_ROWS)]
+    ) if len(vectors) else qz.codes
+    return qz
+
+
+def rescored_topk(quantizer, query: np.ndarray, k: int, exact_fn, oversample: Optional[int] = None,
+                  mask: Optional[np.ndarray] = None, approx: Optional[np.ndarray] = None):
+    """
+    Rank every row by its compressed code, keep the best k * oversample, then
+    re-rank those with exact_fn(rows, query) -> cosine from full-precision vectors.
+    Rows where `mask` is False (a metadata filter) are never candidates.
+    `approx` takes precomputed code scores (a row of quantizer.scores_many).
+    Returns (rows, cos), best first.
+    """
+    oversample = oversample or DEFAULT_OVERSAMPLE[quantizer.mode]
+    approx = quantizer.scores(query) if approx is None else approx
+    n = len(approx)
+    allowed = np.arange(n)
+    if mask is not None:
+        allowed = np.flatnonzero(mask[:n])
+        if not len(allowed):
+            return allowed, np.zeros(0, dtype=np.float32)
+        approx = np.where(mask[:n], approx, -np.inf)
+    want = min(len(allowed), max(k, k * oversample))
+    cand = np.argpartition(-approx, want - 1)[:want] if want < len(allowed) else allowed
+    cand = np.sort(cand)            # ascending rows read a memmap sequentially
+    cos = exact_fn(cand, query)
+    keep = min(k, len(cand))
+    top = np.argpartition(-cos, keep - 1)[:keep] if keep < len(cand) else np.arange(len(cand))
+    top = top[np.argsort(-cos[top], kind="stable")]
+    return cand[top], cos[top]
+
+
+def compare_modes(vectors: np.ndarray, queries, k: int = 10, modes=("float32", "int8", "pq"),
+                  oversample: Optional[int] = None, **kw) -> List[Dict[str, Any]]:
+    """
+    Memory use and recall@k (vs exact float32 search) for each mode over the same
+    vectors, e.g. compare_modes(store.segment.vectors, sample_query_vectors).
+    """
+    U = _unit(vectors)
+    Q = _unit(np.asarray(queries, dtype=np.float32).reshape(-1, U.shape[1]))
+    kk = min(k, len(U))
+    exact = [set(np.argsort(-(U @ q), kind="stable")[:kk].tolist()) for q in Q]
+
+    def exact_fn(rows, q):
+        return U[rows] @ q
+
+    report = []
+    for mode in modes:
+        t0 = time.perf_counter()
+        if mode == "float32":
+            qz, nbytes = None, U.nbytes
+        else:
+            qz = build_quantizer(mode, U, **(kw.get(mode) or {}))
+            nbytes = qz.nbytes
+        build_s = time.perf_counter() - t0
+
+        hits, t0 = 0, time.perf_counter()
+        for q, truth in zip(Q, exact):
+            if qz is None:
+                got = np.argsort(-(U @ q), kind="stable")[:kk]
+            else:
+                got, _ = rescored_topk(qz, q, kk, exact_fn, oversample)
+            hits += len(truth & set(got.tolist()))
+        search_ms = 1000 * (time.perf_counter() - t0) / max(len(Q), 1)
+
+        report.append({
+            "mode": mode,
+            "bytes": int(nbytes),
+            "bytes_per_vector": nbytes / max(len(U), 1),
+            f"recall@{k}": hits / max(len(Q) * kk, 1),
+            "search_ms": search_ms,
+            "build_s": build_s,
+        })
+    return report
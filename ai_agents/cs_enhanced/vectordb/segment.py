@@ -0,0 +1,405 @@
+# vectordb/segment.py
+"""
+On-disk segment layout (one directory, every file is raw little-endian so
+numpy.memmap can open it without parsing or copying):
+
+  meta.json     {"version", "count", "dims", "dtype"}
+  vectors.bin   (count, dims) float32 | float16
+  norms.bin     (count,) float32
+  ids.bin       utf-8 ids, back to back
+  ids.off       (count + 1,) int64 offsets into ids.bin
+  content.bin   one JSON object per row (content + metadata, no vector)
+  content.off   (count + 1,) int64 offsets into content.bin
+
+Derived caches (rebuilt when missing or stale): quant-<mode>.npz for quantized
+codes, filters.npz for the metadata bitmaps behind filtered searches.
+
+SegmentStore.flush() keeps uncompacted changes in delta/: a segment of the
+overlay rows plus deleted.json, the ids deleted from the main segment.
+"""
+import json, os, shutil
+from pathlib import Path
+from typing import Iterable, Dict, Any, List, Optional
+import numpy as np
+
+from vectordb.base import VectorStore
+from vectordb.filters import BitmapIndex, Filters
+from vectordb.local_store import SEARCH_BATCH_CELLS, LocalVectorStore, to_search_score, top_k
+from vectordb.quantization import build_quantizer, make_quantizer, rescored_topk
+
+SEGMENT_VERSION = 1
+SCAN_ROWS = 65536   # rows scored per block; bounds the float32 working set for float16 segments
+# maybe_compact(): rewrite once overlay + shadowed rows reach this fraction of the segment
+COMPACT_FRACTION = float(os.getenv("SEGMENT_COMPACT_FRACTION", "0.1"))
+
+
+def write_segment(path: str, items: Iterable[Dict[str, Any]], *, dtype: str = "float32",
+                  vector_field: str = "vector") -> Dict[str, Any]:
+    """
+    Stream items into a new segment at `path`. Built in a sibling temp dir and
+    renamed into place, so readers never see a half-written segment.
+    """
+    if dtype not in ("float32", "float16"):
+        raise ValueError("dtype must be 'float32' or 'float16'")
+    final = Path(path)
+    tmp = final.with_name(final.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    count, dims = 0, None
+    id_off, content_off = [0], [0]
+    with open(tmp / "vectors.bin", "wb") as fv, open(tmp / "norms.bin", "wb") as fn, \
+         open(tmp / "ids.bin", "wb") as fi, open(tmp / "content.bin", "wb") as fc:
+        for item in items:
+            vec = item.get(vector_field)
+            if vec is None:
+                vec = item.get("vector")
+            vec = np.asarray(vec, dtype=np.float32)
+            if dims is None:
+                dims = int(vec.shape[0])
+            if vec.shape != (dims,):
+                raise ValueError(f"Embedding dim mismatch: got {vec.shape[0]}, expected {dims}")
+
+            stored = vec.astype(dtype)
+            fv.write(stored.tobytes())
+            fn.write(np.float32(np.linalg.norm(stored.astype(np.float32))).tobytes())
+
+            raw_id = str(item["id"]).encode("utf-8")
+            fi.write(raw_id)
+            id_off.append(id_off[-1] + len(raw_id))
+
+            doc = {k: v for k, v in item.items() if k not in (vector_field, "vector")}
+            raw_doc = json.dumps(doc, ensure_ascii=False).encode("utf-8")
+            fc.write(raw_doc)
+            content_off.append(content_off[-1] + len(raw_doc))
+            count += 1
+
+    np.asarray(id_off, dtype=np.int64).tofile(tmp / "ids.off")
+    np.asarray(content_off, dtype=np.int64).tofile(tmp / "content.off")
+    meta = {"version": SEGMENT_VERSION, "count": count, "dims": dims or 0, "dtype": dtype}
+    (tmp / "meta.json").write_text(json.dumps(meta))
+
+    _swap_dir(tmp, final)
+    return meta
+
+
+def _swap_dir(tmp: Path, final: Path) -> None:
+    """Move tmp into final's place; the old directory is renamed aside, not deleted, until the new one is in."""
+    old = final.with_name(final.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    if final.exists():
+        os.replace(final, old)
+    os.replace(tmp, final)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def _recover_dir(final: Path) -> None:
+    # A crash between the two renames in _swap_dir leaves only the .old copy
+    old = final.with_name(final.name + ".old")
+    if not final.exists() and old.exists():
+        os.replace(old, final)
+
+
+def _save_npz(path: Path, **arrays) -> None:
+    """np.savez to a per-process temp file, then rename: other processes never load a torn file."""
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+def _memmap(path: Path, dtype, shape):
+    # np.memmap refuses zero-length files; an empty segment maps to an empty array
+    if not shape[0]:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+class Segment:
+    """Read-only, zero-copy view over a segment directory."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        _recover_dir(self.path)
+        meta = json.loads((self.path / "meta.json").read_text())
+        if meta.get("version") != SEGMENT_VERSION:
+            raise RuntimeError(f"Unsupported segment version: {meta.get('version')}")
+        self.count, self.dims, self.dtype = meta["count"], meta["dims"], meta["dtype"]
+        n = self.count
+        self.vectors = _memmap(self.path / "vectors.bin", self.dtype, (n, self.dims))
+        self.norms = _memmap(self.path / "norms.bin", np.float32, (n,))
+        self._id_off = _memmap(self.path / "ids.off", np.int64, (n + 1,))
+        self._ids = _memmap(self.path / "ids.bin", np.uint8, (int(self._id_off[-1]),))
+        self._content_off = _memmap(self.path / "content.off", np.int64, (n + 1,))
+        self._content = _memmap(self.path / "content.bin", np.uint8, (int(self._content_off[-1]),))
+        self._rows: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def id_at(self, row: int) -> str:
+        return self._ids[self._id_off[row]:self._id_off[row + 1]].tobytes().decode("utf-8")
+
+    def row_of(self, doc_id: str) -> Optional[int]:
+        """Row holding doc_id, or None. The id table is decoded on the first call."""
+        if self._rows is None:
+            blob, off = self._ids.tobytes(), self._id_off.tolist()
+            self._rows = {blob[a:b].decode("utf-8"): r for r, (a, b) in enumerate(zip(off, off[1:]))}
+        return self._rows.get(doc_id)
+
+    def doc_at(self, row: int) -> Dict[str, Any]:
+        return json.loads(self._content[self._content_off[row]:self._content_off[row + 1]].tobytes())
+
+    def iter_items(self, vector_field: str = "vector"):
+        for row in range(self.count):
+            yield {**self.doc_at(row), vector_field: self.vectors[row].astype(np.float32).tolist()}
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine of a unit query against every row, scanned block by block."""
+        out = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, SCAN_ROWS):
+            block = self.vectors[start:start + SCAN_ROWS]
+            if block.dtype != np.float32:
+                block = block.astype(np.float32)
+            out[start:start + len(block)] = block @ query
+        norms = np.where(self.norms > 0, self.norms, 1.0)
+        return out / norms
+
+    def scores_many(self, queries: np.ndarray) -> np.ndarray:
+        """scores() for a (q, d) batch of unit queries: each block is paged in (and widened) once for all of them."""
+        out = np.empty((len(queries), self.count), dtype=np.float32)
+        for start in range(0, self.count, SCAN_ROWS):
+            block = self.vectors[start:start + SCAN_ROWS]
+            if block.dtype != np.float32:
+                block = block.astype(np.float32)
+            out[:, start:start + len(block)] = queries @ block.T
+        norms = np.where(self.norms > 0, self.norms, 1.0)
+        return out / norms
+
+    def exact(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Cosine of a unit query (or a (q, d) batch) against selected rows only (rescoring path)."""
+        norms = self.norms[rows]
+        return (query @ self.vectors[rows].astype(np.float32).T) / np.where(norms > 0, norms, 1.0)
+
+
+class SegmentStore(VectorStore):
+    """
+    VectorStore over a memory-mapped segment. Opening is O(1) in corpus size and
+    the pages are shared through the OS page cache by every process that maps
+    the same files. Upserts land in an in-memory overlay that shadows segment
+    rows with the same id until the next `compact()`; `flush()` writes the
+    overlay and deletions to delta/ so they survive a restart without one.
+
+    With quantization="int8" | "pq" only the compressed codes are held in RAM
+    (cached next to the segment as quant-<mode>.npz); full-precision vectors stay
+    on disk and are paged in just for the k * oversample rescoring candidates.
+
+    Filtered searches use metadata bitmaps over the segment rows, built on the
+    first filtered query and cached as filters.npz, so later opens skip the
+    scan of content.bin.
+    """
+
+    def __init__(self, path: str, vector_field: str = "vector", quantization: Optional[str] = None,
+                 oversample: Optional[int] = None, filter_fields: Optional[Iterable[str]] = None):
+        self.path = path
+        self.vector_field = vector_field
+        self.quantization = quantization
+        self.oversample = oversample
+        self.filter_fields = filter_fields
+        self._open()
+
+    @classmethod
+    def open_or_create(cls, path: str, vector_field: str = "vector", **kw) -> "SegmentStore":
+        _recover_dir(Path(path))
+        if not (Path(path) / "meta.json").exists():
+            write_segment(path, [], vector_field=vector_field)
+        return cls(path, vector_field=vector_field, **kw)
+
+    def _open(self) -> None:
+        self.segment = Segment(self.path)
+        self.quantizer = self._load_quantizer() if self.quantization and self.segment.count else None
+        self.overlay = LocalVectorStore(dims=self.segment.dims or None, vector_field=self.vector_field,
+                                        filter_fields=self.filter_fields)
+        self._shadowed: set[int] = set()  # segment rows deleted or overlaid since the last compact()
+        self._bitmaps: Optional[BitmapIndex] = None
+        delta = Path(self.path) / "delta"
+        _recover_dir(delta)
+        if (delta / "meta.json").exists():
+            self.upsert(Segment(str(delta)).iter_items(self.vector_field))
+            self._shadow(json.loads((delta / "deleted.json").read_text()))
+
+    def _load_quantizer(self):
+        qpath = Path(self.path) / f"quant-{self.quantization}.npz"
+        if qpath.exists():
+            qz = make_quantizer(self.quantization, self.segment.dims)
+            with np.load(qpath) as st:
+                qz.load_state({k: st[k] for k in st.files})
+            if len(qz.codes) == self.segment.count:
+                return qz
+        qz = build_quantizer(self.quantization, self.segment.vectors)
+        _save_npz(qpath, **qz.state())
+        return qz
+
+    @property
+    def bitmaps(self) -> BitmapIndex:
+        if self._bitmaps is None:
+            self._bitmaps = self._load_bitmaps()
+        return self._bitmaps
+
+    def _load_bitmaps(self) -> BitmapIndex:
+        fpath = Path(self.path) / "filters.npz"
+        fields = json.dumps(sorted(self.filter_fields) if self.filter_fields is not None else None)
+        if fpath.exists():
+            with np.load(fpath) as st:
+                cached = {k: st[k] for k in st.files}
+            if int(cached["count"]) == self.segment.count and str(cached["fields"]) == fields:
+                return BitmapIndex.from_state(cached, self.filter_fields)
+        bm = BitmapIndex(self.filter_fields)
+        for row in range(self.segment.count):
+            bm.set(row, self.segment.doc_at(row))
+        _save_npz(fpath, **bm.state(), count=np.int64(self.segment.count), fields=np.array(fields))
+        return bm
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes resident in this process vs. mapped from the page cache."""
+        return {
+            "mapped_vectors": int(self.segment.vectors.nbytes),
+            "codes": int(self.quantizer.nbytes) if self.quantizer is not None else 0,
+            "overlay": sum(self.overlay.memory_usage().values()),
+        }
+
+    def __len__(self) -> int:
+        return len(self.segment) - len(self._shadowed) + len(self.overlay)
+
+    def _shadow(self, ids: List[str]) -> None:
+        for doc_id in ids:
+            row = self.segment.row_of(doc_id)
+            if row is not None:
+                self._shadowed.add(row)
+
+    def upsert(self, items: Iterable[Dict[str, Any]]) -> None:
+        items = list(items)
+        self._shadow([str(it["id"]) for it in items])
+        self.overlay.upsert(items)
+
+    def delete(self, ids: Iterable[str]) -> None:
+        ids = [str(i) for i in ids]
+        self.overlay.delete(ids)
+        self._shadow(ids)
+
+    def _ranked(self, queries: np.ndarray, want: int, mask: Optional[np.ndarray]):
+        """[(rows, cos)] best first over the segment, one per unit query in the batch."""
+        if self.quantizer is not None:
+            approx = self.quantizer.scores_many(queries)
+            return [rescored_topk(self.quantizer, q, want, self.segment.exact, self.oversample, mask, a)
+                    for q, a in zip(queries, approx)]
+        if mask is not None:
+            return self._ranked_masked(queries, want, mask)
+        ranked = []
+        for s in self.segment.scores_many(queries):
+            best = top_k(s, want)
+            ranked.append((best, s[best]))
+        return ranked
+
+    def _ranked_masked(self, queries: np.ndarray, want: int, mask: np.ndarray):
+        """
+        _ranked() over the rows that pass a filter. The mask is walked SCAN_ROWS
+        rows at a time, so at most one block of passing rows is gathered and the
+        rows that fail are never paged in.
+        """
+        ranked = [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+        for start in range(0, len(mask), SCAN_ROWS):
+            rows = start + np.flatnonzero(mask[start:start + SCAN_ROWS])
+            if not len(rows):
+                continue
+            for i, s in enumerate(self.segment.exact(rows, queries)):
+                cand, cos = np.concatenate([ranked[i][0], rows]), np.concatenate([ranked[i][1], s])
+                best = top_k(cos, want)
+                ranked[i] = (cand[best], cos[best])
+        return ranked
+
+    def _segment_hits(self, top, cos, k: int, include_vectors: bool) -> List[Dict[str, Any]]:
+        hits: List[Dict[str, Any]] = []
+        for r, c in zip(top.tolist(), cos.tolist()):
+            if r in self._shadowed:
+                continue
+            hit = {**self.segment.doc_at(r), "@search.score": float(to_search_score(c))}
+            if include_vectors:
+                hit["vector"] = self.segment.vectors[r].astype(np.float32)
+            hits.append(hit)
+            if len(hits) == k:
+                break
+        return hits
+
+    def search(self, vector: list[float], k: int = 5, include_vectors: bool = False,
+               filters: Optional[Filters] = None) -> List[Dict[str, Any]]:
+        return self.search_many([vector], k, include_vectors, filters)[0]
+
+    def search_many(self, vectors, k: int = 5, include_vectors: bool = False,
+                    filters: Optional[Filters] = None) -> List[List[Dict[str, Any]]]:
+        """Batched search: the segment is scanned once per chunk of queries instead of once per query."""
+        queries = np.asarray(vectors, dtype=np.float32)
+        if k <= 0 or not len(queries):
+            return [[] for _ in range(len(queries))]
+        queries = queries.reshape(len(queries), -1)
+        results = self.overlay.search_many(queries, k, include_vectors, filters)
+        if self.segment.count:
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            units = queries / np.where(norms > 0, norms, 1.0)
+            # Only shadowed rows can push live ones out of the top k; the overlay is ranked on its own
+            want = min(k + len(self._shadowed), self.segment.count)
+            mask = self.bitmaps.mask(filters, self.segment.count) if filters else None
+            step = max(1, SEARCH_BATCH_CELLS // self.segment.count)
+            for start in range(0, len(units), step):
+                ranked = self._ranked(units[start:start + step], want, mask)
+                for i, (top, cos) in enumerate(ranked, start):
+                    results[i] = self._segment_hits(top, cos, k, include_vectors) + results[i]
+        for hits in results:
+            hits.sort(key=lambda h: -h["@search.score"])
+            del hits[k:]
+        return results
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        doc = self.overlay.get(doc_id)
+        if doc is not None:
+            return doc
+        row = self.segment.row_of(doc_id)
+        return None if row is None or row in self._shadowed else self.segment.doc_at(row)
+
+    def iter_items(self):
+        """Yield every live item (with vectors): segment rows not shadowed or deleted, then the overlay."""
+        for row, item in enumerate(self.segment.iter_items(self.vector_field)):
+            if row not in self._shadowed:
+                yield item
+        yield from self.overlay.iter_items()
+
+    def compact(self, dtype: Optional[str] = None) -> Dict[str, Any]:
+        """Rewrite segment + overlay into a fresh segment and remap it."""
+        tmp = self.path.rstrip("/\\") + ".compact"
+        meta = write_segment(tmp, self.iter_items(), dtype=dtype or self.segment.dtype, vector_field=self.vector_field)
+        self.segment = self.quantizer = None  # release the old maps before replacing the files
+        _swap_dir(Path(tmp), Path(self.path))
+        self._open()
+        return meta
+
+    def flush(self) -> None:
+        """Persist the overlay and deletions to delta/ (replaced whole), so a reopen sees them without compact()."""
+        delta = Path(self.path) / "delta"
+        if not len(self.overlay) and not self._shadowed:
+            shutil.rmtree(delta, ignore_errors=True)
+            return
+        tmp = delta.with_name("delta.new")
+        write_segment(str(tmp), self.overlay.iter_items(), dtype=self.segment.dtype, vector_field=self.vector_field)
+        deleted = [doc_id for doc_id in map(self.segment.id_at, sorted(self._shadowed))
+                   if self.overlay.get(doc_id) is None]
+        (tmp / "deleted.json").write_text(json.dumps(deleted))
+        _swap_dir(tmp, delta)
+
+    def maybe_compact(self, fraction: float = COMPACT_FRACTION) -> bool:
+        """compact() once the overlay and shadowed rows reach `fraction` of the segment (any, when it is empty), else flush()."""
+        pending = len(self.overlay) + len(self._shadowed)
+        if pending and pending >= fraction * self.segment.count:
+            self.compact()
+            return True
+        self.flush()
+        return False
@@ -1,6 +1,8 @@
-import os, json, uuid, requests
+import os, json, uuid
 from dotenv import load_dotenv
 from openai import AzureOpenAI
+from utils.embed_cache import EmbeddingCache
+from utils.transport import get_transport
 
 load_dotenv()
 
@@ -19,6 +21,7 @@ assert AOAI_ENDPOINT and AOAI_KEY,     "Set AZURE_OPENAI_ENDPOINT and AZURE_OPEN
 
 API_VERSION = "2024-07-01"
 HEADERS = {"Content-Type": "application/json", "api-key": SEARCH_KEY}
+http = get_transport()
 
 # --- Azure OpenAI client (for embeddings) ---
 aoai = AzureOpenAI(
@@ -29,10 +32,10 @@ aoai = AzureOpenAI(
 
 def delete_index_if_exists():
     url = f"{SEARCH_ENDPOINT}/indexes/{INDEX_NAME}?api-version={API_VERSION}"
-    r = requests.get(url, headers=HEADERS, timeout=20)
+    r = http.get(url, headers=HEADERS, timeout=20)
     if r.status_code == 200:
         print(f"Deleting existing index: {INDEX_NAME}")
-        d = requests.delete(url, headers=HEADERS, timeout=20)
+        d = http.delete(url, headers=HEADERS, timeout=20)
         d.raise_for_status()
 
 def create_index():
@@ -69,7 +72,7 @@ def create_index():
         }
     }
 
-    r = requests.put(url, headers=HEADERS, data=json.dumps(schema))
+    r = http.put(url, headers=HEADERS, data=json.dumps(schema))
     if r.status_code not in (200, 201):
         print("❌ Failed to create index")
         try:
@@ -80,9 +83,12 @@ def create_index():
     print("✅ Index created.")
 
 
-def embed(text: str):
+def _embed_uncached(text: str):
     return aoai.embeddings.create(model=EMBED_MODEL, input=text).data[0].embedding
 
+# Re-running the script only pays for rows whose text changed
+embed = EmbeddingCache(_embed_uncached, model=EMBED_MODEL, dims=EMBED_DIMS)
+
 def upload_docs(docs):
     url = f"{SEARCH_ENDPOINT}/indexes/{INDEX_NAME}/docs/index?api-version={API_VERSION}"
     payload = {"value": [
@@ -94,7 +100,7 @@ def upload_docs(docs):
             "contentVector": d["vector"]
         } for d in docs
     ]}
-    r = requests.post(url, headers=HEADERS, data=json.dumps(payload), timeout=60)
+    r = http.post(url, headers=HEADERS, data=json.dumps(payload), timeout=60)
     r.raise_for_status()
     print("Docs uploaded.")
 
@@ -1,26 +1,28 @@
 # agent_connect_loop_high.py
-import os, time, json, requests
-from dotenv import load_dotenv
-from openai import AzureOpenAI
-from azure.ai.projects import AIProjectClient
-from azure.identity import AzureCliCredential
-from azure.ai.agents.models import ListSortOrder
+import os, time, json
 from utils.helpers_func import *
+from utils.message_cursor import MessageCursor
+from utils.policy_context import PolicyContext
 
 # ---------- Chat loop ----------
-thread = project.agents.threads.create()
-print(f"🧵 Started new thread: {thread.id}")
+# The project client and thread are created with the first question, so the prompt shows right away
+project = thread = cursor = None
 
 system_prompt =(
     "You are a helpful, concise customer service assistant."
 )
 
+# Loaded once (re-read only when the file changes) and sent once per thread, not every turn
+policy = PolicyContext(mode=os.getenv("POLICY_MODE", "thread"))
+
 print("💬 Chat started. Type 'exit' to quit.\n")
 
 
 while True:
     user_input = input("You: ").strip()
     if user_input.lower() == "exit":
+        s = policy.stats()
+        print(f"📉 Policy sent {s['sends']}x; {s['prompt_tokens_saved']} prompt tokens saved vs. re-sending every turn")
         print("👋 Exiting chat.")
         break
     if not user_input:
@@ -55,18 +57,21 @@ while True:
             print("ℹ️ No relevant context found (using plain user input)")
             augmented = user_input
 
-        # 5) Add in the company policies
-        RULES_TEXT = read_local("cs_policy.txt")
+        if thread is None:
+            project = get_project()
+            thread = project.agents.threads.create()
+            cursor = MessageCursor(project.agents, thread.id)   # each turn fetches only the new messages
+            print(f"🧵 Started new thread: {thread.id}")
 
-        if RULES_TEXT:
-            augmented += "\n\nCompany rules (verbatim, follow strictly):\n" + RULES_TEXT    
+        # 5) Add in the company policies (only when this thread doesn't have the current version yet)
+        augmented += policy.for_message(thread.id)
 
         # 6) Send to agent
         project.agents.messages.create(thread_id=thread.id, role="user", content=augmented)
 
         run = project.agents.runs.create_and_process(thread_id=thread.id,
             agent_id=AGENT_ID,
-            instructions=system_prompt   
+            instructions=policy.instructions(system_prompt)
             )
         print("⏳ Waiting for agent response...")
  
@@ -74,11 +79,10 @@ while True:
             print(f"❌ Run failed: {run.last_error}")
             continue
 
-        # 7) Print the latest assistant reply
-        messages = project.agents.messages.list(thread_id=thread.id, order=ListSortOrder.ASCENDING)
-        for m in messages:
-            if m.text_messages:
-                print(f"{m.role}: {m.text_messages[-1].text.value}")
+        # 7) Print this turn's messages
+        for m in cursor.refresh():
+            if m.text:
+                print(f"{m.role}: {m.text}")
 
     except Exception as e:
         print(f"🚨 Error: {e}")
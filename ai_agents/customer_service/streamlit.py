@@ -27,7 +27,6 @@
 import os
 import time
 import json
-import requests
 import streamlit as st
 from dotenv import load_dotenv
 from pathlib import Path
@@ -38,7 +37,13 @@ from openai import AzureOpenAI
 # Azure AI Foundry Agents (Projects)
 from azure.ai.projects import AIProjectClient
 from azure.identity import AzureCliCredential, DefaultAzureCredential
-from azure.ai.agents.models import ListSortOrder
+from azure.ai.agents.models import AgentStreamEvent, MessageDeltaChunk, ThreadRun
+
+from utils.embed_cache import EmbeddingCache
+from utils.transport import get_transport
+from utils.policy_context import PolicyContext
+from utils.message_cursor import MessageCursor
+from utils.thread_memory import SUMMARY_INSTRUCTIONS, SUMMARY_REQUEST, ThreadLedger, memory_message
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Page setup
@@ -59,6 +64,7 @@ get = lambda k, d=None: (
 AOAI_ENDPOINT = get("AZURE_OPENAI_ENDPOINT")
 AOAI_KEY = get("AZURE_OPENAI_API_KEY") or get("AZURE_OPENAI_KEY")
 EMBED_MODEL = get("AZURE_EMBED_MODEL", "text-embedding-3-small")
+EMBED_DIMS = int(get("AZURE_EMBED_DIM", 1536))
 AOAI_API_VERSION = get("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
 
 SEARCH_ENDPOINT = get("AZURE_SEARCH_ENDPOINT")
@@ -75,6 +81,16 @@ SIMILARITY_THRESHOLD = float(get("SIMILARITY_THRESHOLD", 0.80))
 system_prompt =(
     "You are a helpful, concise customer service assistant for the embedded insurance provider Companjon."
 )
+POLICY_MODE = get("POLICY_MODE", "thread")  # "thread" | "instructions"
+
+
+@st.cache_resource(show_spinner=False)
+def init_policy(mode: str):
+    # One copy of the policy per process; re-read only when cs_policy.txt changes
+    return PolicyContext(mode=mode)
+
+
+policy = init_policy(POLICY_MODE)
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Sidebar: settings & status
@@ -96,6 +112,8 @@ if "thread_id" not in st.session_state:
     st.session_state.thread_id = None
 if "history" not in st.session_state:
     st.session_state.history = []  # list of {role: "user"|"assistant", content: str}
+if "ledger" not in st.session_state:
+    st.session_state.ledger = ThreadLedger()  # size of the agent thread + docs already sent on it
 
 
 def get_credential():
@@ -132,12 +150,18 @@ with st.sidebar:
         f"Agents: {'✅' if st.session_state.project_client else '❌'}"
     )
     st.caption(f"Index: `{INDEX_NAME}` · Vector field: `{VECTOR_FIELD}`")
+    ps = policy.stats()
+    ls = st.session_state.ledger.stats()
+    st.caption(f"Thread: {ls['thread_messages']} messages · ~{ls['thread_tokens']} tokens · "
+               f"{ls['docs_skipped']} repeated docs not resent")
+    st.caption(f"Policy ({POLICY_MODE} mode): {ps['policy_tokens']} tokens · sent {ps['sends']}x · "
+               f"{ps['prompt_tokens_saved']} prompt tokens saved")
 
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Helper functions
 
-def embed(text: str):
+def _embed_uncached(text: str):
     client = st.session_state.aoai_client
     if not client:
         raise RuntimeError("Azure OpenAI client not configured")
@@ -145,6 +169,16 @@ def embed(text: str):
     return resp.data[0].embedding
 
 
+@st.cache_resource(show_spinner=False)
+def init_embed_cache(model: str, dims: int):
+    # One cache per process, shared across reruns and sessions
+    return EmbeddingCache(_embed_uncached, model=model, dims=dims)
+
+
+def embed(text: str):
+    return init_embed_cache(EMBED_MODEL, EMBED_DIMS)(text)
+
+
 def search_vectors(query_vector):
     if not (SEARCH_ENDPOINT and SEARCH_KEY):
         return []
@@ -157,7 +191,7 @@ def search_vectors(query_vector):
         ],
         # You could add a filter here if you want to scope by product/locale/etc.
     }
-    r = requests.post(url, headers=headers, data=json.dumps(payload), timeout=30)
+    r = get_transport().post(url, headers=headers, data=json.dumps(payload), timeout=30)
     if r.status_code >= 400:
         try:
             err = r.json()
@@ -176,8 +210,34 @@ def ensure_thread():
         raise RuntimeError("Azure AI Project client not configured")
     thread = client.agents.threads.create()
     st.session_state.thread_id = thread.id
+    st.session_state.ledger = ThreadLedger()
     return thread.id
 
+
+def compact_thread():
+    """Summarise the session's thread and continue on a fresh one seeded with the summary."""
+    proj = st.session_state.project_client
+    old = st.session_state.thread_id
+    proj.agents.messages.create(thread_id=old, role="user", content=SUMMARY_REQUEST)
+    run = proj.agents.runs.create_and_process(thread_id=old, agent_id=AGENT_ID, instructions=SUMMARY_INSTRUCTIONS)
+    status = getattr(run, "status", None)
+    if status != "completed":
+        raise RuntimeError(f"Summary run {status}: {getattr(run, 'last_error', None)}")
+    cur = MessageCursor(proj.agents, old, page_size=1)
+    cur.refresh()
+    summary = cur.last_reply()      # "" when the newest message is not an assistant reply
+    if not summary:
+        raise RuntimeError("Summary run produced no reply")
+
+    policy.forget(old)
+    st.session_state.thread_id = None
+    new = ensure_thread()
+    seed = memory_message(summary)
+    proj.agents.messages.create(thread_id=new, role="user", content=seed)
+    st.session_state.ledger.note(seed)
+    return new
+
+
 def read_local(filename: str) -> str:
     base = Path(__file__).resolve().parent if "__file__" in globals() else Path.cwd()
     p = base / filename
@@ -187,10 +247,18 @@ def read_local(filename: str) -> str:
 
 
 def send_to_agent(user_text: str):
-    """Embed → search → optionally augment → send to agent → return (assistant_reply, retrieved_docs)."""
+    """Embed → search → optionally augment → send to agent → return (reply_stream, retrieved_docs)."""
     q_vec = embed(user_text)
     results = search_vectors(q_vec)
 
+    # Past the thread budget: carry on from a summary on a fresh thread
+    thread_id = ensure_thread()
+    if st.session_state.ledger.over_budget():
+        try:
+            thread_id = compact_thread()
+        except RuntimeError as e:
+            st.warning(f"Could not compact the conversation, continuing on the current thread: {e}")
+
     # Build context if top score passes threshold
     context_text = ""
     retrieved = []  # for UI: list of dicts with content and score
@@ -205,43 +273,43 @@ def send_to_agent(user_text: str):
                         "content": r.get("content", ""),
                         "id": r.get("id") or r.get("@search.documentId") or "",
                     })
-            context_text = "\n".join([d["content"] for d in retrieved])
+            # Docs already sent on this thread are still in the model's context
+            fresh = st.session_state.ledger.unseen(retrieved)
+            st.session_state.ledger.mark(fresh)
+            context_text = "\n".join([d["content"] for d in fresh])
 
     if context_text:
         augmented = (
             f"User question:\n{user_text}\n\n"
             f"Relevant docs (only include if directly helpful to the user):\n{context_text}"
         )
+    elif retrieved:
+        augmented = f"User question:\n{user_text}\n\n(The relevant docs were already provided earlier in this conversation.)"
     else:
         augmented = user_text
 
-    # Add in the company policies
-    RULES_TEXT = read_local("cs_policy.txt")
-
-    if RULES_TEXT:
-        augmented += "\n\nCompany rules (verbatim, follow strictly):\n" + RULES_TEXT            
+    # Add in the company policies (once per thread, again only if the file changed)
+    augmented += policy.for_message(thread_id)
 
     # Send to agent
-    thread_id = ensure_thread()
     proj = st.session_state.project_client
     proj.agents.messages.create(thread_id=thread_id, role="user", content=augmented)
+    st.session_state.ledger.note(augmented)
 
-    run = proj.agents.runs.create_and_process(thread_id=thread_id, agent_id=AGENT_ID, instructions=system_prompt)
-    # Poll until complete or failed
-    while run.status not in ("completed", "failed"):
-        time.sleep(1)
-        run = proj.agents.runs.get(thread_id=thread_id, run_id=run.id)
+    return stream_reply(proj, thread_id), retrieved
 
-    if run.status == "failed":
-        raise RuntimeError(str(run.last_error))
 
-    # Fetch last assistant message
-    msgs = proj.agents.messages.list(thread_id=thread_id, order=ListSortOrder.ASCENDING)
-    assistant_reply = None
-    for m in msgs:
-        if m.role == "assistant" and m.text_messages:
-            assistant_reply = m.text_messages[-1].text.value
-    return assistant_reply or "(No reply)", retrieved
+def stream_reply(proj, thread_id: str):
+    """Yield the assistant's text deltas as the run produces them (no polling)."""
+    with proj.agents.runs.stream(thread_id=thread_id, agent_id=AGENT_ID, instructions=policy.instructions(system_prompt)) as stream:
+        for event_type, event_data, _ in stream:
+            if isinstance(event_data, MessageDeltaChunk):
+                if event_data.text:
+                    yield event_data.text
+            elif isinstance(event_data, ThreadRun) and event_data.status == "failed":
+                raise RuntimeError(str(event_data.last_error))
+            elif event_type == AgentStreamEvent.ERROR:
+                raise RuntimeError(f"Run stream error: {event_data}")
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -264,29 +332,34 @@ if prompt:
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
-        with st.spinner("Thinking with RAG…"):
-            try:
-                reply, retrieved_docs = send_to_agent(prompt)
-                st.session_state.history.append({"role": "assistant", "content": reply})
-                st.markdown(reply)
-
-                # Show retrieval if any
-                if retrieved_docs:
-                    with st.expander("📎 Retrieved context", expanded=False):
-                        for i, d in enumerate(sorted(retrieved_docs, key=lambda x: -x["score"])):
-                            st.markdown(f"**Doc {i+1} · score={d['score']:.3f}**\n\n{d['content']}")
-                else:
-                    retrieval_container.info("No relevant context found (used plain question)")
-
-            except Exception as e:
-                st.error(f"Error: {e}")
+        try:
+            with st.spinner("Thinking with RAG…"):
+                reply_stream, retrieved_docs = send_to_agent(prompt)
+            # Render tokens as they arrive; write_stream returns the full text
+            reply = st.write_stream(reply_stream) or "(No reply)"
+            st.session_state.history.append({"role": "assistant", "content": reply})
+            st.session_state.ledger.note(reply)
+
+            # Show retrieval if any
+            if retrieved_docs:
+                with st.expander("📎 Retrieved context", expanded=False):
+                    for i, d in enumerate(sorted(retrieved_docs, key=lambda x: -x["score"])):
+                        st.markdown(f"**Doc {i+1} · score={d['score']:.3f}**\n\n{d['content']}")
+            else:
+                retrieval_container.info("No relevant context found (used plain question)")
+
+        except Exception as e:
+            st.error(f"Error: {e}")
 
 # Utilities row
 col1, col2, col3 = st.columns(3)
 with col1:
     if st.button("🧹 Clear chat"):
+        if st.session_state.thread_id:
+            policy.forget(st.session_state.thread_id)
         st.session_state.history = []
         st.session_state.thread_id = None
+        st.session_state.ledger = ThreadLedger()
         st.rerun()
 with col2:
     st.write("\u200b")
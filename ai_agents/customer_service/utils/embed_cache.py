@@ -0,0 +1,124 @@
+# utils/embed_cache.py
+import hashlib, os, sqlite3, threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+import numpy as np
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent.parent / ".cache" / "embeddings.sqlite"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Wraps any embed function with an in-memory LRU in front of a SQLite table.
+    Entries are keyed on (model, dims, sha256(text)), so changing the deployment
+    or the vector size never serves a stale embedding.
+
+      embed = EmbeddingCache(embed, model=EMBED_MODEL, dims=1536)
+      embed("how long is express shipping")      # miss -> API, then cached
+      embed.embed_many(texts)                   # only the misses are sent to embed_fn
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[str], List[float]],
+        *,
+        model: str,
+        dims: int,
+        path: Optional[str] = None,
+        capacity: int = 10000,
+    ):
+        self.embed_fn = embed_fn
+        self.model = model
+        self.dims = int(dims)
+        self.capacity = capacity
+        self.path = Path(path or os.getenv("EMBED_CACHE_PATH") or DEFAULT_CACHE_PATH)
+        self.hits = self.disk_hits = self.misses = 0
+
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, dims INTEGER NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, dims, text_hash))"
+        )
+        self._db.commit()
+
+    # ---------- Memory tier ----------
+    def _remember(self, h: str, vec: List[float]) -> None:
+        self._lru[h] = vec
+        self._lru.move_to_end(h)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    # ---------- Disk tier ----------
+    def _load(self, hashes: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        for i in range(0, len(hashes), 500):   # stay under SQLite's bound-parameter limit
+            chunk = hashes[i:i + 500]
+            rows = self._db.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND dims = ? "
+                f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                (self.model, self.dims, *chunk),
+            ).fetchall()
+            for h, blob in rows:
+                found[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, entries: Dict[str, List[float]]) -> None:
+        self._db.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, dims, text_hash, vector) VALUES (?, ?, ?, ?)",
+            [(self.model, self.dims, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in entries.items()],
+        )
+        self._db.commit()
+
+    # ---------- Public ----------
+    def __call__(self, text: str) -> List[float]:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        hashes = [text_hash(t) for t in texts]
+        out: Dict[str, List[float]] = {}
+        with self._lock:
+            for h in hashes:
+                if h in self._lru and h not in out:
+                    self._lru.move_to_end(h)
+                    out[h] = self._lru[h]
+                    self.hits += 1
+            missing = [h for h in dict.fromkeys(hashes) if h not in out]
+            if missing:
+                for h, vec in self._load(missing).items():
+                    out[h] = vec
+                    self._remember(h, vec)
+                    self.disk_hits += 1
+
+        todo = {h: t for h, t in zip(hashes, texts) if h not in out}
+        if todo:
+            fresh = {h: self.embed_fn(t) for h, t in todo.items()}
+            with self._lock:
+                self.misses += len(fresh)
+                self._store(fresh)
+                for h, vec in fresh.items():
+                    self._remember(h, vec)
+            out.update(fresh)
+        return [out[h] for h in hashes]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._lru),
+        }
+
+    def close(self) -> None:
+        self._db.close()
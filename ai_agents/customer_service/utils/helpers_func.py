@@ -1,10 +1,9 @@
 # agent_connect_loop_high.py
-import os, time, json, requests
+import os, time, json
+from functools import lru_cache
 from dotenv import load_dotenv
-from openai import AzureOpenAI
-from azure.ai.projects import AIProjectClient
-from azure.identity import AzureCliCredential
-from azure.ai.agents.models import ListSortOrder
+from utils.embed_cache import EmbeddingCache
+from utils.transport import get_transport
 
 load_dotenv()
 
@@ -12,6 +11,8 @@ load_dotenv()
 AOAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AOAI_KEY = os.getenv("AZURE_OPENAI_API_KEY") or os.getenv("AZURE_OPENAI_KEY")
 EMBED_MODEL = os.getenv("AZURE_EMBED_MODEL", "text-embedding-3-small")
+EMBED_DIMS = int(os.getenv("AZURE_EMBED_DIM", "1536"))
+EMBED_CACHE = os.getenv("EMBED_CACHE", "1") != "0"
 AOAI_API_VERSION = "2024-02-15-preview"
 
 # Azure AI Search
@@ -30,22 +31,45 @@ TOP_K = int(os.getenv("TOP_K", "3"))
 SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.80"))
 
 # ---------- Clients ----------
-aoai = AzureOpenAI(
-    azure_endpoint=AOAI_ENDPOINT,
-    api_key=AOAI_KEY,
-    api_version=AOAI_API_VERSION,
-)
+# Built on first use, once per process, so the chat prompt comes up before the
+# openai / Azure SDKs are imported (see ai_agents/startup_bench.py).
+@lru_cache(maxsize=None)
+def get_aoai():
+    from openai import AzureOpenAI
+    return AzureOpenAI(
+        azure_endpoint=AOAI_ENDPOINT,
+        api_key=AOAI_KEY,
+        api_version=AOAI_API_VERSION,
+    )
 
-project = AIProjectClient(
-    credential=AzureCliCredential(),
-    endpoint=FOUNDRY_PROJECT_ENDPOINT,
-)
+@lru_cache(maxsize=None)
+def get_project():
+    from azure.ai.projects import AIProjectClient
+    from azure.identity import AzureCliCredential
+    return AIProjectClient(credential=AzureCliCredential(), endpoint=FOUNDRY_PROJECT_ENDPOINT)
+
+_LAZY_CLIENTS = {"aoai": get_aoai, "project": get_project}
+
+def __getattr__(name):
+    # helpers_func.aoai / .project still work, built on first access
+    if name in _LAZY_CLIENTS:
+        return _LAZY_CLIENTS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ---------- Helpers ----------
-def embed(text: str):
-    resp = aoai.embeddings.create(model=EMBED_MODEL, input=text)
+def _embed_uncached(text: str):
+    resp = get_aoai().embeddings.create(model=EMBED_MODEL, input=text)
     return resp.data[0].embedding
 
+# Cached on (model, dims, sha256(text)); get_embed().stats() exposes hit/miss counters.
+# Built on first use like the clients, so importing this module creates no .cache/ or SQLite file.
+@lru_cache(maxsize=None)
+def get_embed():
+    return EmbeddingCache(_embed_uncached, model=EMBED_MODEL, dims=EMBED_DIMS) if EMBED_CACHE else _embed_uncached
+
+def embed(text: str):
+    return get_embed()(text)
+
 def search_vectors(query_vector):
     url = f"{SEARCH_ENDPOINT}/indexes/{INDEX_NAME}/docs/search?api-version=2024-07-01"
     headers = {"Content-Type": "application/json", "api-key": SEARCH_KEY}
@@ -60,7 +84,7 @@ def search_vectors(query_vector):
             }
         ]
     }
-    resp = requests.post(url, headers=headers, data=json.dumps(payload))
+    resp = get_transport().post(url, headers=headers, data=json.dumps(payload), timeout=30)
     if resp.status_code >= 400:
         try:
             print("❌ Search error:", resp.json())
@@ -0,0 +1,102 @@
+# utils/policy_context.py
+import hashlib, os, threading
+from pathlib import Path
+from typing import Dict, Optional
+from utils.tokens import count_tokens
+
+DEFAULT_POLICY_PATH = Path(__file__).resolve().parent / "cs_policy.txt"
+RULES_HEADER = "Company rules (verbatim, follow strictly):\n"
+UPDATED_HEADER = "Updated company rules (these replace any earlier version; follow strictly):\n"
+
+
+class PolicyContext:
+    """
+    Holds cs_policy.txt in memory and decides when the agent needs to see it.
+
+    The file is re-read only when its mtime changes. In "thread" mode the rules
+    ride along with the first message of each thread (and again only after the
+    file changes); in "instructions" mode they are appended to the run
+    instructions, which never accumulate in the thread. Either way the thread
+    stops growing by a full policy copy per turn; stats() reports the savings.
+
+      policy = PolicyContext(mode=os.getenv("POLICY_MODE", "thread"))
+      augmented += policy.for_message(thread_id)
+      run(..., instructions=policy.instructions(system_prompt))
+    """
+
+    def __init__(self, path: Optional[str] = None, mode: str = "thread"):
+        if mode not in ("thread", "instructions"):
+            raise ValueError(f"Unknown policy mode {mode!r}; expected 'thread' or 'instructions'")
+        self.path = Path(path or DEFAULT_POLICY_PATH)
+        self.mode = mode
+        self._mtime: Optional[int] = None
+        self._text = ""
+        self._version = ""
+        self._tokens = 0
+        self._threads: Dict[str, Dict[str, object]] = {}   # thread_id -> {version, turns, copies}
+        self._lock = threading.Lock()
+        self.reloads = self.sends = 0
+        self.tokens_not_sent = 0       # policy tokens that were not appended to a message
+        self.prompt_tokens_saved = 0   # thread-history tokens later runs no longer re-read
+
+    def _refresh(self) -> None:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        self._text = self.path.read_text(encoding="utf-8", errors="ignore").strip() if mtime is not None else ""
+        self._version = hashlib.sha256(self._text.encode("utf-8")).hexdigest()[:16]
+        self._tokens = count_tokens(self._text) if self._text else 0
+        self.reloads += 1
+
+    @property
+    def text(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._text
+
+    def for_message(self, thread_id: str) -> str:
+        """Block to append to this turn's user message ("" when the thread already has the current rules)."""
+        with self._lock:
+            self._refresh()
+            if not self._text:
+                return ""
+            st = self._threads.setdefault(thread_id, {"version": None, "turns": 0, "copies": 0})
+            st["turns"] += 1
+            block = ""
+            if self.mode == "thread" and st["version"] != self._version:
+                header = RULES_HEADER if st["version"] is None else UPDATED_HEADER
+                block = "\n\n" + header + self._text
+                st["version"] = self._version
+                st["copies"] += 1
+                self.sends += 1
+            else:
+                self.tokens_not_sent += self._tokens
+            # Sending every turn would leave `turns` copies in the history each later run re-reads
+            self.prompt_tokens_saved += (st["turns"] - st["copies"]) * self._tokens
+            return block
+
+    def instructions(self, base: Optional[str]) -> Optional[str]:
+        """Run instructions; in "instructions" mode the current rules are appended to them."""
+        if self.mode != "instructions":
+            return base
+        rules = self.text
+        if not rules:
+            return base
+        return f"{base}\n\n{RULES_HEADER}{rules}" if base else RULES_HEADER + rules
+
+    def forget(self, thread_id: str) -> None:
+        with self._lock:
+            self._threads.pop(thread_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "policy_tokens": self._tokens,
+            "reloads": self.reloads,
+            "sends": self.sends,
+            "tokens_not_sent": self.tokens_not_sent,
+            "prompt_tokens_saved": self.prompt_tokens_saved,
+        }
@@ -0,0 +1,74 @@
+# utils/thread_memory.py
+import hashlib, os
+from typing import Dict, List
+from utils.tokens import count_tokens
+
+THREAD_MAX_TOKENS = int(os.getenv("THREAD_MAX_TOKENS", "8000"))      # 0 = no token budget
+THREAD_MAX_MESSAGES = int(os.getenv("THREAD_MAX_MESSAGES", "30"))    # 0 = no message budget
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation so far so it can be continued without the full transcript. "
+    "Keep the customer's situation and details, what has been answered or decided, anything promised, "
+    "and open questions. Leave out retrieved documents and greetings. At most 200 words, plain text."
+)
+SUMMARY_REQUEST = "Please summarize our conversation so far."
+MEMORY_HEADER = "Conversation memory (summary of the earlier part of this conversation; use it as context):\n"
+
+
+def memory_message(summary: str) -> str:
+    return MEMORY_HEADER + summary.strip()
+
+
+def doc_key(doc: Dict) -> str:
+    key = doc.get("id") or doc.get("@search.documentId")
+    if key:
+        return str(key)
+    return hashlib.sha1(str(doc.get("content", "")).encode("utf-8")).hexdigest()
+
+
+class ThreadLedger:
+    """
+    Running size of one agent thread, counted from what we post and read back
+    (no extra API calls), plus the retrieved docs the thread already holds.
+
+      ledger.note(text)            # after each message lands on the thread
+      ledger.unseen(results)       # drop docs sent earlier in this thread
+      ledger.mark(sent)            # ...and remember the ones we send now
+      ledger.over_budget()         # time to compact
+    """
+
+    def __init__(self, max_tokens: int = THREAD_MAX_TOKENS, max_messages: int = THREAD_MAX_MESSAGES):
+        self.max_tokens = max_tokens
+        self.max_messages = max_messages
+        self.tokens = 0
+        self.messages = 0
+        self.context: set[str] = set()
+        self.docs_skipped = 0
+        self.tokens_skipped = 0
+
+    def note(self, text: str) -> None:
+        self.tokens += count_tokens(text)
+        self.messages += 1
+
+    def over_budget(self) -> bool:
+        return bool((self.max_tokens and self.tokens >= self.max_tokens)
+                    or (self.max_messages and self.messages >= self.max_messages))
+
+    def unseen(self, docs: List[Dict]) -> List[Dict]:
+        """Docs not yet sent on this thread."""
+        fresh = []
+        for d in docs:
+            if doc_key(d) in self.context:
+                self.docs_skipped += 1
+                self.tokens_skipped += count_tokens(str(d.get("content", "")))
+                continue
+            fresh.append(d)
+        return fresh
+
+    def mark(self, docs: List[Dict]) -> None:
+        """Record docs as sent on this thread."""
+        self.context.update(doc_key(d) for d in docs)
+
+    def stats(self) -> Dict[str, int]:
+        return {"thread_tokens": self.tokens, "thread_messages": self.messages,
+                "docs_skipped": self.docs_skipped, "tokens_skipped": self.tokens_skipped}
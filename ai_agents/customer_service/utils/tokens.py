@@ -0,0 +1,19 @@
+# utils/tokens.py
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    # tiktoken is optional; without it we fall back to the ~4 chars/token rule of thumb
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
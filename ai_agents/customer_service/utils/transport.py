@@ -0,0 +1,106 @@
+# utils/transport.py
+import gzip, os, threading, time
+from typing import Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))            # keep-alive connections per host
+GZIP_MIN_BYTES = int(os.getenv("HTTP_GZIP_MIN_BYTES", "0"))   # 0 = never compress request bodies
+
+
+class HttpTransport:
+    """
+    One pooled, keep-alive requests.Session for every Azure Search call, so a RAG
+    turn reuses an open TCP+TLS connection instead of handshaking each time.
+
+    Request bodies of at least gzip_min_bytes (e.g. large upload batches) are sent
+    gzip-compressed with Content-Encoding: gzip. Responses are already negotiated
+    via Accept-Encoding by requests.
+
+      http = get_transport()
+      r = http.post(url, headers=headers, data=body, timeout=30)
+      http.stats()   # requests, new_connections, reuse_rate, bytes_sent, ...
+    """
+
+    def __init__(self, pool_size: int = POOL_SIZE, gzip_min_bytes: int = GZIP_MIN_BYTES):
+        self.pool_size = pool_size
+        self.gzip_min_bytes = gzip_min_bytes
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "errors": 0, "bytes_sent": 0, "bytes_raw": 0,
+                          "gzipped": 0, "elapsed_s": 0.0}
+
+    def _encode(self, headers: Dict[str, str], data) -> tuple:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        raw = len(data) if data else 0
+        if data and self.gzip_min_bytes and raw >= self.gzip_min_bytes:
+            data = gzip.compress(data, compresslevel=5)
+            headers = {**headers, "Content-Encoding": "gzip"}
+        return headers, data, raw
+
+    def request(self, method: str, url: str, *, headers: Optional[Dict[str, str]] = None, data=None,
+                timeout: Optional[float] = None, **kw) -> requests.Response:
+        headers, data, raw = self._encode(headers or {}, data)
+        t0 = time.perf_counter()
+        try:
+            return self.session.request(method, url, headers=headers, data=data, timeout=timeout, **kw)
+        except requests.RequestException:
+            with self._lock:
+                self._counters["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                c = self._counters
+                c["requests"] += 1
+                c["elapsed_s"] += time.perf_counter() - t0
+                c["bytes_raw"] += raw
+                c["bytes_sent"] += len(data) if data else 0
+                c["gzipped"] += int(bool(data) and len(data) != raw)
+
+    def get(self, url: str, **kw) -> requests.Response:
+        return self.request("GET", url, **kw)
+
+    def post(self, url: str, **kw) -> requests.Response:
+        return self.request("POST", url, **kw)
+
+    def put(self, url: str, **kw) -> requests.Response:
+        return self.request("PUT", url, **kw)
+
+    def delete(self, url: str, **kw) -> requests.Response:
+        return self.request("DELETE", url, **kw)
+
+    def stats(self) -> Dict[str, float]:
+        """Counters plus connection reuse read from urllib3's per-host pools."""
+        pools = list(self._adapter.poolmanager.pools._container.values())
+        opened = sum(getattr(p, "num_connections", 0) for p in pools)
+        with self._lock:
+            out = dict(self._counters)
+        n = out["requests"]
+        out.update({
+            "new_connections": opened,
+            "reused": max(n - opened, 0),
+            "reuse_rate": max(n - opened, 0) / n if n else 0.0,
+            "avg_ms": 1000 * out["elapsed_s"] / n if n else 0.0,
+        })
+        return out
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_shared: Optional[HttpTransport] = None
+_shared_lock = threading.Lock()
+
+
+def get_transport() -> HttpTransport:
+    """Process-wide transport, created on first use."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = HttpTransport()
+    return _shared
@@ -0,0 +1,131 @@
+# startup_bench.py
+"""
+Cold-start import cost of each entry point, from `python -X importtime`.
+
+  python startup_bench.py                 # run, print, append to startup_history.jsonl
+  python startup_bench.py --runs 10 --top 8
+  python startup_bench.py --max-regression 20   # exit 1 if any entry is >20% slower than last time
+
+Each entry imports what its script loads before it can serve (the first prompt,
+the first request), in a fresh interpreter, `--runs` times; the best run is kept
+so noise from other processes doesn't count as a regression. Results are
+appended with the git revision, and each run is compared to the previous record.
+"""
+import argparse, json, os, platform, re, statistics, subprocess, sys, time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+
+# name -> (project dir, modules imported before the entry point is usable)
+ENTRY_POINTS = {
+    "cs_enhanced/helpers_func": ("cs_enhanced", ["utils.helpers_func"]),
+    "cs_enhanced/qna_agent": ("cs_enhanced", ["agents.customer_service_agent"]),
+    "cs_enhanced/server": ("cs_enhanced", ["server"]),
+    "customer_service/helpers_func": ("customer_service", ["utils.helpers_func"]),
+    "customer_service/cli": ("customer_service", ["utils.helpers_func", "utils.message_cursor", "utils.policy_context"]),
+}
+
+LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr: str):
+    """(total_us, module_count, [(cumulative_us, package)]) from -X importtime output."""
+    total, count, packages = 0, 0, {}
+    for line in stderr.splitlines():
+        m = LINE.match(line)
+        if not m:
+            continue
+        count += 1
+        cumulative, name = int(m.group(2)), m.group(4)
+        if len(m.group(3)) <= 1:                 # not nested under another import
+            total += cumulative
+        # A package's cost is its most expensive import line (outermost, where it was first loaded)
+        root = name.split(".")[0]
+        packages[root] = max(packages.get(root, 0), cumulative)
+    return total, count, sorted(((us, name) for name, us in packages.items()), reverse=True)
+
+
+def measure(project: str, modules, runs: int) -> dict:
+    code = "import " + ", ".join(modules)
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=HERE / project,
+                              env=env, capture_output=True, text=True)
+        wall = time.perf_counter() - t0
+        if proc.returncode != 0:
+            err = proc.stderr.strip().splitlines()
+            return {"error": err[-1] if err else f"exit {proc.returncode}"}
+        total, count, top = parse_importtime(proc.stderr)
+        samples.append((total, wall, count, top))
+    best = min(samples, key=lambda s: s[0])
+    return {
+        "import_ms": best[0] / 1000,
+        "median_import_ms": statistics.median(s[0] for s in samples) / 1000,
+        "wall_ms": min(s[1] for s in samples) * 1000,
+        "modules": best[2],
+        "heaviest": [[name, us / 1000] for us, name in best[3]],
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def last_record(path: Path):
+    if not path.exists():
+        return None
+    lines = [l for l in path.read_text(encoding="utf-8").splitlines() if l.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=5, help="heaviest packages to list per entry")
+    ap.add_argument("--only", nargs="+", choices=sorted(ENTRY_POINTS), help="measure just these entries")
+    ap.add_argument("--history", default=str(HERE / "startup_history.jsonl"))
+    ap.add_argument("--no-save", action="store_true")
+    ap.add_argument("--max-regression", type=float, default=None, metavar="PCT",
+                    help="exit 1 if an entry's import time grew by more than PCT%% since the last record")
+    args = ap.parse_args()
+
+    history = Path(args.history)
+    previous = (last_record(history) or {}).get("results", {})
+    results, regressed = {}, []
+
+    print(f"{'entry':<32} {'import ms':>10} {'wall ms':>9} {'modules':>8} {'vs last':>9}")
+    for name in args.only or ENTRY_POINTS:
+        project, modules = ENTRY_POINTS[name]
+        r = results[name] = measure(project, modules, args.runs)
+        if "error" in r:
+            print(f"{name:<32} failed: {r['error']}")
+            continue
+        before = previous.get(name, {}).get("import_ms")
+        delta = ""
+        if before:
+            pct = 100 * (r["import_ms"] - before) / before
+            delta = f"{pct:+.0f}%"
+            if args.max_regression is not None and pct > args.max_regression:
+                regressed.append(name)
+        print(f"{name:<32} {r['import_ms']:>10.1f} {r['wall_ms']:>9.0f} {r['modules']:>8} {delta:>9}")
+        for mod, ms in r["heaviest"][:args.top]:
+            print(f"{'':<4}{mod:<40} {ms:>8.1f} ms")
+
+    if not args.no_save:
+        record = {"revision": git_revision(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                  "python": platform.python_version(), "results": results}
+        with history.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    if regressed:
+        print(f"Import time regressed by more than {args.max_regression:.0f}%: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
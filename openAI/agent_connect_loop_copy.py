@@ -1,6 +1,7 @@
 from azure.ai.projects import AIProjectClient
 from azure.identity import DefaultAzureCredential
 from azure.ai.agents.models import ListSortOrder
+from message_cursor import MessageCursor
 import time
 from azure.identity import AzureCliCredential
 
@@ -14,6 +15,7 @@ agent_id = "asst_8yIHi2J290Ko7YyhuItaJL91"
 
 # Start new thread
 thread = project.agents.threads.create()
+cursor = MessageCursor(project.agents, thread.id)   # each turn fetches only the new messages
 print(f"🧵 Started new thread: {thread.id}")
 print("💬 Chat started. Type 'exit' to quit.\n")
 
@@ -52,12 +54,10 @@ while True:
             continue
 
         # Get messages
-        messages = project.agents.messages.list(thread_id=thread.id, order=ListSortOrder.ASCENDING)
-
-        # Print only agent responses
-        for message in messages:
-            if message.text_messages:
-                print(f"{message.role}: {message.text_messages[-1].text.value}")
+        # Print this turn's messages
+        for message in cursor.refresh():
+            if message.text:
+                print(f"{message.role}: {message.text}")
 
 
 
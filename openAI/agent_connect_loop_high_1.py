@@ -5,6 +5,7 @@ from openai import AzureOpenAI
 from azure.ai.projects import AIProjectClient
 from azure.identity import AzureCliCredential
 from azure.ai.agents.models import ListSortOrder
+from message_cursor import MessageCursor
 
 # ---------- Config / Env ----------
 load_dotenv()  # loads .env into environment
@@ -72,6 +73,7 @@ def search_vectors(query_vector):
 
 # ---------- Chat loop ----------
 thread = project.agents.threads.create()
+cursor = MessageCursor(project.agents, thread.id)   # each turn fetches only the new messages
 print(f"🧵 Started new thread: {thread.id}")
 print("💬 Chat started. Type 'exit' to quit.\n")
 
@@ -126,10 +128,9 @@ while True:
             continue
 
         # 6) Print the latest assistant reply
-        messages = project.agents.messages.list(thread_id=thread.id, order=ListSortOrder.ASCENDING)
-        for m in messages:
-            if m.text_messages:
-                print(f"{m.role}: {m.text_messages[-1].text.value}")
+        for m in cursor.refresh():
+            if m.text:
+                print(f"{m.role}: {m.text}")
 
     except Exception as e:
         print(f"🚨 Error: {e}")
@@ -1,6 +1,7 @@
 from azure.ai.projects import AIProjectClient
 from azure.identity import AzureCliCredential
 from azure.ai.agents.models import ListSortOrder
+from message_cursor import MessageCursor
 from azure.search.documents import SearchClient
 from azure.core.credentials import AzureKeyCredential
 import time
@@ -39,6 +40,7 @@ def retrieve_context_from_docs(query, top_k=3):
 
 # === Start agent chat ===
 thread = project.agents.threads.create()
+cursor = MessageCursor(project.agents, thread.id)   # each turn fetches only the new messages
 print(f"🧵 Started new thread: {thread.id}")
 print("💬 Chat started. Type 'exit' to quit.\n")
 
@@ -88,10 +90,9 @@ Question: {user_input}
             continue
 
         # === Step 5: Print agent response ===
-        messages = project.agents.messages.list(thread_id=thread.id, order=ListSortOrder.ASCENDING)
-        for message in messages:
-            if message.role == "assistant" and message.text_messages:
-                print(f"{message.role}: {message.text_messages[-1].text.value}")
+        for message in cursor.refresh():
+            if message.role == "assistant" and message.text:
+                print(f"{message.role}: {message.text}")
 
     except Exception as e:
         print(f"🚨 Error: {e}")
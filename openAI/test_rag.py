@@ -1,6 +1,8 @@
-import os, json, requests, textwrap
+import os, sys, json, time, requests, textwrap
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from openai import AzureOpenAI
+from embed_cache import EmbeddingCache
 
 load_dotenv()
 
@@ -8,6 +10,7 @@ load_dotenv()
 AOAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AOAI_KEY = os.getenv("AZURE_OPENAI_API_KEY") or os.getenv("AZURE_OPENAI_KEY")
 EMBED_MODEL = os.getenv("AZURE_EMBED_MODEL", "text-embedding-3-small")
+EMBED_DIMS = int(os.getenv("AZURE_EMBED_DIM", "1536"))
 AOAI_API_VERSION = "2024-02-15-preview"
 
 SEARCH_ENDPOINT = os.getenv("AZURE_SEARCH_ENDPOINT")
@@ -16,6 +19,7 @@ INDEX_NAME = os.getenv("AZURE_SEARCH_INDEX_NAME")
 VECTOR_FIELD = os.getenv("AZURE_SEARCH_VECTOR_FIELD", "contentVector")
 
 TOP_K = int(os.getenv("TOP_K", "3"))
+SEARCH_CONCURRENCY = int(os.getenv("AZURE_SEARCH_CONCURRENCY", "8"))
 THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.5"))
 API_VERSION = "2024-07-01"
 
@@ -32,10 +36,13 @@ if missing:
 # ---- Clients ----
 aoai = AzureOpenAI(azure_endpoint=AOAI_ENDPOINT, api_key=AOAI_KEY, api_version=AOAI_API_VERSION)
 headers = {"api-key": SEARCH_KEY, "Content-Type": "application/json"}
+http = requests.Session()   # keep-alive: a batch reuses connections instead of a TLS handshake per query
 
-def embed(text: str):
+def _embed_uncached(text: str):
     return aoai.embeddings.create(model=EMBED_MODEL, input=text).data[0].embedding
 
+embed = EmbeddingCache(_embed_uncached, model=EMBED_MODEL, dims=EMBED_DIMS)
+
 def vector_search(qvec):
     url = f"{SEARCH_ENDPOINT}/indexes/{INDEX_NAME}/docs/search?api-version={API_VERSION}"
     payload = {
@@ -49,7 +56,7 @@ def vector_search(qvec):
             }
         ]
     }
-    r = requests.post(url, headers=headers, data=json.dumps(payload), timeout=30)
+    r = http.post(url, headers=headers, data=json.dumps(payload), timeout=30)
     if r.status_code >= 400:
         try:
             detail = r.json()
@@ -59,7 +66,37 @@ def vector_search(qvec):
     return r.json().get("value", [])
 
 
+def vector_search_many(qvecs):
+    """vector_search for a batch, SEARCH_CONCURRENCY requests in flight; results in input order."""
+    with ThreadPoolExecutor(max_workers=SEARCH_CONCURRENCY) as pool:
+        return list(pool.map(vector_search, qvecs))
+
+
+def batch_eval(path):
+    """python test_rag.py questions.txt  -> top hit per question (one per line), serial vs concurrent."""
+    with open(path, encoding="utf-8") as f:
+        questions = [l.strip() for l in f if l.strip()]
+    qvecs = [embed(q) for q in questions]
+    t0 = time.perf_counter()
+    serial = [vector_search(v) for v in qvecs]
+    t1 = time.perf_counter()
+    batch = vector_search_many(qvecs)
+    t2 = time.perf_counter()
+    for q, hits in zip(questions, batch):
+        top = hits[0] if hits else {}
+        mark = "✅" if top.get("@search.score", 0) >= THRESHOLD else "🚫"
+        print(f"{mark} {top.get('@search.score', 0):.3f} {textwrap.shorten(q, 60)} -> {top.get('title') or top.get('id') or '(no hits)'}")
+    same = sum([h.get("id") for h in a] == [h.get("id") for h in b] for a, b in zip(serial, batch))
+    n = len(questions)
+    print(f"\n{n} queries: serial {n / (t1 - t0):.1f} q/s, concurrent x{SEARCH_CONCURRENCY} {n / (t2 - t1):.1f} q/s, "
+          f"same results {same}/{n}")
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        batch_eval(sys.argv[1])
+        raise SystemExit(0)
+
     user_query = input("You: ").strip()
     if not user_query:
         raise SystemExit("Empty query.")